@@ -1,9 +1,22 @@
 #!/usr/bin/env python3
 import argparse
 import papermill as pm
+from typing import Tuple
 
-from src.simulation.get_results import get_results, epoch_test
+from src.simulation.get_results import get_results, optimize, epoch_test
+from src.simulation.manifest import run_manifest
 from src.analysis.get_analysis import get_analysis
+from src.analysis.Result import to_columns
+
+def shard(value: str) -> Tuple[int, int]:
+    """Parse a --shard i/N flag."""
+    try:
+        i, n = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, e.g. 1/4, got {value!r}")
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError(f"expected 1 <= i <= N, got {value!r}")
+    return i, n
 
 def main():
     parser = argparse.ArgumentParser(description="Run simulations and analysis")
@@ -16,11 +29,91 @@ def main():
     p_results.add_argument("--attack", action=argparse.BooleanOptionalAction, default=False,
                            help="Choose: --attack or --no-attack")   
     p_results.add_argument("--mini", action="store_true", default=False, help="Choose scale of simulations")    
+    p_results.add_argument("--engine", choices=["object", "array", "analytic"], default="object",
+                           help="Simulate SimNode objects or the struct-of-arrays topology, "
+                                "or compute the expected baseline results (--no-attack only)")
+    p_results.add_argument("--batch", type=int, default=1, 
+                           help="Runs of a combination simulated together per task (array engine only)")
+    p_results.add_argument("--variances", action="store_true", default=False,
+                           help="Also save the variance of one run's results of each combination (analytic engine only)")
+    p_results.add_argument("--seed", type=int, default=None, 
+                           help="Master seed to reproduce the results (fresh randomness if not given)")
+    p_results.add_argument("--expected", action="store_true", default=False,
+                           help="Score each run by its expected active set given the final selection probabilities, "
+                                "instead of one drawn active set")
+    p_results.add_argument("--adaptive", action="store_true", default=False, 
+                           help="Stop running a combination once its confidence intervals are within --ci-target")
+    p_results.add_argument("--ci-target", type=float, default=0.01, 
+                           help="Largest 95%% confidence interval half width with --adaptive")
+    p_results.add_argument("--min-runs", type=int, default=10, 
+                           help="Smallest number of runs of a combination with --adaptive")
+    p_results.add_argument("--max-runs", type=int, default=None, 
+                           help="Largest number of runs of a combination (default: the usual number of runs)")
+    p_results.add_argument("--search", choices=["grid", "frontier"], default="grid",
+                           help="Simulate every combination, or only those near the cost / fraction frontier")
+    p_results.add_argument("--resume", action="store_true", default=False, 
+                           help="Skip the tasks an interrupted run with the same settings already finished")
+    p_results_shards = p_results.add_mutually_exclusive_group()
+    p_results_shards.add_argument("--shard", type=shard, default=None, metavar="i/N",
+                                  help="Run only shard i of N of the tasks, and log them to a file of the shard")
+    p_results_shards.add_argument("--merge", type=int, default=None, metavar="N",
+                                  help="Merge the logs of the N finished shards (run with the same flags) into the results file")
     
     # subcommand 2 get_epochs
     p_epochs = subparsers.add_parser("get_epochs", help="Run simulations and store each epoch's results to file")  
+    p_epochs.add_argument("--engine", choices=["object", "array"], default="object",
+                          help="Simulate SimNode objects or the struct-of-arrays topology")
+    p_epochs.add_argument("--batch", type=int, default=1, 
+                          help="Runs of a combination simulated together per task (array engine only)")
+    p_epochs.add_argument("--seed", type=int, default=None, 
+                          help="Master seed to reproduce the results (fresh randomness if not given)")
+    p_epochs.add_argument("--adaptive", action="store_true", default=False, 
+                          help="Stop running a combination once its confidence intervals are within --ci-target")
+    p_epochs.add_argument("--ci-target", type=float, default=0.01, 
+                          help="Largest 95%% confidence interval half width with --adaptive")
+    p_epochs.add_argument("--min-runs", type=int, default=10, 
+                          help="Smallest number of runs of a combination with --adaptive")
+    p_epochs.add_argument("--max-runs", type=int, default=None, 
+                          help="Largest number of runs of a combination (default: the usual number of runs)")
+    p_epochs_shards = p_epochs.add_mutually_exclusive_group()
+    p_epochs_shards.add_argument("--shard", type=shard, default=None, metavar="i/N",
+                                 help="Run only shard i of N of the tasks, and log them to a file of the shard")
+    p_epochs_shards.add_argument("--merge", type=int, default=None, metavar="N",
+                                 help="Merge the logs of the N finished shards (run with the same flags) into the results files")
+    
+    # subcommand 3 optimize
+    p_optimize = subparsers.add_parser("optimize", help="Search for the cheapest combination reaching a target f_gw (and f_mix)")
+    p_optimize.add_argument("mode", choices=["A***A", "AAAAA"], help="Choose modes")
+    p_optimize.add_argument("version", choices=["v1", "v2", "v3"], help="Choose versions")
+    p_optimize.add_argument("--f-gw", type=float, required=True, help="Target fraction of the gateway active set")
+    p_optimize.add_argument("--f-mix", type=float, default=None, help="Target fraction of the mixnode active set (AAAAA only)")
+    p_optimize.add_argument("--attack", action=argparse.BooleanOptionalAction, default=False,
+                            help="Choose: --attack or --no-attack")
+    p_optimize.add_argument("--mini", action="store_true", default=False, help="Choose scale of simulations")
+    p_optimize.add_argument("--engine", choices=["object", "array"], default="object",
+                            help="Simulate SimNode objects or the struct-of-arrays topology")
+    p_optimize.add_argument("--batch", type=int, default=1,
+                            help="Runs of a combination simulated together per task (array engine only)")
+    p_optimize.add_argument("--seed", type=int, default=None,
+                            help="Master seed to reproduce the results (fresh randomness if not given)")
+    p_optimize.add_argument("--expected", action="store_true", default=False,
+                            help="Score each run by its expected active set, as for get_results")
+    p_optimize.add_argument("--min-runs", type=int, default=10,
+                            help="Runs of a combination in its first race, doubled while it is undecided")
+    p_optimize.add_argument("--max-runs", type=int, default=None,
+                            help="Largest number of runs of a combination (default: the usual number of runs)")
+    p_optimize.add_argument("--resume", action="store_true", default=False,
+                            help="Reuse the runs of an earlier search with the same settings")
+    
+    # subcommand 4 run-manifest
+    p_manifest = subparsers.add_parser("run-manifest", help="Run the get_results and get_epochs experiments of a manifest on one pool")
+    p_manifest.add_argument("manifest", help="JSON or YAML file listing the experiments")
+    
+    # subcommand 5 to-columns
+    p_columns = subparsers.add_parser("to-columns", help="Write the columnar .npz copy of results files, which the analysis loads instead")
+    p_columns.add_argument("files", nargs="+", help="Results .json files in sim_data")
     
-    # subcommand 3 get_analysis
+    # subcommand 6 get_analysis
     p_analysis = subparsers.add_parser("get_analysis", help="Run analysis")
     p_analysis.add_argument("analysis", choices=["average", "path_prob", "cost", "table", "epoch"], 
                             help="Choose which analysis to run")
@@ -28,10 +121,34 @@ def main():
 
     args = parser.parse_args()
     if args.command == "get_results":
-        get_results(args.mini, args.mode, args.version, args.attack)
+        if args.engine == 'analytic':
+            if args.attack:
+                p_results.error("--engine analytic only computes baseline (--no-attack) results")
+            if args.expected:
+                p_results.error("--engine analytic already gives expected results, --expected only applies to simulations")
+            if args.shard is not None or args.merge is not None or args.search != 'grid':
+                p_results.error("--engine analytic computes the whole grid at once, it can't be sharded, merged or searched")
+        elif args.variances:
+            p_results.error("--variances needs --engine analytic")
+        get_results(args.mini, args.mode, args.version, args.attack, args.engine, args.batch, args.seed, args.resume,
+                    args.adaptive, args.ci_target, args.min_runs, args.max_runs, args.search, args.shard, args.merge, args.variances,
+                    args.expected)
    
     elif args.command == 'get_epochs':
-        epoch_test()
+        epoch_test(args.engine, args.batch, args.seed, args.adaptive, args.ci_target, args.min_runs, args.max_runs,
+                   args.shard, args.merge)
+        
+    elif args.command == 'optimize':
+        if args.mode == 'AAAAA' and args.f_mix is None:
+            p_optimize.error("AAAAA needs a target --f-mix")
+        optimize(args.mini, args.mode, args.version, args.attack, args.f_gw, args.f_mix, args.engine, args.batch, args.seed,
+                 args.resume, args.min_runs, args.max_runs, args.expected)
+        
+    elif args.command == 'run-manifest':
+        run_manifest(args.manifest)
+        
+    elif args.command == 'to-columns':
+        to_columns(args.files)
         
     elif args.command == "get_analysis":
         if args.analysis == 'path_prob':
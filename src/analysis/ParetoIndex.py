@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class ParetoIndex:
+    """
+    Index of the cheapest entries of a results file (see ResultColumns) meeting thresholds:
+    f_gw >= a target, and optionally f_mix >= a target and B + A <= a number of nodes.
+
+    The entries are sorted by total cost (then file order, so that ties go to the first entry, as with
+    a scan of the file). An entry is only kept if no entry before it has at least its f_gw and f_mix with
+    at most its nodes: that entry meets every threshold it meets, so it can never be the answer.
+    A query is answered by the first kept entry meeting its thresholds, which is the cheapest one.
+    With an f_gw threshold only, the query is a binary search of the entries raising the largest f_gw so far
+    in cost order, whose f_gw increases with their cost.
+    """
+
+    def __init__(self, results):
+        """
+        Args:
+            results: ResultColumns of a results file
+        """
+        self.results = results
+        self.order = np.lexsort((np.arange(len(results)), results.total_cost))
+        f_gw = results.f_gw[self.order]
+
+        # the entries raising the largest f_gw so far: their f_gw increases with their cost
+        steps = np.flatnonzero(f_gw > np.maximum.accumulate(np.concatenate(([-np.inf], f_gw[:-1]))))
+        self.gw_entries = self.order[steps]
+        self.gw_values = f_gw[steps]
+
+        self.entries = None # the Pareto set, built on the first query with f_mix or total_nodes
+
+    def build_frontier(self):
+        """The Pareto set of (f_gw, f_mix, -nodes), in cost order."""
+        f_gw = self.results.f_gw[self.order]
+        f_mix = self.results.f_mix[self.order]
+        nodes = (self.results.B + self.results.A)[self.order]
+
+        # the kept points so far are the first k of each array
+        kept = np.empty(len(self.order), dtype=np.int64)
+        kept_gw, kept_mix, kept_nodes = np.empty_like(f_gw), np.empty_like(f_mix), np.empty_like(nodes)
+        k = 0
+        for i in range(len(self.order)):
+            if not np.any((kept_gw[:k] >= f_gw[i]) & (kept_mix[:k] >= f_mix[i]) & (kept_nodes[:k] <= nodes[i])):
+                kept[k], kept_gw[k], kept_mix[k], kept_nodes[k] = i, f_gw[i], f_mix[i], nodes[i]
+                k += 1
+        self.entries = self.order[kept[:k]] # entry index of each point of the frontier
+        self.f_gw = kept_gw[:k]
+        self.f_mix = kept_mix[:k]
+        self.nodes = kept_nodes[:k]
+
+    def cheapest(self, f_gw, f_mix=None, total_nodes=None):
+        """
+        Entry index of the cheapest entry with f_gw >= f_gw, f_mix >= f_mix and B + A <= total_nodes
+        (None for no constraint). The arguments broadcast together, for a batch of queries in one call.
+        Returns:
+            the entry index, None if no entry meets the thresholds; for a batch, an array of them with -1 for none
+        """
+        if f_mix is None and total_nodes is None:
+            f_gw = np.asarray(f_gw, dtype=np.float64)
+            first = np.searchsorted(self.gw_values, f_gw, side='left')
+            found = first < len(self.gw_values)
+            index = np.where(found, self.gw_entries[np.minimum(first, len(self.gw_values) - 1)] if len(self.gw_values) else -1, -1)
+        else:
+            if self.entries is None:
+                self.build_frontier()
+            f_gw, f_mix, total_nodes = np.broadcast_arrays(
+                np.asarray(f_gw, dtype=np.float64),
+                np.asarray(-np.inf if f_mix is None else f_mix, dtype=np.float64),
+                np.asarray(np.inf if total_nodes is None else total_nodes, dtype=np.float64),
+            )
+            meets = ((self.f_gw >= f_gw[..., None]) & (self.f_mix >= f_mix[..., None]) & (self.nodes <= total_nodes[..., None]))
+            found = meets.any(axis=-1)
+            index = np.where(found, self.entries[meets.argmax(axis=-1)] if len(self.entries) else -1, -1)
+        if np.ndim(index) == 0:
+            return int(index) if found else None
+        return index
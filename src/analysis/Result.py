@@ -1,6 +1,7 @@
 import os
+from collections.abc import Sequence
 
-from ..utils.util import load_results, get_cost, get_refundable_cost, get_non_refundable_cost
+from ..utils.util import load_results, save_columns, load_columns, columns_path, get_cost, get_refundable_cost, get_non_refundable_cost, COST_MODEL
 
 class Config:
     def __init__(self, gw, mix):
@@ -30,8 +31,13 @@ class Result:
     
     @classmethod
     def from_file(cls, filename):
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        data_path = os.path.join(base_dir, 'sim_data', filename)
+        """
+        The results of a sim_data file. A .npz file (see save_columns), or the .npz copy of a .json file 
+        if it is at least as recent, is read lazily as a ResultTable; a .json file is read as a list of Results.
+        """
+        data_path = data_file(filename)
+        if data_path.endswith('.npz'):
+            return ResultTable(data_path)
         results_loaded = load_results(data_path)
         
         results = []
@@ -54,4 +60,102 @@ class Result:
             )
             results.append(obj)
         
-        return results
\ No newline at end of file
+        return results
+
+
+def data_file(filename):
+    """
+    The file to read the results of a sim_data file from: the file itself, or for a .json file
+    its .npz copy (see save_columns) if that is at least as recent.
+    """
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    data_path = os.path.join(base_dir, 'sim_data', filename)
+    if data_path.endswith('.json'):
+        columns = columns_path(data_path)
+        if os.path.exists(columns) and (not os.path.exists(data_path) or os.path.getmtime(columns) >= os.path.getmtime(data_path)):
+            return columns
+    return data_path
+
+
+def to_columns(filenames):
+    """Write the columnar copy (see save_columns) of .json results files in sim_data, which from_file then reads instead."""
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for filename in filenames:
+        data_path = os.path.join(base_dir, 'sim_data', os.path.basename(filename))
+        save_columns(load_results(data_path), columns_path(data_path))
+        print(f"{filename}: {os.path.getsize(data_path)} bytes as JSON, {os.path.getsize(columns_path(data_path))} as columns")
+
+
+class ResultTable(Sequence):
+    """
+    The results of a columnar sim_data file (see save_columns), as a read-only sequence of Results.
+    A column is only read from the file once it is used, and a Result is only built once it is accessed.
+    Adding a table to a list (or a list to a table) gives a list of Results, as with from_file on a .json file.
+    """
+    FIELDS = ('f_gw', 'f_mix', 'B_gw', 'A_gw', 'B_mix', 'A_mix', 'B', 'A', 'B_stake', 'A_stake')
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = load_columns(path)
+        self.columns = {}
+    
+    def column(self, field):
+        """Array of a field of every entry, e.g. 'f_gw', or 'path_prob' with its 'path_prob.keys' and 'path_prob.mask'."""
+        if field not in self.columns:
+            self.columns[field] = self.file[field]
+        return self.columns[field]
+    
+    def __len__(self):
+        return len(self.column('f_gw'))
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        entry = {field: self.column(field)[i].item() for field in self.FIELDS}
+        keys = self.column('path_prob.keys').tolist()
+        return self.result(entry, keys, self.column('path_prob')[i].tolist(), self.column('path_prob.mask')[i].tolist())
+    
+    def __iter__(self):
+        # whole columns at once, much faster than one entry at a time
+        columns = {field: self.column(field).tolist() for field in self.FIELDS}
+        keys = self.column('path_prob.keys').tolist()
+        path_probs = self.column('path_prob').tolist()
+        masks = self.column('path_prob.mask').tolist()
+        costs = {field: column.tolist() for field, column in 
+                 COST_MODEL.costs(self.column('B'), self.column('A'), self.column('B_stake'), self.column('A_stake')).items()}
+        for i in range(len(self)):
+            yield self.result({field: column[i] for field, column in columns.items()}, keys, path_probs[i], masks[i],
+                              {field: column[i] for field, column in costs.items()})
+    
+    @staticmethod
+    def result(entry, keys, path_prob, mask, costs=None):
+        """The Result of an entry's fields, its path_prob keys, values and mask, and its costs if already known."""
+        B, A, bstake, astake = entry['B'], entry['A'], entry['B_stake'], entry['A_stake']
+        if costs is None:
+            costs = COST_MODEL.costs(B, A, bstake, astake)
+        return Result(
+            f_gw = entry['f_gw'],
+            f_mix = entry['f_mix'],
+            B_gw = entry['B_gw'],
+            A_gw = entry['A_gw'],
+            B_mix = entry['B_mix'],
+            A_mix = entry['A_mix'],
+            path_prob = {k: v for k, v, present in zip(keys, path_prob, mask) if present},
+            B = B,
+            A = A,
+            bstake = bstake,
+            astake = astake,
+            total_cost = costs['total_cost'],
+            refundable_cost = costs['refundable_cost'],
+            non_refundable_cost = costs['non_refundable_cost']
+        )
+    
+    def __add__(self, other):
+        return list(self) + list(other)
+    
+    def __radd__(self, other):
+        return list(other) + list(self)
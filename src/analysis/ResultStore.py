@@ -0,0 +1,110 @@
+import os
+import copy
+import numpy as np
+
+from .Result import Result, data_file
+from .ParetoIndex import ParetoIndex
+from ..utils.util import load_results, load_columns, results_to_columns, COST_MODEL
+
+
+class ResultColumns:
+    """
+    The results of a sim_data file as one array per field, with the cost columns computed once
+    for every entry under a CostModel. result(i) gives entry i as a Result, as Result.from_file would.
+    """
+    FIELDS = ('f_gw', 'f_mix', 'B_gw', 'A_gw', 'B_mix', 'A_mix', 'B', 'A', 'B_stake', 'A_stake')
+
+    def __init__(self, columns, cost_model=COST_MODEL):
+        """
+        Args:
+            columns: field -> array, as given by results_to_columns or load_columns
+            cost_model: prices of the cost columns
+        """
+        for field in self.FIELDS:
+            setattr(self, field, np.asarray(columns[field]))
+        keys = [str(k) for k in columns['path_prob.keys']]
+        values = np.asarray(columns['path_prob'])
+        mask = np.asarray(columns['path_prob.mask'])
+        # path -> probability of every entry, and whether the entry has it (a missing path counts as 0)
+        self.path_probs = {k: np.where(mask[:, j], values[:, j], 0.0) for j, k in enumerate(keys)}
+        self.path_masks = {k: mask[:, j] for j, k in enumerate(keys)}
+
+        self.price(cost_model)
+        self.repriced = {cost_model: self} # cost model -> these results under it, see priced
+    
+    def price(self, cost_model):
+        self.cost_model = cost_model
+        for field, column in cost_model.costs(self.B, self.A, self.B_stake, self.A_stake).items():
+            setattr(self, field, column)
+        self.pareto_index = None # it depends on the costs
+    
+    def priced(self, cost_model):
+        """
+        These results under other prices: the same columns (not copied) with the cost columns
+        computed again, in one pass over the whole table. Kept for later queries with the same prices.
+        """
+        if cost_model not in self.repriced:
+            repriced = copy.copy(self)
+            repriced.price(cost_model)
+            self.repriced[cost_model] = repriced
+        return self.repriced[cost_model]
+
+    def __len__(self):
+        return len(self.f_gw)
+
+    def path_prob(self, path):
+        """Probability of a path (e.g. 'A***A') of every entry, 0 for the entries without it."""
+        return self.path_probs.get(path, np.zeros(len(self)))
+
+    def pareto(self):
+        """The ParetoIndex of the entries for min cost queries, built on first use."""
+        if self.pareto_index is None:
+            self.pareto_index = ParetoIndex(self)
+        return self.pareto_index
+
+    def result(self, i):
+        """Entry i as a Result."""
+        return Result(
+            f_gw = self.f_gw[i].item(),
+            f_mix = self.f_mix[i].item(),
+            B_gw = self.B_gw[i].item(),
+            A_gw = self.A_gw[i].item(),
+            B_mix = self.B_mix[i].item(),
+            A_mix = self.A_mix[i].item(),
+            path_prob = {k: self.path_probs[k][i].item() for k in self.path_probs if self.path_masks[k][i]},
+            B = self.B[i].item(),
+            A = self.A[i].item(),
+            bstake = self.B_stake[i].item(),
+            astake = self.A_stake[i].item(),
+            total_cost = self.total_cost[i].item(),
+            refundable_cost = self.refundable_cost[i].item(),
+            non_refundable_cost = self.non_refundable_cost[i].item()
+        )
+
+
+class ResultStore:
+    """
+    Results files of sim_data loaded once per process, as ResultColumns, instead of being read
+    and parsed again by every query. A file is loaded again once it (or its .npz copy, see data_file) changes.
+    """
+
+    def __init__(self):
+        self.tables = {} # path of the file read -> (its modification time, its ResultColumns)
+
+    def get(self, filename, cost_model=None):
+        """The ResultColumns of a results file in sim_data, priced with cost_model (the paper's prices if None)."""
+        path = data_file(filename)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.tables.get(path)
+        if cached is None or cached[0] != mtime:
+            columns = load_columns(path) if path.endswith('.npz') else results_to_columns(load_results(path))
+            cached = (mtime, ResultColumns(columns))
+            self.tables[path] = cached
+        return cached[1] if cost_model is None else cached[1].priced(cost_model)
+
+    def clear(self):
+        self.tables.clear()
+
+
+# the store shared by the analysis functions of this process
+RESULT_STORE = ResultStore()
@@ -3,22 +3,23 @@ import matplotlib.pyplot as plt
 import numpy as np
 from scipy import stats
 
-from .Result import Result
+from .ResultStore import RESULT_STORE
 
 
-def min_cost_compare(f_max, round_num, files, labels):
+def min_cost_compare(f_max, round_num, files, labels, cost_model=None):
     """
     For A***A.
+    cost_model: prices of the costs (CostModel), the paper's if None.
     """
     series = []
     for file, label in zip(files, labels):
-        results = Result.from_file(file)
+        results = RESULT_STORE.get(file, cost_model)
         
         fa_to_min_total = defaultdict(lambda: float('inf'))
-        for r in results:
-            rounded_f = round(r.f_gw, round_num)
+        for f, total_cost in zip(results.f_gw.tolist(), results.total_cost.tolist()):
+            rounded_f = round(f, round_num)
             if rounded_f != 0.0 and rounded_f <= f_max:
-                fa_to_min_total[rounded_f] = min(fa_to_min_total[rounded_f], r.total_cost)
+                fa_to_min_total[rounded_f] = min(fa_to_min_total[rounded_f], total_cost)
         
         #fa_to_min_total[0.0] = 0.0 # ensure line starts at (0.0, 0.0)
         
@@ -46,100 +47,68 @@ def min_cost_compare(f_max, round_num, files, labels):
     plt.show()
     
         
-def min_cost_config_for_AstarA(file, f_gw):
+def cheapest_config(results, i):
+    if i is None:
+        return None
+    return {
+        'B': results.B[i].item(),
+        'A': results.A[i].item(),
+        'bstake': results.B_stake[i].item(),
+        'astake': results.A_stake[i].item(),
+        'cost': results.total_cost[i].item(),
+        'refundable_cost': results.refundable_cost[i].item(),
+        'non_refundable_cost': results.non_refundable_cost[i].item()
+    }
+
+
+def min_cost_config_for_AstarA(file, f_gw, cost_model=None):
     """
     Parameters:
         file: the file to find the min cost entry for a specified fraction value
         f: the fraction value
         mode: gw or mix. 
+        cost_model: prices of the costs (CostModel), the paper's if None
     """
-        
-    results = Result.from_file(file)
-    
-    valid_entries = []
-    for r in results:
-        if r.f_gw >= f_gw:
-            valid_entries.append(r)
-    
-    if not valid_entries:
-        return None
-    cheapest = min(valid_entries, key=lambda r: r.total_cost)
-    
-    return {
-        'B': cheapest.B,
-        'A': cheapest.A,
-        'bstake': cheapest.bstake,
-        'astake': cheapest.astake,
-        'cost': cheapest.total_cost,
-        'refundable_cost': cheapest.refundable_cost,
-        'non_refundable_cost': cheapest.non_refundable_cost
-    }
-
-def min_cost_config_for_AAAAA(file, f_gw, f_mix):
-    results = Result.from_file(file)
-    
-    valid_entries_AAAAA = []
-    for r in results:
-        if r.f_gw >= f_gw and r.f_mix >= f_mix:
-            valid_entries_AAAAA.append(r)
-            
-    if not valid_entries_AAAAA:
-        return None
-    cheapest = min(valid_entries_AAAAA, key=lambda r: r.total_cost)
+    results = RESULT_STORE.get(file, cost_model)
+    return cheapest_config(results, results.pareto().cheapest(f_gw))
 
-    return {
-        'B': cheapest.B,
-        'A': cheapest.A,
-        'bstake': cheapest.bstake,
-        'astake': cheapest.astake,
-        'cost': cheapest.total_cost,
-        'refundable_cost': cheapest.refundable_cost,
-        'non_refundable_cost': cheapest.non_refundable_cost
-    }
+def min_cost_config_for_AAAAA(file, f_gw, f_mix, cost_model=None):
+    results = RESULT_STORE.get(file, cost_model)
+    return cheapest_config(results, results.pareto().cheapest(f_gw, f_mix))
                    
 
-def config_for_AAAAA_constraints(drop_file, f_gw, f_mix, total_nodes):
-    
-    file = Result.from_file(drop_file)
-    
-    def satisfies_constraints(entry):
-        if (entry.B + entry.A) <= total_nodes:
-            if (entry.f_gw >= f_gw) and (entry.f_mix >= f_mix):
-                return True
-        return False
-    
-    best_entry = None
-    lowest_cost = float('inf')
-    for entry in file:
-        if satisfies_constraints(entry):
-            total = entry.total_cost
-            if total < lowest_cost:
-                lowest_cost = total
-                best_entry = entry
+def config_for_AAAAA_constraints(drop_file, f_gw, f_mix, total_nodes, cost_model=None):
+    results = RESULT_STORE.get(drop_file, cost_model)
+    best = results.pareto().cheapest(f_gw, f_mix, total_nodes)
+    return results.result(best) if best is not None else None
 
-    return best_entry
 
-
-def config_for_AstarA_constraints(file_gw1, file_gw2, f_gw, total_nodes):
-    gw = Result.from_file(file_gw1) 
-    if file_gw2 is not None:
-        gw += Result.from_file(file_gw2)
-    
-    def satisfies_constraints(gw_entry):
-        if (gw_entry.B + gw_entry.A) <= total_nodes:
-            if (gw_entry.f_gw >= f_gw):
-                return True
-        return False
+def config_for_AstarA_constraints(file_gw1, file_gw2, f_gw, total_nodes, cost_model=None):
+    files = [file_gw1] if file_gw2 is None else [file_gw1, file_gw2]
     
     best_entry = None
     lowest_cost = float('inf')
-    for gw_entry in gw:
-        if satisfies_constraints(gw_entry):
-            total = gw_entry.total_cost
-            if total < lowest_cost:
-                lowest_cost = total
-                best_entry = gw_entry
+    for file in files:
+        gw = RESULT_STORE.get(file, cost_model)
+        best = gw.pareto().cheapest(f_gw, total_nodes=total_nodes)
+        if best is not None and gw.total_cost[best] < lowest_cost:
+            lowest_cost = gw.total_cost[best]
+            best_entry = gw.result(best)
     
     return best_entry
-    
 
+
+def min_cost_curve(file, f_gw, f_mix=None, total_nodes=None, cost_model=None):
+    """
+    Lowest total cost meeting many thresholds at once, e.g. a whole curve of f_gw targets.
+    Parameters:
+        file: results file
+        f_gw, f_mix, total_nodes: smallest f_gw, smallest f_mix (None for any) and largest B + A (None for any),
+                                  arrays or numbers broadcast together
+        cost_model: prices of the costs (CostModel), the paper's if None
+    Returns:
+        array of the lowest total cost of every threshold, inf where no entry meets it
+    """
+    results = RESULT_STORE.get(file, cost_model)
+    best = results.pareto().cheapest(np.atleast_1d(f_gw), f_mix, total_nodes)
+    return np.where(best >= 0, results.total_cost[best], np.inf)
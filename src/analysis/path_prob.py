@@ -2,7 +2,8 @@ from collections import defaultdict
 import matplotlib.pyplot as plt
 import numpy as np
 import math
-from .Result import Result, Config
+from .Result import Config
+from .ResultStore import RESULT_STORE
 
 
 def combined_f_to_path_probs(mode, config):
@@ -26,12 +27,11 @@ def combined_f_to_path_probs(mode, config):
         f_field = 'f_mix'
         path = '*AAA*'
     
-    results = Result.from_file(filename)
+    results = RESULT_STORE.get(filename)
     grouped = defaultdict(list) # same fraction of rounded f --> diff associated path_probs
     
-    for r in results:
-        f_val = getattr(r, f_field)
-        grouped[f_val].append(r.path_prob.get(path, 0.0))
+    for f_val, path_prob in zip(getattr(results, f_field).tolist(), results.path_prob(path).tolist()):
+        grouped[f_val].append(path_prob)
     
     output = []
     output.append({f_field: 0.0, path: 0.0})
@@ -1,11 +1,12 @@
 from ..simulation.SimNode import Config as Config_sim
 from .Result import Config as Config_result
 from .path_prob import min_f_for_required_paths
-from .min_cost import min_cost_config_for_AstarA, min_cost_config_for_AAAAA, config_for_AAAAA_constraints, config_for_AstarA_constraints
+from .min_cost import min_cost_config_for_AstarA, min_cost_config_for_AAAAA, config_for_AAAAA_constraints, config_for_AstarA_constraints, min_cost_curve
 import math
+import numpy as np
 
 
-def table(dropfile1: str, dropfile2: str, config):
+def table(dropfile1: str, dropfile2: str, config, cost_model=None):
     """
     Output table comparing different attack strategies.
     Args:
@@ -13,6 +14,7 @@ def table(dropfile1: str, dropfile2: str, config):
         dropfile2: simulation results for AAAAA objective
         (for v1, dropfile1 = dropfile2 since A nodes will always be gateways 
         and B nodes will always be mixnodes which can be selected into the active set)
+        cost_model: prices of the costs (CostModel), the paper's if None
     """
     GW_FILE = config.GW_FILE
     MIX_FILE = config.MIX_FILE
@@ -40,12 +42,12 @@ def table(dropfile1: str, dropfile2: str, config):
         f_mix = math.ceil( (num_mix/total_mix) * 100) / 100
 
     # optimal B, A, stake set for baseline staking attack 
-    baseline_gw = min_cost_config_for_AstarA(file=GW_FILE, f_gw=f_gw)
-    baseline_mix = min_cost_config_for_AAAAA(file=MIX_FILE, f_gw=f_gw, f_mix=f_mix)
+    baseline_gw = min_cost_config_for_AstarA(file=GW_FILE, f_gw=f_gw, cost_model=cost_model)
+    baseline_mix = min_cost_config_for_AAAAA(file=MIX_FILE, f_gw=f_gw, f_mix=f_mix, cost_model=cost_model)
     
     # optimal B, A, stake set for framing attack
-    perf_gw = min_cost_config_for_AstarA(file=dropfile1, f_gw=f_gw)
-    perf_mix = min_cost_config_for_AAAAA(file=dropfile2, f_gw=f_gw, f_mix=f_mix)
+    perf_gw = min_cost_config_for_AstarA(file=dropfile1, f_gw=f_gw, cost_model=cost_model)
+    perf_mix = min_cost_config_for_AAAAA(file=dropfile2, f_gw=f_gw, f_mix=f_mix, cost_model=cost_model)
     
     # print results - lowest cost for baseline and framing attack
     if baseline_gw is not None and baseline_mix is not None:
@@ -74,19 +76,16 @@ def table(dropfile1: str, dropfile2: str, config):
     
     # print results - with constraints setting for framing attack
     max_total_nodes = 1000
+    total_nodes = np.arange(10, max_total_nodes + 1, 10)
     
-    # with constraints for A***A
+    # with constraints for A***A: the fewest total nodes whose cheapest config saves on the baseline
     best_entry_AstarA = None
     best_savings_gw = None
-    for total_nodes in range(10, max_total_nodes + 1, 10):
-        candidate_gw = config_for_AstarA_constraints(file_gw1=dropfile1, file_gw2=None, f_gw=f_gw, total_nodes=total_nodes)
-        if candidate_gw is None:
-            continue
-        savings = (baseline_AstarA_costs - candidate_gw.total_cost) / baseline_AstarA_costs
-        if savings >= 0:
-            best_entry_AstarA = candidate_gw
-            best_savings_gw = savings
-            break
+    saving = np.flatnonzero(min_cost_curve(dropfile1, f_gw, total_nodes=total_nodes, cost_model=cost_model) <= baseline_AstarA_costs)
+    if len(saving):
+        best_entry_AstarA = config_for_AstarA_constraints(file_gw1=dropfile1, file_gw2=None, f_gw=f_gw, total_nodes=int(total_nodes[saving[0]]),
+                                                          cost_model=cost_model)
+        best_savings_gw = (baseline_AstarA_costs - best_entry_AstarA.total_cost) / baseline_AstarA_costs
         
     if best_entry_AstarA is not None:
         gw_entry = best_entry_AstarA
@@ -96,18 +95,14 @@ def table(dropfile1: str, dropfile2: str, config):
         )
 
     
-    # with constraints for AAAAA
+    # with constraints for AAAAA: the same
     best_entry_AAAAA = None
     best_savings_all = None
-    for total_nodes in range(10, max_total_nodes + 1, 10):
-        candidate_all = config_for_AAAAA_constraints(drop_file=dropfile2, f_gw=f_gw, f_mix=f_mix, total_nodes=total_nodes)
-        if candidate_all is None:
-            continue
-        savings = (baseline_AAAAA_costs - candidate_all.total_cost) / baseline_AAAAA_costs
-        if savings >= 0:
-            best_entry_AAAAA = candidate_all
-            best_savings_all = savings
-            break
+    saving = np.flatnonzero(min_cost_curve(dropfile2, f_gw, f_mix, total_nodes, cost_model) <= baseline_AAAAA_costs)
+    if len(saving):
+        best_entry_AAAAA = config_for_AAAAA_constraints(drop_file=dropfile2, f_gw=f_gw, f_mix=f_mix, total_nodes=int(total_nodes[saving[0]]),
+                                                      cost_model=cost_model)
+        best_savings_all = (baseline_AAAAA_costs - best_entry_AAAAA.total_cost) / baseline_AAAAA_costs
     
     if best_entry_AAAAA is not None:
         all_entry = best_entry_AAAAA
@@ -0,0 +1,198 @@
+import numpy as np
+from typing import Dict, List, Optional
+
+from .SimNode import Config, SimNode
+
+config = Config()
+
+# integer codes for SimNode.role
+ROLE_MIXNODE = 0
+ROLE_GATEWAY = 1
+ROLE_CODES = {'mixnode': ROLE_MIXNODE, 'gateway': ROLE_GATEWAY}
+
+# integer codes for SimNode.type
+TYPE_T = 0
+TYPE_A = 1
+TYPE_B = 2
+TYPE_CODES = {'T': TYPE_T, 'A': TYPE_A, 'B': TYPE_B}
+
+HIST_LEN = 24 * 4 # number of rounds kept in a node's score history
+
+
+class ArrayTopology:
+    """
+    Struct-of-arrays topology: one NumPy column per SimNode field, one row per node.
+    Rows are ordered so that the nodes on each layer appear in the same order
+    as in the Dict[int, List[SimNode]] topology they mirror.
+
+    A topology can hold several independent replicates of a network (see ArrayTopologyPool.reset),
+    told apart by the replicate column. Nodes of different replicates are never
+    on the same path or in the same active set.
+    """
+
+    def __init__(
+        self,
+        role: np.ndarray,
+        layer: np.ndarray,
+        type: np.ndarray,
+        uptime: np.ndarray,
+        score_hist: np.ndarray,
+        stake: np.ndarray,
+        replicate: Optional[np.ndarray] = None,
+    ) -> None:
+        n = len(role)
+        self.role = np.asarray(role, dtype=np.int8) # ROLE_MIXNODE or ROLE_GATEWAY
+        self.layer = np.asarray(layer, dtype=np.int8) # layer
+        self.type = np.asarray(type, dtype=np.int8) # TYPE_T, TYPE_A or TYPE_B
+
+        self.complete = np.zeros(n, dtype=np.float64) # test packets successfully returned to NM
+        self.incomplete = np.zeros(n, dtype=np.float64) # test packets that didn't return to NM
+        self.fail = np.zeros(n, dtype=np.int64) # consecutive test packet fails
+
+        self.uptime = np.array(uptime, dtype=np.float64) # average of the score history
+        # score history as a (nodes x HIST_LEN) ring buffer, NaN marks a round without a score.
+        # column hist_pos always holds the oldest score, which is the next one to be overwritten.
+        self.score_hist = np.array(score_hist, dtype=np.float64).reshape(n, HIST_LEN)
+        self.hist_pos = 0
+        # running sum and number of the scores in the history, so that uptime is updated in O(1) per node
+        self.hist_sum = np.nansum(self.score_hist, axis=1)
+        self.hist_count = np.count_nonzero(~np.isnan(self.score_hist), axis=1)
+
+        self.stake = np.array(stake, dtype=np.float64)
+        self.select_prob = np.zeros(n, dtype=np.float64)
+
+        self.isactive = np.zeros(n, dtype=bool)
+
+        # for NMv1
+        self.isvalidated = np.zeros(n, dtype=bool)
+        self.test_layer = np.zeros(n, dtype=np.int8)
+
+        self.replicate = np.zeros(n, dtype=np.int64) if replicate is None else np.asarray(replicate, dtype=np.int64)
+        self.replicates = int(self.replicate.max()) + 1 if n else 1
+
+        self.index_layers()
+
+    def index_layers(self) -> None:
+        """
+        Index the nodes on each layer.
+        layers[l] holds the nodes on layer l of all replicates. layer_nodes holds all nodes
+        grouped by (replicate, layer), so the nodes on layer l of replicate r are
+        layer_nodes[layer_start[r, l] : layer_start[r, l] + layer_size[r, l]], in row order.
+        """
+        self.layers = [np.flatnonzero(self.layer == layer) for layer in range(config.total_layers)]
+        group = self.replicate * config.total_layers + self.layer
+        self.layer_nodes = np.argsort(group, kind='stable')
+        self.layer_size = np.bincount(group, minlength=self.replicates * config.total_layers).reshape(self.replicates, config.total_layers)
+        self.layer_start = (np.cumsum(self.layer_size) - self.layer_size.ravel()).reshape(self.layer_size.shape)
+
+    def __len__(self) -> int:
+        return len(self.role)
+
+    @classmethod
+    def from_topology(cls, topology: Dict[int, List[SimNode]]) -> "ArrayTopology":
+        """
+        Build the array form of a layer -> list of SimNode topology.
+        Args:
+            topology: layer -> a list of nodes on that layer
+        Returns:
+            the same nodes, one row each, with all counters copied over
+        """
+        nodes = [node for layer in range(config.total_layers) for node in topology[layer]]
+
+        score_hist = [
+            [np.nan if v is None else v for v in reversed(node.score_hist)] # oldest score first
+            for node in nodes
+        ]
+        arrays = cls(
+            role = [ROLE_CODES[node.role] for node in nodes],
+            layer = [node.layer for node in nodes],
+            type = [TYPE_CODES[node.type] for node in nodes],
+            uptime = [node.uptime for node in nodes],
+            score_hist = np.array(score_hist, dtype=np.float64).reshape(len(nodes), HIST_LEN),
+            stake = [node.stake for node in nodes],
+        )
+        arrays.complete[:] = [node.complete for node in nodes]
+        arrays.incomplete[:] = [node.incomplete for node in nodes]
+        arrays.fail[:] = [node.fail for node in nodes]
+        arrays.select_prob[:] = [node.select_prob for node in nodes]
+        arrays.isactive[:] = [node.isactive for node in nodes]
+        arrays.isvalidated[:] = [node.isvalidated for node in nodes]
+        arrays.test_layer[:] = [node.test_layer for node in nodes]
+        return arrays
+
+    def add_nodes(
+        self,
+        role: int,
+        layer: np.ndarray,
+        type: int,
+        uptime: float,
+        stake: float,
+    ) -> "ArrayTopology":
+        """
+        Return a new topology with fresh nodes of one role and type appended.
+        Args:
+            role: role code shared by the new nodes
+            layer: layer of each new node, as (replicates x new nodes per replicate) if there are several replicates
+            type: type code shared by the new nodes
+            uptime: initial uptime (and score history) of the new nodes
+            stake: stake on each new node
+        Returns:
+            topology: a copy of this topology with the new nodes added
+        """
+        layer = np.asarray(layer, dtype=np.int8).reshape(self.replicates, -1)
+        new_replicate = np.repeat(np.arange(self.replicates), layer.shape[1])
+        layer = layer.ravel()
+        k = len(layer)
+        new_hist = np.full((k, HIST_LEN), uptime, dtype=np.float64)
+        topology = ArrayTopology(
+            role = np.concatenate([self.role, np.full(k, role, dtype=np.int8)]),
+            layer = np.concatenate([self.layer, layer]),
+            type = np.concatenate([self.type, np.full(k, type, dtype=np.int8)]),
+            uptime = np.concatenate([self.uptime, np.full(k, uptime)]),
+            score_hist = np.concatenate([np.roll(self.score_hist, -self.hist_pos, axis=1), new_hist]),
+            stake = np.concatenate([self.stake, np.full(k, stake)]),
+            replicate = np.concatenate([self.replicate, new_replicate]),
+        )
+        for field in ('complete', 'incomplete', 'fail', 'select_prob', 'isactive', 'isvalidated', 'test_layer'):
+            getattr(topology, field)[:len(self)] = getattr(self, field)
+        return topology
+
+    def head(self, n: int) -> "ArrayTopology":
+        """
+        View of the first n nodes that shares memory with this topology.
+        Args:
+            n: number of nodes to keep
+        Returns:
+            topology: the first n rows of every column, with its own layer index
+        """
+        topology = object.__new__(ArrayTopology)
+        for field, column in vars(self).items():
+            if isinstance(column, np.ndarray):
+                setattr(topology, field, column[:n])
+        topology.hist_pos = self.hist_pos
+        topology.replicates = int(topology.replicate.max()) + 1 if n else 1
+        topology.index_layers()
+        return topology
+
+    def average_uptime_24(self, new_score: np.ndarray) -> None:
+        """
+        Update every node's 24-epoch-averaged performance score.
+        Args:
+            new_score: this round's score per node, NaN if a node had no test packets
+        """
+        old_score = self.score_hist[:, self.hist_pos]
+        old_scored = ~np.isnan(old_score)
+        new_scored = ~np.isnan(new_score)
+        self.hist_sum += np.where(new_scored, new_score, 0) - np.where(old_scored, old_score, 0)
+        self.hist_count += new_scored.astype(np.int64) - old_scored
+        self.score_hist[:, self.hist_pos] = new_score
+        self.hist_pos = (self.hist_pos + 1) % HIST_LEN
+        self.uptime = self.hist_sum / self.hist_count
+
+    def active_set_select_prob(self) -> None:
+        """
+        Assign every node's active set selection probability
+        based on stake and performance score.
+        """
+        stake_pct = np.minimum(self.stake / config.stake_saturation, 1.0)
+        self.select_prob = (self.uptime ** 20) * stake_pct
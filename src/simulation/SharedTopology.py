@@ -0,0 +1,94 @@
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Any, Dict, Tuple
+
+from .ArrayTopology import ArrayTopology
+
+
+class SharedTopology:
+    """
+    The static columns of a base ArrayTopology (role, layer, type, uptime, score history, stake),
+    exported once into one block of shared memory for the workers of a pool to read.
+
+    Pickling it (e.g. as a pool initializer argument) only sends the name and layout of the block,
+    and the copy unpickled in a worker attaches to the same memory, so the base network is neither
+    pickled nor copied per worker. The per-run state (attacker nodes, counters) stays private
+    to each worker, see TopologyPool and ArrayTopologyPool.
+    The process that exports the topology frees the block with close, once the workers are done.
+    """
+
+    FIELDS = ('role', 'layer', 'type', 'uptime', 'score_hist', 'stake', 'hist_sum', 'hist_count')
+
+    def __init__(self, topology: ArrayTopology) -> None:
+        """
+        Args:
+            topology: base topology to export, a single replicate
+        """
+        columns = {field: getattr(topology, field) for field in self.FIELDS}
+        columns['score_hist'] = np.roll(topology.score_hist, -topology.hist_pos, axis=1) # oldest score first
+
+        # field -> (offset in the block, dtype, shape), every column 8-byte aligned
+        self.layout: Dict[str, Tuple[int, str, Tuple[int, ...]]] = {}
+        size = 0
+        for field, column in columns.items():
+            size = -(-size // 8) * 8
+            self.layout[field] = (size, column.dtype.str, column.shape)
+            size += column.nbytes
+
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.owner = True
+        for field, column in columns.items():
+            self.column(field)[...] = column
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'name': self.memory.name, 'layout': self.layout}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.layout = state['layout']
+        self.memory = shared_memory.SharedMemory(name=state['name'])
+        self.owner = False
+
+    def __len__(self) -> int:
+        return self.layout['role'][2][0]
+
+    def column(self, field: str) -> np.ndarray:
+        """View of one column in the shared memory."""
+        offset, dtype, shape = self.layout[field]
+        return np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+
+    def topology(self) -> ArrayTopology:
+        """
+        The base topology, with its static columns as read-only views of the shared memory
+        and its counters cleared. Valid as long as this object is.
+        """
+        n = len(self)
+        topology = object.__new__(ArrayTopology)
+        for field in self.FIELDS:
+            column = self.column(field)
+            column.flags.writeable = False
+            setattr(topology, field, column)
+        topology.hist_pos = 0
+
+        topology.complete = np.zeros(n, dtype=np.float64)
+        topology.incomplete = np.zeros(n, dtype=np.float64)
+        topology.fail = np.zeros(n, dtype=np.int64)
+        topology.select_prob = np.zeros(n, dtype=np.float64)
+        topology.isactive = np.zeros(n, dtype=bool)
+        topology.isvalidated = np.zeros(n, dtype=bool)
+        topology.test_layer = np.zeros(n, dtype=np.int8)
+        topology.replicate = np.zeros(n, dtype=np.int64)
+        topology.replicates = 1
+        topology.index_layers()
+        return topology
+
+    def close(self) -> None:
+        """Detach from the shared memory, and free it if this process exported the topology."""
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self) -> "SharedTopology":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
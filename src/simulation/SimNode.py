@@ -15,6 +15,7 @@ class Config:
         self.stake_saturation = 1_034_081 # stake saturation amount in NYM 
         self.stake_min = [100] # minimum stake amount required to run a node in NYM 
         self.num_validated_paths = 3 # num of validated_paths that all other nodes uses to form test paths in NMv1
+        self.packets_per_path = 3 # num of test packets NM sends down the same test path
         
         #====== custom values to test different attack settings ======#
         self.epochs = 24 # duration of attack
@@ -67,6 +68,31 @@ class SimNode:
         self.isvalidated = bool(isvalidated) # if a node is being selected on the validated path
         self.test_layer = int(test_layer) # the layer a node is on for a test packet
     
+    def reset(
+        self, 
+        role: str, 
+        layer: int, 
+        uptime: float, 
+        score_hist: List[Optional[float]], 
+        stake: float,
+    ) -> None:
+        """
+        Reset a node in place to the start of a simulation run,
+        with all counters cleared and the given role, layer, history and stake.
+        """
+        self.role = role
+        self.layer = int(layer)
+        self.complete = 0.0
+        self.incomplete = 0.0
+        self.fail = 0
+        self.uptime = float(uptime)
+        self.score_hist[:] = score_hist
+        self.stake = float(stake)
+        self.select_prob = 0.0
+        self.isactive = False
+        self.isvalidated = False
+        self.test_layer = 0
+    
     def active_set_select_prob(self) -> None:
         """
         Assign a node's active set selection probability 
@@ -0,0 +1,125 @@
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple
+
+from .TaskScheduler import TaskScheduler
+
+
+class Sweep:
+    """
+    The tasks of one experiment, as groups of units for a TaskScheduler (see TaskScheduler),
+    and what to do with their results. run_sweeps runs several sweeps as one queue of tasks.
+    Subclasses set the attributes and override on_result, and skipped_result and finish if needed.
+    """
+
+    fn: Callable # module level function run on each unit, with the group args followed by the unit args
+    groups: Sequence[Tuple[Tuple, Sequence[Tuple]]] # (group args, units) of every group
+    costs: Sequence[float] # estimated cost of one unit of each group
+    min_units: Optional[int] = None # units every group runs before it may be stopped, None if it isn't stopped early
+    skip: Set[Tuple[int, int]] = set() # (group index, unit index) of the units already done
+
+    def on_result(self, g: int, u: int, results: Any) -> bool:
+        """
+        Handle the result of a unit, called in unit order within each group.
+        Returns:
+            whether to run no more units of group g
+        """
+        raise NotImplementedError
+
+    def skipped_result(self, g: int, u: int) -> Any:
+        """Result of a skipped unit, passed to on_result in its place."""
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Called once every group has finished or been stopped."""
+
+
+def run_task(args: Tuple) -> Any:
+    """Run a unit of any sweep, args are the sweep's fn followed by its args."""
+    fn, *args = args
+    return fn(tuple(args))
+
+
+def run_sweeps(pool: Pool, sweeps: Sequence[Sweep], workers: Optional[int] = None) -> None:
+    """
+    Run the tasks of several sweeps on one pool, as one queue: the groups of every sweep
+    are scheduled together, costliest first, so the workers don't idle at the tail of each sweep.
+    Each sweep gets the results of its own groups, and finishes as soon as they are done.
+    Args:
+        pool: process pool
+        sweeps: sweeps to run
+        workers: number of worker processes of the pool, cpu_count() if None
+    """
+    groups: List[Tuple[Tuple, Sequence[Tuple]]] = []
+    costs: List[float] = []
+    min_units: List[Optional[int]] = []
+    skip: Set[Tuple[int, int]] = set()
+    owners: List[Tuple[Sweep, int]] = [] # group index -> (sweep, index of the group in the sweep)
+    for sweep in sweeps:
+        offset = len(groups)
+        for g, (group, units) in enumerate(sweep.groups):
+            groups.append(((sweep.fn,) + tuple(group), units))
+            owners.append((sweep, g))
+        costs.extend(sweep.costs)
+        min_units.extend([sweep.min_units] * len(sweep.groups))
+        skip |= {(offset + g, u) for g, u in sweep.skip}
+
+    # groups of each sweep still running, a group without units (e.g. in a shard, see shard_units) has nothing to run
+    running = {id(sweep): len([units for _, units in sweep.groups if units]) for sweep in sweeps}
+    def group_done(sweep: Sweep) -> None:
+        running[id(sweep)] -= 1
+        if not running[id(sweep)]:
+            sweep.finish()
+
+    for sweep in sweeps:
+        if not running[id(sweep)]:
+            sweep.finish()
+
+    scheduler = TaskScheduler(groups, costs, workers or cpu_count(), skip=skip, min_units=min_units)
+
+    def on_result(g: int, u: int, results: Any) -> None:
+        sweep, local = owners[g]
+        if sweep.on_result(local, u, results):
+            scheduler.stop(g)
+            group_done(sweep)
+        elif u == len(groups[g][1]) - 1:
+            group_done(sweep)
+
+    def skipped_result(g: int, u: int) -> Any:
+        sweep, local = owners[g]
+        return sweep.skipped_result(local, u)
+
+    scheduler.run(pool, run_task, on_result, skipped_result)
+
+
+def shard_units(groups: Sequence[Tuple[Tuple, Sequence[Tuple]]], shard: Tuple[int, int]) -> List[Tuple[Tuple, List[Tuple]]]:
+    """
+    The units of one shard of a sweep. The units of every group, group after group, are dealt
+    round robin to the shards, so that each shard gets the same share of every group whatever
+    the machine it runs on, and the shards of a sweep can be merged (see replay).
+    Args:
+        groups: (group args, units) of every group of the sweep
+        shard: (i, N) for shard i of N, from 1
+    Returns:
+        the groups, in the same order, with only the units of the shard
+    """
+    i, n = shard
+    sharded = []
+    first = 0 # index of the group's first unit in the whole sweep
+    for group, units in groups:
+        sharded.append((group, [unit for k, unit in enumerate(units, start=first) if k % n == i - 1]))
+        first += len(units)
+    return sharded
+
+
+def replay(sweep: Sweep) -> None:
+    """
+    Pass every unit of a sweep to it from skipped_result, in unit order, without running anything,
+    e.g. to merge the task logs of the shards of a sweep. The sweep gets the same results
+    in the same order as if it had run them.
+    """
+    for g, (_, units) in enumerate(sweep.groups):
+        for u in range(len(units)):
+            if sweep.on_result(g, u, sweep.skipped_result(g, u)):
+                break
+    sweep.finish()
@@ -0,0 +1,116 @@
+import os
+import json
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class TaskLog:
+    """
+    Append-only JSON lines log of the finished tasks of a sweep, so that an interrupted sweep can resume.
+    The first line holds the settings of the sweep, every further line one task's key and its results.
+    Each line is flushed to disk as soon as its task finishes.
+    """
+
+    def __init__(self, path: str, settings: Dict[str, Any], resume: bool = False) -> None:
+        """
+        Args:
+            path: file of the log
+            settings: settings of the sweep, a resumed log must have been written with the same settings
+            resume: keep the tasks already in the log, otherwise start a new log
+        """
+        self.path = path
+        self.settings = settings
+        self.done: Dict[Tuple, int] = {} # task key -> offset of its line in the log
+
+        # rewrite the log with its complete lines only, so that a line cut short by a crash is dropped
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(settings) + '\n')
+            if resume and os.path.exists(path):
+                for task, results in self.read(settings):
+                    self.done[task] = f.tell()
+                    f.write(json.dumps({'task': list(task), 'results': results}) + '\n')
+        os.replace(tmp_path, path)
+        self.file = open(path, 'a')
+        self.reader = None
+
+    def read(self, settings: Dict[str, Any]) -> Iterator[Tuple[Tuple, List[Dict[str, Any]]]]:
+        """
+        Read the finished tasks of the log, one line at a time.
+        Args:
+            settings: settings of the sweep the log must have been written by
+        Yields:
+            task key, results of that task, in the order the tasks finished
+        """
+        with open(self.path) as f:
+            header = f.readline()
+            if not header:
+                return
+            if json.loads(header) != settings:
+                raise ValueError(f"{self.path} was written by a sweep with other settings: {header.strip()}")
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError: # the last line, cut short by a crash
+                    return
+                yield tuple(entry['task']), entry['results']
+
+    def results(self, task: Tuple) -> List[Dict[str, Any]]:
+        """Results of a task in the log."""
+        if self.reader is None:
+            self.reader = open(self.path)
+        self.file.flush()
+        self.reader.seek(self.done[task])
+        return json.loads(self.reader.readline())['results']
+
+    def append(self, task: Tuple, results: List[Dict[str, Any]]) -> None:
+        """
+        Record a finished task.
+        Args:
+            task: key of the task
+            results: results of the task
+        """
+        self.done[task] = self.file.tell()
+        self.file.write(json.dumps({'task': list(task), 'results': results}) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+        if self.reader is not None:
+            self.reader.close()
+
+
+def shard_log_path(file_path: str, shard: Tuple[int, int]) -> str:
+    """Task log of shard (i, N) of the sweep whose results go to file_path, a .json file."""
+    i, n = shard
+    return f"{file_path[:-len('.json')]}.shard-{i}-of-{n}.tasks.jsonl"
+
+
+class MergedTaskLog:
+    """
+    The task logs of every shard of a sweep (see Sweep.shard_units), read as one TaskLog
+    to merge the shards' results. The log of shard i of N holds the settings of the sweep plus {'shard': 'i/N'}.
+    """
+
+    def __init__(self, file_path: str, settings: Dict[str, Any], shards: int) -> None:
+        """
+        Args:
+            file_path: results file of the sweep, see shard_log_path
+            settings: settings of the sweep, without the shard
+            shards: number of shards
+        """
+        self.logs: List[TaskLog] = []
+        for i in range(1, shards + 1):
+            path = shard_log_path(file_path, (i, shards))
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No task log for shard {i}/{shards}: {path}")
+            self.logs.append(TaskLog(path, {**settings, 'shard': f"{i}/{shards}"}, resume=True))
+        self.done = {task: log for log in self.logs for task in log.done} # task key -> log holding it
+
+    def results(self, task: Tuple) -> List[Dict[str, Any]]:
+        """Results of a task in the log of any shard."""
+        return self.done[task].results(task)
+
+    def close(self) -> None:
+        for log in self.logs:
+            log.close()
@@ -0,0 +1,186 @@
+import time
+import queue
+from multiprocessing.pool import Pool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+from tqdm import tqdm
+
+
+def run_chunk(args: Tuple[Callable, Tuple, List[Tuple]]) -> Tuple[float, List[Any]]:
+    """
+    Run a chunk of units of one group in a worker.
+    Args:
+        args: (fn, group args, units), fn is called once per unit with the group args followed by the unit args
+    Returns:
+        seconds the chunk took, results of the units in order
+    """
+    fn, group, units = args
+    start = time.perf_counter()
+    results = [fn(group + unit) for unit in units]
+    return time.perf_counter() - start, results
+
+
+class TaskScheduler:
+    """
+    Schedules the work of a sweep on a process pool. The work is a list of groups (combinations),
+    each with a list of units (batches of runs). A task sent to a worker is a chunk of consecutive
+    units of one group, so the runs of a combination stay on one worker and share its topology pool.
+
+    Groups are handed out costliest first, from a per-unit cost estimate, so the long combinations
+    don't end up in the tail. Chunks are sized from the observed seconds per unit of cost,
+    to take about target_seconds, and shrink as the remaining work runs out (guided self-scheduling),
+    so the cores finish together.
+
+    A group can be stopped early (see stop), e.g. once its estimates have converged. Past its first
+    min_units units, such a group only has one chunk in flight at a time, of at most half the units
+    it has done, so that little work is wasted past the point where it stops.
+    """
+
+    def __init__(
+        self,
+        groups: Sequence[Tuple[Tuple, Sequence[Tuple]]],
+        costs: Sequence[float],
+        workers: int,
+        target_seconds: float = 2.0,
+        skip: Optional[Set[Tuple[int, int]]] = None,
+        min_units: Union[Optional[int], Sequence[Optional[int]]] = None,
+    ) -> None:
+        """
+        Args:
+            groups: (group args, units) for every group, each unit as a tuple of args
+            costs: estimated cost of one unit of each group, in any unit
+            workers: number of worker processes
+            target_seconds: wall time a chunk should take once the throughput is known
+            skip: (group index, unit index) of the units already done, they aren't run
+            min_units: if groups may be stopped early, number of units every group runs anyway,
+                       or one such number (None if it isn't stopped early) per group
+        """
+        self.groups = groups
+        self.costs = costs
+        self.workers = workers
+        self.target_seconds = target_seconds
+        self.skip = skip or set()
+        self.min_units = list(min_units) if isinstance(min_units, (list, tuple)) else [min_units] * len(groups)
+
+        # units to run, costliest group first
+        self.order = sorted(range(len(groups)), key=lambda g: -costs[g])
+        self.pending = {g: [u for u in range(len(groups[g][1])) if (g, u) not in self.skip] for g in self.order}
+        self.remaining_cost = sum(costs[g] * len(units) for g, units in self.pending.items())
+        self.num_units = sum(len(units) for units in self.pending.values())
+
+        self.seconds = 0.0 # observed wall time of the finished chunks
+        self.cost_done = 0.0 # estimated cost of the finished chunks
+        self.in_flight = {g: 0 for g in self.order} # units of each group handed out and not finished yet
+        self.stopped: Set[int] = set()
+
+    def next_chunk(self) -> Optional[Tuple[int, List[int]]]:
+        """
+        Next chunk to run.
+        Returns:
+            (group index, unit indices), None when no unit can be handed out now
+        """
+        self.order = [g for g in self.order if self.pending[g]]
+        for g in self.order:
+            units = self.pending[g]
+            cost = self.costs[g]
+            if self.cost_done > 0:
+                seconds_per_cost = self.seconds / self.cost_done
+                budget = min(self.target_seconds / seconds_per_cost, self.remaining_cost / (2 * self.workers))
+                n = max(1, int(budget // cost)) if cost > 0 else len(units)
+            else:
+                n = 1 # a first chunk of one unit, to measure the throughput
+
+            min_units = self.min_units[g]
+            if min_units is not None and units[0] >= min_units:
+                if self.in_flight[g]:
+                    continue # wait for the group's last chunk, it may stop the group
+                n = min(n, max(1, units[0] // 2))
+            elif min_units is not None:
+                n = min(n, len([u for u in units if u < min_units]))
+
+            self.pending[g] = units[n:]
+            self.in_flight[g] += len(units[:n])
+            self.remaining_cost -= cost * len(units[:n])
+            return g, units[:n]
+        return None
+
+    def record(self, g: int, units: List[int], seconds: float) -> None:
+        """Record the wall time of a finished chunk."""
+        self.seconds += seconds
+        self.cost_done += self.costs[g] * len(units)
+        self.in_flight[g] -= len(units)
+
+    def stop(self, g: int) -> None:
+        """Run no more units of group g, and don't pass on the results of the ones still running."""
+        self.stopped.add(g)
+        self.remaining_cost -= self.costs[g] * len(self.pending[g])
+        self.pending[g] = []
+
+    def run(
+        self,
+        pool: Pool,
+        fn: Callable,
+        on_result: Callable[[int, int, Any], None],
+        skipped_result: Optional[Callable[[int, int], Any]] = None,
+    ) -> None:
+        """
+        Run every unit on the pool.
+        Args:
+            pool: process pool
+            fn: module level function run on each unit, see run_chunk
+            on_result: called with (group index, unit index, result) for every unit,
+                       in unit order within each group
+            skipped_result: result of a skipped unit, passed to on_result in its place
+        """
+        finished: "queue.Queue" = queue.Queue()
+        in_flight = 0
+
+        def submit() -> bool:
+            chunk = self.next_chunk()
+            if chunk is None:
+                return False
+            g, units = chunk
+            group, all_units = self.groups[g]
+            pool.apply_async(run_chunk, ((fn, group, [all_units[u] for u in units]),),
+                             callback=lambda out: finished.put((g, units, out)), error_callback=finished.put)
+            return True
+
+        # results wait here until the units before them in their group are passed on
+        next_unit = {g: 0 for g in range(len(self.groups))}
+        waiting: Dict[Tuple[int, int], Any] = {}
+
+        def flush(g: int) -> None:
+            while next_unit[g] < len(self.groups[g][1]) and g not in self.stopped:
+                u = next_unit[g]
+                if (g, u) in waiting:
+                    on_result(g, u, waiting.pop((g, u)))
+                elif (g, u) in self.skip:
+                    on_result(g, u, skipped_result(g, u))
+                else:
+                    return
+                next_unit[g] += 1
+
+        for g in range(len(self.groups)):
+            flush(g)
+
+        while in_flight < 2 * self.workers and submit():
+            in_flight += 1
+
+        with tqdm(total=self.num_units) as progress:
+            while in_flight:
+                out = finished.get()
+                if isinstance(out, BaseException):
+                    raise out
+                g, units, (seconds, results) = out
+                in_flight -= 1
+                self.record(g, units, seconds)
+
+                for u, result in zip(units, results):
+                    waiting[(g, u)] = result
+                flush(g)
+                if g in self.stopped:
+                    waiting = {key: result for key, result in waiting.items() if key[0] != g}
+                progress.total = progress.n + len(units) + sum(len(units) for units in self.pending.values()) + sum(self.in_flight.values())
+                progress.update(len(units))
+
+                while in_flight < 2 * self.workers and submit():
+                    in_flight += 1
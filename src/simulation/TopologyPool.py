@@ -0,0 +1,207 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from .SimNode import SimNode
+from .ArrayTopology import ArrayTopology, HIST_LEN, ROLE_MIXNODE, ROLE_GATEWAY, TYPE_A, TYPE_B, ROLE_CODES, TYPE_CODES
+
+ROLE_NAMES = {code: name for name, code in ROLE_CODES.items()}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+def split_A_nodes(A: int, mode: str, version: str) -> Tuple[int, int]:
+    """
+    Number of A mixnodes and A gateways: in v1, or for A***A, every A node is a gateway (in v1 the
+    B nodes can harm the other nodes without harming themselves), otherwise 3/5 of them are mixnodes.
+    Args:
+        A: number of attacking nodes
+        mode: A***A or AAAAA
+        version: network monitor v1, or v2, or v3
+    Returns:
+        num_mix, num_gw
+    """
+    if version == 'v1' or mode == 'A***A': # in v1, regardless of mode, A is only gw
+        return 0, A
+    num_mix = int(A * (3/5))
+    return num_mix, A - num_mix
+
+
+class TopologyPool:
+    """
+    Preallocated SimNode topology for one worker: target nodes plus enough B and A nodes
+    for the largest combo, reset in place between runs instead of deep-copying the base topology.
+    The targets are reset from the columns of the base ArrayTopology, which may be shared
+    between the workers (see SharedTopology), so a worker only holds its own run's nodes.
+    """
+
+    def __init__(self, base_topology: ArrayTopology, max_B: int, max_A: int) -> None:
+        self.base_topology = base_topology
+        base = base_topology
+        self.roles = [ROLE_NAMES[role] for role in base.role.tolist()]
+        types = [TYPE_NAMES[type] for type in base.type.tolist()]
+        self.targets = {
+            layer: [SimNode(self.roles[i], layer, types[i], 0, 0, 0, 0, [], 0, False, False, 0) for i in rows]
+            for layer, rows in enumerate(base.layers)
+        }
+        # the targets' starting columns as lists, the same for every run: SimNode keeps its history
+        # newest score first, with None for a round without a score
+        self.uptime = base.uptime.tolist()
+        self.stake = base.stake.tolist()
+        self.score_hist = np.roll(base.score_hist, -base.hist_pos, axis=1)[:, ::-1].tolist()
+        for i in np.flatnonzero(np.isnan(base.score_hist).any(axis=1)):
+            self.score_hist[i] = [None if np.isnan(v) else v for v in self.score_hist[i]]
+        self.B_nodes = [SimNode('mixnode', 1, 'B', 0, 0, 0, 0.98, [0.98] * HIST_LEN, 0, False, False, 0) for _ in range(max_B)]
+        self.A_nodes = [SimNode('gateway', 0, 'A', 0, 0, 0, 0.98, [0.98] * HIST_LEN, 0, False, False, 0) for _ in range(max_A)]
+        self.fresh_hist = [0.98] * HIST_LEN
+
+    def reset(
+        self,
+        B: int,
+        A: int,
+        bstake: float,
+        astake: float,
+        mode: str,
+        version: str,
+        rng: Optional[np.random.Generator] = None,
+    ) -> Dict[int, List[SimNode]]:
+        """
+        The target nodes of the base topology with B and A nodes added, built from the preallocated nodes.
+        B nodes are mixnodes, each placed on layer 1, 2 or 3 uniformly at random. The A nodes are split into
+        mixnodes and gateways by split_A_nodes: A mixnodes are placed like B nodes, A gateways on layer 0
+        with probability 0.4 and on layer 4 otherwise. Every B and A node starts with uptime 0.98 and a full
+        history of 0.98 scores.
+        Args:
+            B: number of bad nodes
+            A: number of attacking nodes
+            bstake: stake for each B node
+            astake: stake for each A node
+            mode: A***A or AAAAA
+            version: network monitor v1, or v2, or v3
+            rng: random generator placing the B and A nodes on layers, a fresh one if None
+        Returns:
+            topology: layer -> list of nodes, valid until the next reset
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if B > len(self.B_nodes) or A > len(self.A_nodes):
+            self.__init__(self.base_topology, max(B, len(self.B_nodes)), max(A, len(self.A_nodes)))
+
+        topology = {}
+        for layer, rows in enumerate(self.base_topology.layers):
+            for node, i in zip(self.targets[layer], rows):
+                # reset copies the history into the node's own list, so the runs can't change self.score_hist
+                node.reset(self.roles[i], layer, self.uptime[i], self.score_hist[i], self.stake[i])
+            topology[layer] = list(self.targets[layer])
+
+        num_mix, num_gw = split_A_nodes(A, mode, version)
+        B_layers = rng.choice([1,2,3], size=B).tolist()
+        mix_layers = rng.choice([1,2,3], size=num_mix).tolist()
+        gw_layers = rng.choice([0, 4], size=num_gw, p=[0.4, 0.6]).tolist()
+
+        for node, layer in zip(self.B_nodes, B_layers):
+            node.reset('mixnode', layer, 0.98, self.fresh_hist, bstake)
+            topology[layer].append(node)
+        for node, (role, layer) in zip(self.A_nodes, [('mixnode', l) for l in mix_layers] + [('gateway', l) for l in gw_layers]):
+            node.reset(role, layer, 0.98, self.fresh_hist, astake)
+            topology[layer].append(node)
+
+        return topology
+
+
+class ArrayTopologyPool:
+    """
+    Preallocated ArrayTopology for one worker: rows for the target nodes plus enough B and A
+    nodes for the largest combo, for as many replicates as the largest batch, reset in place between runs.
+    """
+
+    def __init__(self, base_topology: ArrayTopology, max_B: int, max_A: int, max_replicates: int = 1) -> None:
+        self.base_topology = base_topology
+        self.max_B = max_B
+        self.max_A = max_A
+        self.max_replicates = max_replicates
+        rows = (len(base_topology) + max_B + max_A) * max_replicates
+        self.topology = ArrayTopology(
+            role = np.zeros(rows, dtype=np.int8),
+            layer = np.zeros(rows, dtype=np.int8),
+            type = np.zeros(rows, dtype=np.int8),
+            uptime = np.zeros(rows),
+            score_hist = np.zeros((rows, HIST_LEN)),
+            stake = np.zeros(rows),
+        )
+
+    def reset(
+        self,
+        B: int,
+        A: int,
+        bstake: float,
+        astake: float,
+        mode: str,
+        version: str,
+        replicates: int = 1,
+        rng: Optional[np.random.Generator] = None,
+    ) -> ArrayTopology:
+        """
+        The topology of TopologyPool.reset as an ArrayTopology, written over the preallocated rows,
+        for each of several replicates of the network with their own B and A nodes.
+        Args:
+            replicates: number of independent replicates, each placing its B and A nodes on its own layers
+            (other args as in TopologyPool.reset)
+        Returns:
+            topology: view of the first (len(base) + B + A) * replicates rows, replicate after replicate,
+                      valid until the next reset
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if B > self.max_B or A > self.max_A or replicates > self.max_replicates:
+            self.__init__(self.base_topology, max(B, self.max_B), max(A, self.max_A), max(replicates, self.max_replicates))
+
+        base = self.base_topology
+        t = self.topology
+        n_base = len(base)
+        num_mix, num_gw = split_A_nodes(A, mode, version)
+        b_end = n_base + B
+        mix_end = b_end + num_mix
+        n = mix_end + num_gw
+        rows = n * replicates
+
+        # every column as (replicates x nodes per replicate)
+        def grid(column):
+            return column[:rows].reshape(replicates, n, *column.shape[1:])
+
+        layer = grid(t.layer)
+        layer[:, :n_base] = base.layer
+        layer[:, n_base:b_end] = rng.choice([1,2,3], size=(replicates, B))
+        layer[:, b_end:mix_end] = rng.choice([1,2,3], size=(replicates, num_mix))
+        layer[:, mix_end:] = rng.choice([0, 4], size=(replicates, num_gw), p=[0.4, 0.6])
+        role = grid(t.role)
+        role[:, :n_base] = base.role
+        role[:, n_base:mix_end] = ROLE_MIXNODE
+        role[:, mix_end:] = ROLE_GATEWAY
+        type = grid(t.type)
+        type[:, :n_base] = base.type
+        type[:, n_base:b_end] = TYPE_B
+        type[:, b_end:] = TYPE_A
+        stake = grid(t.stake)
+        stake[:, :n_base] = base.stake
+        stake[:, n_base:b_end] = bstake
+        stake[:, b_end:] = astake
+
+        grid(t.uptime)[:, :n_base] = base.uptime
+        grid(t.uptime)[:, n_base:] = 0.98
+        grid(t.score_hist)[:, :n_base] = np.roll(base.score_hist, -base.hist_pos, axis=1)
+        grid(t.score_hist)[:, n_base:] = 0.98
+        t.hist_pos = 0
+        grid(t.hist_sum)[:, :n_base] = base.hist_sum
+        grid(t.hist_sum)[:, n_base:] = 0.98 * HIST_LEN
+        grid(t.hist_count)[:, :n_base] = base.hist_count
+        grid(t.hist_count)[:, n_base:] = HIST_LEN
+        grid(t.replicate)[:] = np.arange(replicates)[:, None]
+
+        t.complete[:rows] = 0
+        t.incomplete[:rows] = 0
+        t.fail[:rows] = 0
+        t.select_prob[:rows] = 0
+        t.isactive[:rows] = False
+        t.isvalidated[:rows] = False
+        t.test_layer[:rows] = 0
+
+        return t.head(rows)
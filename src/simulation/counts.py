@@ -1,7 +1,9 @@
+import numpy as np
 from collections import Counter, defaultdict
 from typing import Dict, List
 
 from .SimNode import Config, SimNode
+from .ArrayTopology import ArrayTopology, ROLE_MIXNODE, ROLE_GATEWAY, TYPE_T, TYPE_A, TYPE_B
 
 def count_active_set_node_types(active_set: Dict[int, List[SimNode]]) -> Dict[str, int]:
     """
@@ -63,4 +65,165 @@ def get_path_prob(active_set: Dict[int, List[SimNode]]) -> Dict[str, float]:
     return results
 
 
-    
\ No newline at end of file
+def expected_node_types(topology: Dict[int, List[SimNode]], probs: Dict[int, np.ndarray]) -> Dict[str, float]:
+    """
+    Expected count_active_set_node_types of the active set drawn by get_active_set, 
+    the sum of the selection probabilities of the nodes of each type.
+    Args:
+        topology: layer -> a list of nodes
+        probs: layer -> selection probability of each node on that layer, see get_active_set_probs
+    Returns:
+        counts: the expected count for each type
+    """
+    counts = defaultdict(float)
+    for layer, nodes in topology.items():
+        for node, prob in zip(nodes, probs[layer]):
+            if node.type == 'A' or node.type == 'B':
+                if node.role == 'gateway':
+                    counts[f'{node.type}_gw'] += prob
+                elif node.role == 'mixnode':
+                    counts[f'{node.type}_mix'] += prob
+    return {
+        'B_gw': float(counts['B_gw']),
+        'B_mix': float(counts['B_mix']),
+        'A_gw': float(counts['A_gw']),
+        'A_mix': float(counts['A_mix']),
+    }
+
+
+def expected_path_prob(topology: Dict[int, List[SimNode]], probs: Dict[int, np.ndarray]) -> Dict[str, float]:
+    """
+    Expected get_path_prob of the active set drawn by get_active_set. The layers are selected independently,
+    so a path's probability is the product of the expected fractions of attacker nodes of its layers.
+    Args:
+        topology: layer -> a list of nodes
+        probs: layer -> selection probability of each node on that layer, see get_active_set_probs
+    Returns:
+        results: path combination, prob
+    """
+    config = Config()
+    n_required = [config.entry_gws] + [config.mixnodes_per_layer] * config.mixnodes_layers + [config.exit_gws]
+    
+    pA = [0.0] * config.total_layers
+    for layer in range(config.total_layers):
+        adv = np.array([node.type == 'A' or node.type == 'B' for node in topology[layer]], dtype=bool)
+        pA[layer] = float(probs[layer][adv].sum()) / n_required[layer]
+    
+    results = defaultdict(float)
+    results['A***A'] = pA[0] * pA[4]
+    results['*AAA*'] = pA[1] * pA[2] * pA[3]
+
+    return results
+
+
+def count_active_set_node_types_array(topology: ArrayTopology, active_set: List[np.ndarray]) -> Dict[str, int]:
+    """
+    Array version of count_active_set_node_types.
+    Args:
+        topology: array topology
+        active_set: layer -> indices of the nodes in each active set layer
+    Returns:
+        counts: the count for each type
+    """
+    selected = np.concatenate(active_set)
+    types = topology.type[selected]
+    roles = topology.role[selected]
+    return {
+        'B_gw': int(np.count_nonzero((types == TYPE_B) & (roles == ROLE_GATEWAY))),
+        'B_mix': int(np.count_nonzero((types == TYPE_B) & (roles == ROLE_MIXNODE))),
+        'A_gw': int(np.count_nonzero((types == TYPE_A) & (roles == ROLE_GATEWAY))),
+        'A_mix': int(np.count_nonzero((types == TYPE_A) & (roles == ROLE_MIXNODE))),
+    }
+
+
+def get_path_prob_array(topology: ArrayTopology, active_set: List[np.ndarray]) -> Dict[str, float]:
+    """
+    Array version of get_path_prob.
+    Args:
+        topology: array topology
+        active_set: layer -> indices of the nodes in each active set layer
+    Returns:
+        results: path combination, prob
+    """
+    config = Config()
+    
+    pA = [0.0] * config.total_layers
+    
+    for layer in range(config.total_layers):
+        nodes = active_set[layer]
+        total = len(nodes)
+        num_adv = int(np.count_nonzero(topology.type[nodes] != TYPE_T))
+        pA[layer] = num_adv / total if total > 0 else 0
+    
+    results = defaultdict(float)
+    results['A***A'] = pA[0] * pA[4]
+    results['*AAA*'] = pA[1] * pA[2] * pA[3]
+
+    return results
+
+
+def expected_node_types_array(topology: ArrayTopology, probs: np.ndarray) -> Dict[str, float]:
+    """
+    Array version of expected_node_types.
+    Args:
+        topology: array topology
+        probs: selection probability of each node, see get_active_set_probs_array (0 outside of a replicate)
+    Returns:
+        counts: the expected count for each type
+    """
+    def expected(node_type, role):
+        return float(probs[(topology.type == node_type) & (topology.role == role)].sum())
+    return {
+        'B_gw': expected(TYPE_B, ROLE_GATEWAY),
+        'B_mix': expected(TYPE_B, ROLE_MIXNODE),
+        'A_gw': expected(TYPE_A, ROLE_GATEWAY),
+        'A_mix': expected(TYPE_A, ROLE_MIXNODE),
+    }
+
+
+def expected_path_prob_array(topology: ArrayTopology, probs: np.ndarray) -> Dict[str, float]:
+    """
+    Array version of expected_path_prob.
+    Args:
+        topology: array topology
+        probs: selection probability of each node, see get_active_set_probs_array (0 outside of a replicate)
+    Returns:
+        results: path combination, prob
+    """
+    config = Config()
+    n_required = [config.entry_gws] + [config.mixnodes_per_layer] * config.mixnodes_layers + [config.exit_gws]
+    
+    adv = np.bincount(topology.layer, weights=np.where(topology.type != TYPE_T, probs, 0.0), minlength=config.total_layers)
+    pA = [float(adv[layer]) / n_required[layer] for layer in range(config.total_layers)]
+    
+    results = defaultdict(float)
+    results['A***A'] = pA[0] * pA[4]
+    results['*AAA*'] = pA[1] * pA[2] * pA[3]
+
+    return results
+
+
+def split_replicates(topology: ArrayTopology, active_set: List[np.ndarray]) -> List[List[np.ndarray]]:
+    """
+    Split the active set of a topology with several replicates into one active set per replicate.
+    Args:
+        topology: array topology
+        active_set: layer -> indices of the nodes in each active set layer, replicate after replicate
+    Returns:
+        active_sets: replicate -> layer -> indices of the nodes in that replicate's active set layer
+    """
+    per_layer = [nodes.reshape(topology.replicates, -1) for nodes in active_set]
+    return [[nodes[r] for nodes in per_layer] for r in range(topology.replicates)]
+
+
+def split_replicate_probs(topology: ArrayTopology, probs: np.ndarray) -> List[np.ndarray]:
+    """
+    Split the selection probabilities of a topology with several replicates into one array per replicate,
+    with the probabilities of the other replicates' nodes set to 0.
+    Args:
+        topology: array topology
+        probs: selection probability of each node, see get_active_set_probs_array
+    Returns:
+        probs: replicate -> selection probability of each node in that replicate
+    """
+    return [np.where(topology.replicate == r, probs, 0.0) for r in range(topology.replicates)]
@@ -1,18 +1,21 @@
 import os
 import pandas as pd
 import numpy as np
-import copy
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from .SimNode import SimNode
 
 
-def create_target_nodes() -> Dict[int, List[SimNode]]:
+def create_target_nodes(rng: Optional[np.random.Generator] = None) -> Dict[int, List[SimNode]]:
     """
     Create target nodes to mirror all exisiting nodes in Nym.
+    Args:
+        rng: random generator placing the nodes on layers, a fresh one if None
     Returns:
         topology: mapping of layer index to a list of nodes on that index.
     """
+    if rng is None:
+        rng = np.random.default_rng()
     topology: Dict[int, List[SimNode]] = {0: [], 1: [], 2: [], 3: [], 4: []}
     
     # get the file representing one snapshot of the Nym network 
@@ -24,10 +27,10 @@ def create_target_nodes() -> Dict[int, List[SimNode]]:
     for _, row in df.iterrows():
         if row['declared_role'] == 'mixnode':
             role = 'mixnode'
-            layer = np.random.choice([1, 2, 3])
+            layer = rng.choice([1, 2, 3])
         else:
             role = 'gateway'
-            layer = np.random.choice([0, 4], p=[0.4, 0.6])
+            layer = rng.choice([0, 4], p=[0.4, 0.6])
 
         T_node = SimNode(
             role = role,
@@ -46,105 +49,3 @@ def create_target_nodes() -> Dict[int, List[SimNode]]:
         topology[layer].append(T_node)
     
     return topology
-
-
-def create_B_A_nodes(
-    base_topology: Dict[int, List[SimNode]], 
-    B: int, 
-    A: int, 
-    bstake: float, 
-    astake: float, 
-    mode: str, 
-    version: str,
-) -> Dict[int, List[SimNode]]:
-    """
-    Create 2 sets of attacker controlled nodes: B, A 
-    Args:
-        base_topology: layer --> list of Node objects on each layer
-        B: number of bad nodes
-        A: number of attacking nodes
-        bstake: stake for each B node
-        astake: stake for each A node
-        mode: A***A or AAAAA
-        version: network monitor v1, or v2, or v3
-    Returns:
-        topology: updated topology with B, A nodes added. 
-    """   
-    
-    topology = copy.deepcopy(base_topology)
-    
-    # create B nodes (always take on the role of mixnodes)
-    for _ in range(B):
-        role = 'mixnode'
-        layer = np.random.choice([1,2,3])
-        
-        B_node = SimNode(
-            role = role,
-            layer = layer,
-            type = 'B',
-            complete = 0,
-            incomplete = 0,
-            fail = 0,
-            uptime = 0.98,
-            score_hist = [0.98 for _ in range(24 * 4)],
-            stake = bstake,
-            isactive = False,
-            isvalidated = False,
-            test_layer = 0 
-        )
-        topology[layer].append(B_node)
-    
-    # assign the number of A mixnodes or A gateways based on different NM versions and attack modes
-    if version == 'v1': # in v1 and v3, regardless of mode, A is only gw because S can do damage to others without harming itself
-        num_mix = 0
-        num_gw = A
-    else: # in v2 and v3
-        if mode == 'A***A':
-            num_mix = 0
-            num_gw = A
-        elif mode == 'AAAAA':
-            num_mix = int(A * (3/5))
-            num_gw = A - num_mix
-    
-    # create A mixnodes    
-    for _ in range(num_mix):
-        layer = np.random.choice([1,2,3])
-        A_node = SimNode(
-            role = 'mixnode',
-            layer = layer,
-            type = 'A',
-            complete = 0,
-            incomplete = 0,
-            fail = 0,
-            uptime = 0.98,
-            score_hist = [0.98 for _ in range(24 * 4)],
-            stake = astake,
-            isactive = False,
-            isvalidated = False,
-            test_layer = 0 
-        )
-        topology[layer].append(A_node)
-    
-    # create A gateways
-    for _ in range(num_gw):
-        layer = np.random.choice([0, 4], p=[0.4, 0.6])
-        A_node = SimNode(
-            role = 'gateway',
-            layer = layer,
-            type = 'A',
-            complete = 0,
-            incomplete = 0,
-            fail = 0,
-            uptime = 0.98,
-            score_hist = [0.98 for _ in range(24 * 4)],
-            stake = astake,
-            isactive = False,
-            isvalidated = False,
-            test_layer = 0 
-        )
-        topology[layer].append(A_node)
-    
-    return topology
-        
-        
-        
\ No newline at end of file
@@ -1,44 +1,54 @@
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from .SimNode import Config, SimNode
+from .ArrayTopology import ArrayTopology, TYPE_A, TYPE_B
+from .get_active_set import weighted_order
 
 config = Config()
 
 def drop_test_packets(
     topology: Dict[int, List[SimNode]], 
     version: str,
+    rng: Optional[np.random.Generator] = None,
 ) -> None:
     """
     Run dropping strategy given a network monitor version.
     Args:
         topology: layer -> a layer of nodes on that layer
         version: network monitor version of v1, v2, or v3
+        rng: random generator, a fresh one if None
     """
     
     if version == 'v1':
-        drop_v1(topology)
+        drop_v1(topology, rng)
     
     elif version == 'v2':
-        paths = form_test_paths(topology)
-        for path in paths:
-            drop_v2(path)
+        paths = form_test_paths(topology, rng)
+        for path, multiplicity in paths:
+            drop_v2(path, multiplicity)
     
     elif version == 'v3':
-        paths = form_test_paths(topology)
-        for path in paths:
-            drop_v3(path)
+        paths = form_test_paths(topology, rng)
+        for path, multiplicity in paths:
+            drop_v3(path, multiplicity)
     
 
-def form_test_paths(topology: Dict[int, List[SimNode]]) -> List[List[SimNode]]:
+def form_test_paths(
+    topology: Dict[int, List[SimNode]], 
+    rng: Optional[np.random.Generator] = None,
+) -> List[Tuple[List[SimNode], int]]:
     """
     Form test paths for 1 round of testings).
     Args: 
         topology: layer -> a list of nodes on that layer
+        rng: random generator, a fresh one if None
     Returns:
-        a list of test paths, where each path is [gw, l1, l2, l3, gw] 
+        a list of (test path, multiplicity), where each path is [gw, l1, l2, l3, gw] 
+        and multiplicity is the number of test packets sent down that path
     """
-    rng = np.random.default_rng()
+    if rng is None:
+        rng = np.random.default_rng()
     
     total_gateways = topology[0] + topology[4]
     layer1 = topology[1]
@@ -62,72 +72,85 @@ def form_test_paths(topology: Dict[int, List[SimNode]]) -> List[List[SimNode]]:
         node3 = layer3[i3]
         gateway = total_gateways[ig]
         path = [gateway, node1, node2, node3, gateway]
-        all_paths.extend([path] * 3) # to mirror NM sending 3 packets down the same path 
+        all_paths.append((path, config.packets_per_path)) # to mirror NM sending 3 packets down the same path 
         
     return all_paths         
         
         
-def drop_v3(path: List[SimNode]) -> None:
+def v3_copy_outcomes(fails: List[int], multiplicity: int) -> List[bool]:
+    """
+    Outcomes of the packets sent back to back down a NMv3 path whose B nodes all drop
+    (none of them is in the active set or next to an A node).
+    A packet completes iff one of the B nodes has exactly 2 fail counts. A dropped packet
+    adds a fail count to every B node and a completed one resets them, so from the highest
+    fail count f <= 2 the first completed packet is packet 2 - f, and every third one after.
+    Args:
+        fails: fail counts of the B nodes on the path before the first packet
+        multiplicity: number of packets sent down the path
+    Returns:
+        for each packet, True if it completes
+    """
+    below = [f for f in fails if f <= 2]
+    first = 2 - max(below) if below else multiplicity
+    return [j >= first and (j - first) % 3 == 0 for j in range(multiplicity)]
+
+
+def drop_v3(path: List[SimNode], multiplicity: int = 1) -> None:
     """
     Attack on NMv3 schemes.
     For every path, bad nodes decides if they were to drop the packets.
     Then update, the complete, incomplete, and fail counts for three nodes on the single path.
+    The multiplicity packets are sent back to back, each one seeing the fail counts 
+    left by the previous one (see v3_copy_outcomes).
     
     Args:
         path: a single test path
+        multiplicity: number of test packets sent down the path
     """
 
-    path_complete = True
-    has_B = False
+    droppers = []
     
     for i, node in enumerate(path):
         if node.type == 'B':
-            has_B = True
-            
-            # B can't drop if it's in the active set
-            if node.isactive == True:
-                path_complete = True
-                break
-            
-            # don't drop if bad node already has 2 fail counts
-            if node.fail == 2:
-                path_complete = True
-                break
-            
-            # don't drop if previous or next node is an A node
+            # B can't drop if it's in the active set, 
+            # and doesn't drop if previous or next node is an A node
             prev_is_A = (i > 0 and path[i-1].type == 'A')
             next_is_A = (i < len(path) - 1 and path[i+1].type == 'A')
-            if prev_is_A or next_is_A:
-                path_complete = True
+            if node.isactive or prev_is_A or next_is_A:
+                droppers = []
                 break
-            else:
-                path_complete = False 
-            
-    if not has_B:
-        path_complete = True
+            droppers.append(node)
+    
+    if droppers:
+        # don't drop if a bad node already has 2 fail counts
+        outcomes = v3_copy_outcomes([node.fail for node in droppers], multiplicity)
+    else:
+        outcomes = [True] * multiplicity
         
     # update complete, incomplete, fail
-    if path_complete:
-        for node in path:
-            node.complete += 1
-            node.fail = 0
-    else:
-        guilty = []
-        for node in path:
-            node.fail +=1 
-            if node.fail > 2:
-                guilty.append(node)
-                node.incomplete += 1
-        if len(guilty) == 0:
+    for path_complete in outcomes:
+        if path_complete:
             for node in path:
-                node.incomplete += 1
+                node.complete += 1
+                node.fail = 0
+        else:
+            guilty = []
+            for node in path:
+                node.fail +=1 
+                if node.fail > 2:
+                    guilty.append(node)
+                    node.incomplete += 1
+            if len(guilty) == 0:
+                for node in path:
+                    node.incomplete += 1
     
             
-def drop_v2(path: List[SimNode]) -> None:
+def drop_v2(path: List[SimNode], multiplicity: int = 1) -> None:
     """
     Attack on NMv2. 
     Args: 
         path: a single test path
+        multiplicity: number of test packets sent down the path, they all share one outcome
     """
     path_complete = True 
     for i, node in enumerate(path):
@@ -142,19 +165,23 @@ def drop_v2(path: List[SimNode]) -> None:
     
     if path_complete:
         for node in path:
-            node.complete += 1
+            node.complete += multiplicity
     else:
         for node in path:
-            node.incomplete += 1
+            node.incomplete += multiplicity
 
 
 #====== THE FOLLOWINGS ARE FOR NMV1 ===#
-def get_validated_paths(topology: Dict[int, List[SimNode]]) -> List[List[SimNode]]:
+def get_validated_paths(
+    topology: Dict[int, List[SimNode]], 
+    rng: Optional[np.random.Generator] = None,
+) -> List[List[SimNode]]:
     """
     Randomly sample 3 validated paths based on previous 24 hours performance scores.
     
     Args:
         topology: layer -> a list of nodes on that layer
+        rng: random generator, a fresh one if None
     Return:
         validated_paths: a list of validated paths [gw, l1, l2, l3, gw].
     """
@@ -167,7 +194,8 @@ def get_validated_paths(topology: Dict[int, List[SimNode]]) -> List[List[SimNode
     layer3 = topology[3]
     
     # selection without replacement across all paths
-    rng = np.random.default_rng()
+    if rng is None:
+        rng = np.random.default_rng()
     selected_nodes = set()
     eps = 1e-10
     
@@ -197,17 +225,21 @@ def get_validated_paths(topology: Dict[int, List[SimNode]]) -> List[List[SimNode
 
 def form_test_paths_v1(
     topology: Dict[int, List[SimNode]],
-) -> Tuple[List[Tuple[List[SimNode], SimNode]], List[Tuple[List[SimNode], SimNode]]]:
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[List[Tuple[List[SimNode], SimNode, int]], List[Tuple[List[SimNode], SimNode, int]]]:
     """
     Form test paths for NMv1.
     Args: 
         topology: layer -> a list of nodes on that layer
+        rng: random generator, a fresh one if None
     Return:
-        mix_test_paths: [(test path, the test mixnode on that path)], 
-        gw_test_paths: [(test path, the test gateway on that path)]
+        mix_test_paths: [(test path, the test mixnode on that path, multiplicity)], 
+        gw_test_paths: [(test path, the test gateway on that path, multiplicity)]
     """
     
-    validated_paths = get_validated_paths(topology)
+    if rng is None:
+        rng = np.random.default_rng()
+    validated_paths = get_validated_paths(topology, rng)
     mix_test_paths = []
     gw_test_paths = []
     
@@ -215,29 +247,30 @@ def form_test_paths_v1(
     mixnodes = topology[1] + topology[2] + topology[3]
     
     # randomly assign mixnodes to a layer just for testing
-    for node in mixnodes:
-        node.test_layer = np.random.choice([1,2,3])
+    for node, test_layer in zip(mixnodes, rng.choice([1,2,3], size=len(mixnodes))):
+        node.test_layer = test_layer
     
     for v_path in validated_paths:
         
         for mix in mixnodes:
             test_mixp = [v_path[0], v_path[1], v_path[2], v_path[3], v_path[4]]
             test_mixp[mix.test_layer] = mix #switch one node from validated path with a test node
-            mix_test_paths.extend([(test_mixp, mix)] * 3)
+            mix_test_paths.append((test_mixp, mix, config.packets_per_path))
             
         for gw in gateways:
             test_gwp = [gw, v_path[1], v_path[2], v_path[3], gw]
-            gw_test_paths.extend([(test_gwp, gw)] * 3)    
+            gw_test_paths.append((test_gwp, gw, config.packets_per_path))    
     
     return mix_test_paths, gw_test_paths
 
 
-def strategy(path: List[SimNode], test_node: SimNode) -> None:
+def strategy(path: List[SimNode], test_node: SimNode, multiplicity: int = 1) -> None:
     """
     V1 Dropping strategy.
     Args:
         path: [gw, mix1, mix2, mix3, gw]
         test_node: the test node on that path
+        multiplicity: number of test packets sent down the path, they all share one outcome
     """
     path_complete = True 
     for i, node in enumerate(path):
@@ -253,22 +286,449 @@ def strategy(path: List[SimNode], test_node: SimNode) -> None:
                 path_complete = False
     
     if path_complete:
-        test_node.complete += 1 
+        test_node.complete += multiplicity 
     else:
-        test_node.incomplete += 1
+        test_node.incomplete += multiplicity
 
 
-def drop_v1(topology: Dict[int, List[SimNode]]) -> None:
+def drop_v1(topology: Dict[int, List[SimNode]], rng: Optional[np.random.Generator] = None) -> None:
     """
     Dropping for NMv1 for a 15 minutes round.
     Args:
         topology: layer -> a list of nodes on that layer
+        rng: random generator, a fresh one if None
+    """
+    
+    mix_test_paths, gw_test_paths = form_test_paths_v1(topology, rng)
+
+    for path, test_node, multiplicity in mix_test_paths:
+        strategy(path, test_node, multiplicity)
+    
+    for path, test_node, multiplicity in gw_test_paths:
+        strategy(path, test_node, multiplicity)
+
+
+#====== THE FOLLOWINGS ARE FOR THE ARRAY TOPOLOGY (see ArrayTopology) ===#
+# node states along a path, as (type, isvalidated). in NMv2/NMv3 a node's state is its type code,
+# NMv1 also tells apart B nodes on a validated path.
+V2_STATES = [('T', False), ('A', False), ('B', False)]
+V1_STATES = V2_STATES + [('B', True)]
+PATTERN_WEIGHTS = 3 ** np.arange(5) # a path's type pattern in base 3, one digit per position
+V1_PATTERN_WEIGHTS = 4 ** np.arange(5) # a path's NMv1 state pattern in base 4
+VALIDATED_GROUP = np.array([0, 1, 2, 3, 0]) # layer -> validated path position group: gateways, l1, l2, l3
+
+
+def encode_path_types(topology: ArrayTopology, paths: np.ndarray) -> np.ndarray:
+    """
+    Encode the A/B/T types along each path as one of the 3^5 type patterns.
+    Args:
+        topology: array topology
+        paths: (num paths x 5) array of node indices
+    Returns:
+        the pattern code of each path
+    """
+    return topology.type[paths].astype(np.int64) @ PATTERN_WEIGHTS
+
+
+def node_states_v1(topology: ArrayTopology) -> np.ndarray:
+    """
+    NMv1 state of every node, as an index into V1_STATES.
+    Args:
+        topology: array topology
+    Returns:
+        the state code of each node
+    """
+    return topology.type.astype(np.int64) + ((topology.type == TYPE_B) & topology.isvalidated)
+
+
+def path_type_table(drop, states: List[Tuple[str, bool]]) -> np.ndarray:
+    """
+    Run a per-path dropping function once on every pattern of node states.
+    Args:
+        drop: dropping function on a single path of SimNodes, e.g. drop_v2
+        states: the possible (type, isvalidated) of a node
+    Returns:
+        table: pattern code -> True if the first node of the path gets a complete count
+    """
+    weights = len(states) ** np.arange(5)
+    table = np.zeros(len(states) ** len(weights), dtype=bool)
+    for code in range(len(table)):
+        digits = [(code // w) % len(states) for w in weights]
+        path = [SimNode('mixnode', 1, states[d][0], 0, 0, 0, 0.98, [], 0.0, False, states[d][1], 0) for d in digits]
+        drop(path)
+        table[code] = path[0].complete > 0
+    return table
+
+
+V2_PATH_COMPLETE = path_type_table(drop_v2, V2_STATES) # outcome of drop_v2 for every type pattern
+V1_PATH_COMPLETE = path_type_table(lambda path: strategy(path, path[0]), V1_STATES) # outcome of strategy for every state pattern
+
+
+def drop_test_packets_array(
+    topology: ArrayTopology, 
+    version: str,
+    rng: Optional[np.random.Generator] = None,
+) -> None:
+    """
+    Array version of drop_test_packets.
+    Args:
+        topology: array topology
+        version: network monitor version of v1, v2, or v3
+        rng: random generator, a fresh one if None
     """
     
-    mix_test_paths, gw_test_paths = form_test_paths_v1(topology)
+    if version == 'v1':
+        drop_v1_array(topology, rng)
+    
+    elif version == 'v2':
+        drop_v2_array(topology, *form_test_paths_array(topology, rng))
+    
+    elif version == 'v3':
+        drop_v3_array(topology, *form_test_paths_array(topology, rng))
+
+
+def form_test_paths_array(topology: ArrayTopology, rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Form test paths for 1 round of testings, as node indices.
+    Every replicate gets its own paths, through its own nodes only.
+    Args: 
+        topology: array topology
+        rng: random generator, a fresh one if None
+    Returns:
+        paths: (num paths x 5) array of node indices, where each row is [gw, l1, l2, l3, gw], 
+               the paths of replicate 0 first, then of replicate 1, and so on
+        multiplicity: number of test packets sent down each path
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    if topology.replicates == 1:
+        # one layer size per layer: drawing below a scalar bound takes the same draws, at half the cost
+        num_paths = 4 * len(topology)
+        size = topology.layer_size[0]
+        start = topology.layer_start[0]
+    else:
+        path_replicate = np.repeat(np.arange(topology.replicates), 4 * np.bincount(topology.replicate, minlength=topology.replicates))
+        num_paths = len(path_replicate)
+        size = topology.layer_size[path_replicate]
+        start = topology.layer_start[path_replicate]
+    
+    # same draws, in the same order, as form_test_paths
+    idx1 = rng.integers(size[..., 1], size=num_paths)
+    idx2 = rng.integers(size[..., 2], size=num_paths)
+    idx3 = rng.integers(size[..., 3], size=num_paths)
+    idxG = rng.integers(size[..., 0] + size[..., 4], size=num_paths) # gateways are the nodes on layer 0, then on layer 4
+    
+    nodes = topology.layer_nodes
+    paths = np.empty((num_paths, 5), dtype=nodes.dtype)
+    paths[:, 0] = nodes[np.where(idxG < size[..., 0], start[..., 0] + idxG, start[..., 4] + idxG - size[..., 0])]
+    paths[:, 1] = nodes[start[..., 1] + idx1]
+    paths[:, 2] = nodes[start[..., 2] + idx2]
+    paths[:, 3] = nodes[start[..., 3] + idx3]
+    paths[:, 4] = paths[:, 0]
+    multiplicity = np.full(num_paths, config.packets_per_path) # to mirror NM sending 3 packets down the same path 
+    
+    return paths, multiplicity
+
 
-    for path, test_node in mix_test_paths:
-        strategy(path, test_node)
+def stable_argsort_nodes(nodes: np.ndarray) -> np.ndarray:
+    """
+    Same as np.argsort(nodes, kind='stable') for node indices, but as a radix sort on 16-bit 
+    digits (NumPy only radix sorts 16-bit integers), which is several times faster on long paths lists.
+    Args:
+        nodes: node indices, below 2^32
+    Returns:
+        order: indices that sort nodes, keeping the order of equal ones
+    """
+    order = np.argsort((nodes & 0xFFFF).astype(np.uint16), kind='stable')
+    if len(nodes) and nodes.max() > 0xFFFF:
+        order = order[np.argsort((nodes[order] >> 16).astype(np.uint16), kind='stable')]
+    return order
+
+
+def node_appearances(paths: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Group the appearances of every node on a list of paths by node, keeping path order.
+    Args:
+        paths: (num paths x 5) array of node indices
+    Returns:
+        order: flat (path, position) index of each appearance, grouped by node
+        sorted_nodes: the node of each appearance in that order
+        first_of_node, last_of_node: whether an appearance is the node's first / last one
+    """
+    flat_nodes = paths.ravel()
+    order = stable_argsort_nodes(flat_nodes)
+    sorted_nodes = flat_nodes[order]
+    first_of_node = np.ones(len(order), dtype=bool)
+    first_of_node[1:] = sorted_nodes[1:] != sorted_nodes[:-1]
+    last_of_node = np.ones(len(order), dtype=bool)
+    last_of_node[:-1] = first_of_node[1:]
+    return order, sorted_nodes, first_of_node, last_of_node
+
+
+def drop_v3_array(topology: ArrayTopology, paths: np.ndarray, multiplicity: np.ndarray) -> None:
+    """
+    Array version of drop_v3, applied to the paths of one round in order.
+    
+    A path can only be dropped if it has a B node, and none of its B nodes is 
+    in the active set or next to an A node. Every other path completes whatever 
+    the fail counts are. Whether a droppable path completes depends only on the 
+    fail counts of its B nodes, so only those are tracked in a sequential scan 
+    over the droppable paths. Once every packet's outcome is known, the counts and 
+    fail counts of all nodes follow from each node's own appearances in packet order. 
+    The result is identical to calling drop_v3 on each path.
+    
+    Args:
+        topology: array topology
+        paths: (num paths x 5) array of node indices
+        multiplicity: number of test packets sent down each path
+    """
+    n = len(topology)
+    num_paths, path_len = paths.shape
+    
+    types = topology.type[paths]
+    is_B = types == TYPE_B
+    next_to_A = np.zeros_like(is_B)
+    next_to_A[:, 1:] |= types[:, :-1] == TYPE_A
+    next_to_A[:, :-1] |= types[:, 1:] == TYPE_A
+    protected = (is_B & (topology.isactive[paths] | next_to_A)).any(axis=1)
+    droppable = is_B.any(axis=1) & ~protected
+    
+    # for each appearance on a droppable path: did a path that always completes 
+    # reset the node's fail count since its previous droppable appearance?
+    order, sorted_nodes, first_of_node, _ = node_appearances(paths)
+    positions = np.arange(len(order))
+    group_start = np.maximum.accumulate(np.where(first_of_node, positions, 0))
+    sorted_droppable = np.repeat(droppable, path_len)[order]
+    resets_before = np.cumsum(~sorted_droppable) - ~sorted_droppable
+    d_idx = np.flatnonzero(sorted_droppable)
+    has_prev = np.zeros(len(d_idx), dtype=bool)
+    has_prev[1:] = sorted_nodes[d_idx[1:]] == sorted_nodes[d_idx[:-1]]
+    since = group_start[d_idx]
+    since[1:] = np.where(has_prev[1:], d_idx[:-1], since[1:])
+    reset = np.zeros(len(order), dtype=bool)
+    reset[order[d_idx]] = resets_before[d_idx] > resets_before[since]
+    reset = reset.reshape(num_paths, path_len)
+    
+    # scan the droppable paths in order, tracking the fail counts of B nodes only.
+    # index n is a spare slot standing in for non-B nodes, its fail count is kept at 3
+    # so that it never counts as a B node with 2 fails.
+    scan_paths = paths[droppable]
+    scan_B = np.where(is_B[droppable], scan_paths, n)
+    scan_reset = np.where(reset[droppable] & is_B[droppable], scan_paths, n)
+    
+    if topology.replicates > 1:
+        scan_outcomes = v3_scan_replicates(topology.fail, scan_B, scan_reset, multiplicity[droppable], 
+                                           topology.replicate[scan_paths[:, 0]], topology.replicates)
+    else:
+        fail = topology.fail.tolist() + [3]
+        scan_has_reset = (scan_reset != n).any(axis=1).tolist()
+        scan_outcomes = []
+        
+        for path_B, has_reset, path_reset, k in zip(scan_B.tolist(), scan_has_reset, 
+                                                    scan_reset.tolist(), multiplicity[droppable].tolist()):
+            if has_reset:
+                for node in path_reset:
+                    fail[node] = 0
+            
+            # don't drop if a bad node already has 2 fail counts
+            outcomes = v3_copy_outcomes([fail[node] for node in path_B], k)
+            scan_outcomes.extend(outcomes)
+            if True in outcomes:
+                fails_after = outcomes[::-1].index(True) # dropped packets after the last completed one
+                for node in path_B:
+                    fail[node] = fails_after
+            else:
+                for node in path_B:
+                    fail[node] += k
+            fail[n] = 3
+    
+    # one row per packet on a droppable path, one row per path for the others
+    reps = np.where(droppable, multiplicity, 1)
+    rows = np.repeat(paths, reps, axis=0)
+    row_weight = np.repeat(np.where(droppable, 1, multiplicity), reps)
+    row_complete = np.repeat(~droppable, reps)
+    row_complete[np.repeat(droppable, reps)] = scan_outcomes
+    
+    # complete counts
+    topology.complete += np.bincount(rows[row_complete].ravel(), weights=np.repeat(row_weight[row_complete], path_len), minlength=n)
+    
+    # fail count of every node after each of its appearances: reset on a completed packet, 
+    # one more on every appearance on a dropped packet, starting from the previous round's count.
+    order, sorted_nodes, first_of_node, last_of_node = node_appearances(rows)
+    positions = np.arange(len(order))
+    sorted_dropped = ~np.repeat(row_complete, path_len)[order]
+    drops_so_far = np.cumsum(sorted_dropped)
+    anchor = np.maximum.accumulate(np.where(~sorted_dropped | first_of_node, positions, 0))
+    carried = drops_so_far[anchor] - sorted_dropped[anchor] - topology.fail[sorted_nodes]
+    fail_after = drops_so_far - np.where(sorted_dropped[anchor], carried, drops_so_far[anchor])
+    
+    # incomplete counts: a dropped packet blames the nodes with more than 2 fails, 
+    # or every node on its path if there is none.
+    guilty = np.zeros(len(order), dtype=bool)
+    guilty[order] = sorted_dropped & (fail_after > 2)
+    guilty = guilty.reshape(len(rows), path_len)
+    blame_all = ~row_complete & ~guilty.any(axis=1)
+    topology.incomplete += np.bincount(rows[guilty], minlength=n)
+    topology.incomplete += np.bincount(rows[blame_all].ravel(), minlength=n)
+    
+    topology.fail[sorted_nodes[last_of_node]] = fail_after[last_of_node]
+
+
+def v3_scan_replicates(
+    fail: np.ndarray, 
+    scan_B: np.ndarray, 
+    scan_reset: np.ndarray, 
+    multiplicity: np.ndarray, 
+    scan_replicate: np.ndarray, 
+    replicates: int,
+) -> np.ndarray:
+    """
+    The sequential scan of drop_v3_array over the droppable paths of several replicates.
+    Replicates share no nodes, so step s handles the s-th droppable path of every replicate at once.
+    Args:
+        fail: fail count of every node before the round
+        scan_B: (droppable paths x 5) B nodes of each path, len(fail) on the other positions
+        scan_reset: (droppable paths x 5) B nodes whose fail count is reset before the path, len(fail) elsewhere
+        multiplicity: number of test packets sent down each path
+        scan_replicate: replicate of each path, the paths of a replicate being in order
+        replicates: number of replicates
+    Returns:
+        for each packet of each path, in order, True if it completes
+    """
+    n = len(fail)
+    fail = np.append(fail, 3)
+    
+    counts = np.bincount(scan_replicate, minlength=replicates)
+    step = np.arange(len(scan_replicate)) - (np.cumsum(counts) - counts)[scan_replicate]
+    num_steps = counts.max() if len(counts) else 0
+    
+    # (steps x replicates) layout of the paths, padded with paths of spare slots only
+    grid_B = np.full((num_steps, replicates, scan_B.shape[1]), n)
+    grid_B[step, scan_replicate] = scan_B
+    grid_reset = np.full((num_steps, replicates, scan_B.shape[1]), n)
+    grid_reset[step, scan_replicate] = scan_reset
+    grid_k = np.zeros((num_steps, replicates), dtype=np.int64)
+    grid_k[step, scan_replicate] = multiplicity
+    grid_first = np.empty((num_steps, replicates), dtype=np.int64)
+    
+    for s in range(num_steps):
+        path_B, k = grid_B[s], grid_k[s]
+        fail[grid_reset[s]] = 0
+        fail[n] = 3
+        
+        # first completed packet, see v3_copy_outcomes, or k if all are dropped
+        fails = fail[path_B]
+        below = np.where(fails <= 2, fails, -1).max(axis=1)
+        first = np.where(below >= 0, 2 - below, k)
+        grid_first[s] = first
+        
+        fails_after = (k - 1 - first) % 3 # dropped packets after the last completed one
+        fail[path_B] = np.where((first < k)[:, None], fails_after[:, None], fails + k[:, None])
+    
+    # packet j of a path completes iff it is the first completed one or every third one after
+    first = np.repeat(grid_first[step, scan_replicate], multiplicity)
+    packet = np.arange(len(first)) - np.repeat(np.cumsum(multiplicity) - multiplicity, multiplicity)
+    return (packet >= first) & ((packet - first) % 3 == 0)
+
+
+def drop_v2_array(topology: ArrayTopology, paths: np.ndarray, multiplicity: np.ndarray) -> None:
+    """
+    Array version of drop_v2, applied to all paths of one round at once.
+    Each path's outcome is looked up from its A/B/T type pattern,
+    and complete/incomplete counts are scattered back with one bincount,
+    the incomplete ones shifted past the n complete ones.
+    Args:
+        topology: array topology
+        paths: (num paths x 5) array of node indices
+        multiplicity: number of test packets sent down each path
+    """
+    path_complete = V2_PATH_COMPLETE[encode_path_types(topology, paths)]
+    packets = np.repeat(multiplicity, paths.shape[1])
+    
+    n = len(topology)
+    slot = paths + np.where(path_complete, 0, n)[:, None]
+    counts = np.bincount(slot.ravel(), weights=packets, minlength=2 * n)
+    topology.complete += counts[:n]
+    topology.incomplete += counts[n:]
+
+
+def get_validated_paths_array(topology: ArrayTopology, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Array version of get_validated_paths, with every replicate's validated paths sampled in one pass.
+    Args:
+        topology: array topology
+        rng: random generator, a fresh one if None
+    Return:
+        validated_paths: (replicates * 3 x 5) array of node indices, each row [gw, l1, l2, l3, gw],
+                         the 3 validated paths of replicate 0 first, then of replicate 1, and so on.
+    """
+    eps = 1e-10
+    num_v = config.num_validated_paths
+    
+    # random weighted selection based on performance scores, without replacement
+    # within the gateways and each mixnode layer of a replicate
+    group = topology.replicate * 4 + VALIDATED_GROUP[topology.layer]
+    order, group_start, group_size = weighted_order(group, topology.uptime + eps, topology.replicates * 4, rng)
+    if group_size.min() < num_v:
+        raise ValueError(f"Not enough nodes to form {num_v} validated paths.")
+    
+    gws, mix1s, mix2s, mix3s = [order[group_start[g::4, None] + np.arange(num_v)].ravel() for g in range(4)]
+    
+    validated_paths = np.column_stack([gws, mix1s, mix2s, mix3s, gws])
+    topology.isvalidated[validated_paths.ravel()] = True
+    
+    return validated_paths
+
+
+def drop_v1_array(topology: ArrayTopology, rng: Optional[np.random.Generator] = None) -> None:
+    """
+    Array version of drop_v1 for a 15 minutes round.
+    
+    Test paths are not materialized: a test path is a validated path with one node 
+    swapped for the test node, so its outcome only depends on the validated path, 
+    the state of the test node, and (for mixnodes) its test layer. Each test node's 
+    complete/incomplete counts are looked up directly for the 3 validated paths
+    of its replicate.
+    
+    Args:
+        topology: array topology
+        rng: random generator, a fresh one if None
+    """
+    
+    if rng is None:
+        rng = np.random.default_rng()
+    num_v = config.num_validated_paths
+    validated_paths = get_validated_paths_array(topology, rng).reshape(topology.replicates, num_v, -1)
+    
+    gateways = np.concatenate([topology.layers[0], topology.layers[4]])
+    mixnodes = np.concatenate([topology.layers[1], topology.layers[2], topology.layers[3]])
+    mix_replicate = topology.replicate[mixnodes]
+    gw_replicate = topology.replicate[gateways]
+    
+    # randomly assign mixnodes to a layer just for testing
+    test_layer = rng.choice([1,2,3], size=len(mixnodes))
+    topology.test_layer[mixnodes] = test_layer
+    
+    states = node_states_v1(topology)
+    weights = V1_PATTERN_WEIGHTS
+    
+    mix_complete = np.zeros(len(mixnodes), dtype=np.int64)
+    gw_complete = np.zeros(len(gateways), dtype=np.int64)
+    for v in range(num_v):
+        v_states = states[validated_paths[:, v]] # (replicates x 5)
+        v_code = v_states @ weights
+        
+        # switch one node from validated path with a test node
+        mix_code = v_code[mix_replicate] + (states[mixnodes] - v_states[mix_replicate, test_layer]) * weights[test_layer]
+        mix_complete += V1_PATH_COMPLETE[mix_code]
+        
+        gw_code = v_code[gw_replicate] + (states[gateways] - v_states[gw_replicate, 0]) * (weights[0] + weights[4])
+        gw_complete += V1_PATH_COMPLETE[gw_code]
     
-    for path, test_node in gw_test_paths:
-        strategy(path, test_node)
+    # NM sends 3 packets down each test path
+    multiplicity = config.packets_per_path
+    topology.complete[mixnodes] += multiplicity * mix_complete
+    topology.incomplete[mixnodes] += multiplicity * (num_v - mix_complete)
+    topology.complete[gateways] += multiplicity * gw_complete
+    topology.incomplete[gateways] += multiplicity * (num_v - gw_complete)
@@ -0,0 +1,107 @@
+import bisect
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from ..utils.util import get_cost
+
+
+def coarse_values(values: Sequence[float], stride: int) -> List[float]:
+    """Every stride-th of the sorted values, and the largest one."""
+    values = sorted(set(values))
+    return sorted(set(values[::stride]) | {values[-1]})
+
+
+def dominated(point: Tuple[float, ...], frontier: List[Tuple[float, ...]]) -> bool:
+    """Whether some point of the frontier is at least as large as point on every objective."""
+    return any(all(f >= p for f, p in zip(other, point)) for other in frontier)
+
+
+def add_to_frontier(point: Tuple[float, ...], frontier: List[Tuple[float, ...]]) -> None:
+    """Add point to a list of mutually non-dominated points, dropping the ones it dominates."""
+    if dominated(point, frontier):
+        return
+    frontier[:] = [other for other in frontier if not all(p >= f for p, f in zip(point, other))]
+    frontier.append(point)
+
+
+def search_frontier(
+    base_args: List[Tuple],
+    run: Callable[[List[Tuple]], List[Dict[str, Any]]],
+    objectives: Sequence[str],
+    stride: int = 3,
+    wave: int = 16,
+) -> List[Dict[str, Any]]:
+    """
+    Simulate only the combinations that can be on the cost / fraction / nodes frontier, i.e. that can be
+    the cheapest (see get_cost) to reach their fractions of the active set with at most their B + A nodes,
+    instead of the whole grid.
+
+    The fractions are expected to grow with A, astake and B (for a fixed bstake), while the cost
+    grows with all four. So a combination can reach at most the fractions of any combination with
+    at least as many nodes and as much stake on them, and if a cheaper combination with no more
+    B + A nodes already reaches those, it is dominated and needn't be simulated. The number of nodes
+    is kept as an objective so that the results still answer the cheapest combinations under a
+    largest B + A (the total_nodes of the minimum cost analyses), not only the unconstrained ones.
+
+    First a coarse grid is simulated: every stride-th value of B and of A (and the largest ones),
+    with every stake. It bounds the fractions of every other combination by those of the nearest
+    coarse combination above it. The other combinations are then visited from the cheapest up,
+    and simulated in waves of up to `wave` combinations unless a cheaper simulated combination
+    with no more nodes reaches their bound. The waves have a fixed size so that the combinations simulated don't
+    depend on the number of workers.
+
+    Args:
+        base_args: (B, A, bstake, astake, ...) of every combination of the grid
+        run: simulates a list of combinations and returns their averaged results, in order
+        objectives: the fractions of the frontier, ('f_gw',) for A***A and ('f_gw', 'f_mix') for AAAAA
+        stride: spacing of the coarse grid in the values of B and A
+        wave: number of combinations simulated at once after the coarse grid
+    Returns:
+        the averaged results of the simulated combinations, coarse grid first
+    """
+    B_coarse = coarse_values([args[0] for args in base_args], stride)
+    A_coarse = coarse_values([args[1] for args in base_args], stride)
+    is_coarse = [args[0] in B_coarse and args[1] in A_coarse for args in base_args]
+
+    coarse_args = [args for args, coarse in zip(base_args, is_coarse) if coarse]
+    results = run(coarse_args)
+    fractions = {args[:4]: tuple(r[o] for o in objectives) for args, r in zip(coarse_args, results)}
+
+    # the objectives of a combination, all larger for better: its fractions, and fewer nodes
+    def point(args: Tuple, fractions: Tuple[float, ...]) -> Tuple[float, ...]:
+        return fractions + (-(args[0] + args[1]),)
+
+    # upper bound on the fractions of a combination: those of the nearest coarse combination above it
+    def bound(args: Tuple) -> Tuple[float, ...]:
+        B, A, bstake, astake = args[:4]
+        above = (B_coarse[bisect.bisect_left(B_coarse, B)], A_coarse[bisect.bisect_left(A_coarse, A)], bstake, astake)
+        return point(args, fractions[above])
+
+    def cost(args: Tuple) -> float:
+        return get_cost(*args[:4])
+
+    # every simulated combination as (cost, point), cheapest first
+    simulated = sorted((cost(args), point(args, fractions[args[:4]])) for args in coarse_args)
+    frontier: List[Tuple[float, ...]] = [] # points of the simulated combinations cheaper than the current one
+    next_simulated = 0
+
+    candidates = sorted((args for args, coarse in zip(base_args, is_coarse) if not coarse), key=cost)
+    i = 0
+    while i < len(candidates):
+        selected = []
+        while i < len(candidates) and len(selected) < wave:
+            args = candidates[i]
+            while next_simulated < len(simulated) and simulated[next_simulated][0] <= cost(args):
+                add_to_frontier(simulated[next_simulated][1], frontier)
+                next_simulated += 1
+            if not dominated(bound(args), frontier):
+                selected.append(args)
+            i += 1
+
+        if not selected:
+            break
+        wave_results = run(selected)
+        results.extend(wave_results)
+        for args, r in zip(selected, wave_results):
+            bisect.insort(simulated, (cost(args), point(args, tuple(r[o] for o in objectives))), lo=next_simulated)
+
+    return results
@@ -1,7 +1,9 @@
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from .SimNode import Config, SimNode
+from .ArrayTopology import ArrayTopology
+from .inclusion import inclusion_probs
 
 
 def dropping_calc_probs(topology: Dict[int, List[SimNode]]) -> None:
@@ -30,65 +32,216 @@ def no_dropping_calc_probs(topology: Dict[int, List[SimNode]]) -> None:
             node.active_set_select_prob()
             
             
-def get_active_set(topology: Dict[int, List[SimNode]]) -> Dict[int, List[SimNode]]:
+def get_active_set(topology: Dict[int, List[SimNode]], rng: Optional[np.random.Generator] = None) -> Dict[int, List[SimNode]]:
     """
     Probablistically select mixnodes into the active set.
     Args:
         topology: layer -> a list of nodes
+        rng: random generator, a fresh one if None
     Returns:
         active_set: layer --> list of Node objects selected into the active set
     """
     config = Config()
     
-    active_set = {0: [], 1: [], 2: [], 3: [], 4: []}
-    
-    rng = np.random.default_rng()
-
-    for layer in range(config.total_layers):
-        layer_nodes = topology[layer]
-        n_required = 0
-        if layer in [1, 2, 3]:
-            n_required = config.mixnodes_per_layer
-        elif layer == 0:
-            n_required = config.entry_gws
-        elif layer == 4:
-            n_required = config.exit_gws
-        
-        nodes_with_prob = [node for node in layer_nodes if node.select_prob > 0]
-        nodes_zero_prob = [node for node in layer_nodes if node.select_prob == 0]
-        
-        # probabilistic sampling from nodes_with_prob
-        weights = np.array([node.select_prob for node in nodes_with_prob], dtype=np.float64)
-        weights = weights / weights.sum() if weights.sum() > 0 else None
-        
-        n_prob = min(n_required, len(nodes_with_prob))
-        selected_from_prob = []
-        if n_prob > 0:
-            indices = rng.choice(len(nodes_with_prob), size=n_prob, replace=False, p=weights)
-            selected_from_prob = [nodes_with_prob[i] for i in indices]
-        
-        # if needed, fill remaining with random sample from nodes_zero_prob
-        n_remaining = n_required - len(selected_from_prob)
-        selected_from_zero = []
-        if n_remaining > 0:
-            print("shouldn't be here")
-            if len(nodes_zero_prob) < n_remaining:
-                raise ValueError(f"Not enough nodes to fill layer {layer}: need {n_required}, got {len(layer_nodes)}.")
-            indices = rng.choice(len(nodes_zero_prob), size=n_remaining, replace=False)
-            selected_from_zero = [nodes_zero_prob[i] for i in indices]
-
-        # combine
-        active_set[layer] = selected_from_prob + selected_from_zero
+    nodes = [node for layer in range(config.total_layers) for node in topology[layer]]
+    layer = np.array([node.layer for node in nodes], dtype=np.int8)
+    select_prob = np.array([node.select_prob for node in nodes], dtype=np.float64)
+    
+    selected = select_active_set(layer, select_prob, rng=rng)
     
     # mark all nodes inactive by default
-    for _, nodes in topology.items():
-        for node in nodes:
-            node.isactive = False
+    for node in nodes:
+        node.isactive = False
     
     # then mark only selected nodes as active
-    for _, nodes in active_set.items():
-        for node in nodes:
+    active_set = {}
+    for l, indices in enumerate(selected):
+        active_set[l] = [nodes[i] for i in indices]
+        for node in active_set[l]:
             node.isactive = True
     
-    return active_set 
-    
\ No newline at end of file
+    return active_set
+
+
+def weighted_order(
+    group: np.ndarray, 
+    weight: np.ndarray, 
+    num_groups: int, 
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Randomly order the items of every group, for weighted sampling without replacement.
+    Each item with weight > 0 draws an exponential key E / weight (compared as log keys, so that
+    tiny weights don't overflow), and the items of a group are sorted by key. The first k items 
+    of a group are then distributed (and ordered) exactly like k items drawn one at a time 
+    with probability proportional to weight, i.e. rng.choice(k, replace=False, p).
+    Items with zero weight get an infinite key and come last, in uniformly random order.
+    Args:
+        group: group of each item, from 0 to num_groups - 1
+        weight: sampling weight of each item
+        num_groups: number of groups
+        rng: random generator drawing the keys, a fresh one if None
+    Returns:
+        order: all items, grouped by group, each group in sampled order
+        group_start: position in order of the first item of each group
+        group_size: number of items in each group
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    with np.errstate(divide='ignore'):
+        key = np.log(rng.exponential(size=len(weight))) - np.log(weight) # log(E / weight), which can't overflow
+    if (weight > 0).all():
+        order = np.argsort(key)
+    else:
+        order = np.lexsort((rng.random(len(weight)), key)) # random among the infinite keys
+    
+    # then by group, a stable sort keeps the key order within each group (radix sort on small ints)
+    group_dtype = np.int16 if num_groups <= np.iinfo(np.int16).max else np.int64
+    order = order[np.argsort(group[order].astype(group_dtype), kind='stable')]
+    
+    group_size = np.bincount(group, minlength=num_groups)
+    group_start = np.cumsum(group_size) - group_size
+    
+    return order, group_start, group_size
+
+
+def select_active_set(
+    layer: np.ndarray, 
+    select_prob: np.ndarray, 
+    replicate: Optional[np.ndarray] = None, 
+    rng: Optional[np.random.Generator] = None,
+) -> List[np.ndarray]:
+    """
+    Select the active set on every layer (of every replicate) in one pass.
+    Nodes are drawn with probability proportional to select_prob, see weighted_order. 
+    Nodes with zero probability are only drawn, uniformly at random, 
+    to fill a layer that doesn't have enough nodes with probability.
+    Args:
+        layer: layer of each node
+        select_prob: active set selection probability of each node
+        replicate: replicate of each node, if there are several independent replicates
+        rng: random generator, a fresh one if None
+    Returns:
+        active_set: layer -> indices of the nodes selected into the active set, 
+                    replicate after replicate, each in draw order
+    """
+    config = Config()
+    n_required = [config.entry_gws] + [config.mixnodes_per_layer] * config.mixnodes_layers + [config.exit_gws]
+    
+    replicates = 1 if replicate is None else int(replicate.max()) + 1
+    group = layer if replicate is None else replicate * config.total_layers + layer
+    order, group_start, group_size = weighted_order(group, select_prob, replicates * config.total_layers, rng)
+    group_start = group_start.reshape(replicates, config.total_layers)
+    group_size = group_size.reshape(replicates, config.total_layers)
+    
+    active_set = []
+    for l in range(config.total_layers):
+        if group_size[:, l].min() < n_required[l]:
+            raise ValueError(f"Not enough nodes to fill layer {l}: need {n_required[l]}, got {group_size[:, l].min()}.")
+        active_set.append(order[group_start[:, l, None] + np.arange(n_required[l])].ravel())
+    
+    return active_set
+
+
+def get_active_set_probs(topology: Dict[int, List[SimNode]]) -> Dict[int, np.ndarray]:
+    """
+    Probability of every node to be selected into the active set by get_active_set, 
+    given the nodes' select_prob.
+    Args:
+        topology: layer -> a list of nodes
+    Returns:
+        probs: layer -> selection probability of each node on that layer, in the order of topology
+    """
+    config = Config()
+    
+    nodes = [node for layer in range(config.total_layers) for node in topology[layer]]
+    layer = np.array([node.layer for node in nodes], dtype=np.int8)
+    select_prob = np.array([node.select_prob for node in nodes], dtype=np.float64)
+    
+    probs = active_set_probs(layer, select_prob)
+    return {l: probs[layer == l] for l in range(config.total_layers)}
+
+
+def active_set_probs(
+    layer: np.ndarray, 
+    select_prob: np.ndarray, 
+    replicate: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Probability of every node to be selected into the active set by select_active_set, 
+    see inclusion_probs. The layers (of every replicate) are selected independently of each other.
+    Args:
+        (args as in select_active_set)
+    Returns:
+        the selection probability of each node
+    """
+    config = Config()
+    n_required = [config.entry_gws] + [config.mixnodes_per_layer] * config.mixnodes_layers + [config.exit_gws]
+    
+    replicates = 1 if replicate is None else int(replicate.max()) + 1
+    group = layer.astype(np.int64) if replicate is None else replicate * config.total_layers + layer
+    
+    group_size = np.bincount(group, minlength=replicates * config.total_layers).reshape(replicates, config.total_layers)
+    for l in range(config.total_layers):
+        if group_size[:, l].min() < n_required[l]:
+            raise ValueError(f"Not enough nodes to fill layer {l}: need {n_required[l]}, got {group_size[:, l].min()}.")
+    
+    # the layers selecting as many nodes are computed together
+    probs = np.zeros(len(select_prob))
+    for k in set(n_required):
+        nodes = np.flatnonzero(np.isin(layer, [l for l in range(config.total_layers) if n_required[l] == k]))
+        probs[nodes] = inclusion_probs(select_prob[nodes], k, group[nodes])
+    
+    return probs
+
+
+#====== THE FOLLOWINGS ARE FOR THE ARRAY TOPOLOGY (see ArrayTopology) ===#
+def dropping_calc_probs_array(topology: ArrayTopology) -> None:
+    """
+    Array version of dropping_calc_probs.
+    Args:
+        topology: array topology
+    """
+    tested = topology.complete + topology.incomplete
+    score = np.full(len(topology), np.nan) # in case a node does not receive a test packet
+    np.divide(topology.complete, tested, out=score, where=tested > 0)
+    topology.average_uptime_24(score)
+    topology.active_set_select_prob()
+
+
+def no_dropping_calc_probs_array(topology: ArrayTopology) -> None:
+    """
+    Array version of no_dropping_calc_probs.
+    Args:
+        topology: array topology
+    """
+    topology.active_set_select_prob()
+
+
+def get_active_set_array(topology: ArrayTopology, rng: Optional[np.random.Generator] = None) -> List[np.ndarray]:
+    """
+    Array version of get_active_set.
+    Args:
+        topology: array topology
+        rng: random generator, a fresh one if None
+    Returns:
+        active_set: layer -> indices of the nodes selected into the active set, replicate after replicate
+    """
+    active_set = select_active_set(topology.layer, topology.select_prob, topology.replicate, rng)
+    
+    topology.isactive[:] = False
+    topology.isactive[np.concatenate(active_set)] = True
+    
+    return active_set
+
+
+def get_active_set_probs_array(topology: ArrayTopology) -> np.ndarray:
+    """
+    Array version of get_active_set_probs.
+    Args:
+        topology: array topology
+    Returns:
+        the selection probability of each node, see active_set_probs
+    """
+    return active_set_probs(topology.layer, topology.select_prob, topology.replicate)
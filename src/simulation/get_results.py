@@ -1,23 +1,23 @@
 import time
 import datetime
+from typing import Dict, List, Optional, Tuple
 
 from .SimNode import Config
 from .create_nodes import create_target_nodes
-from .run_sim import run_many_combo
-from .test_epochs import run_epochs
+from .run_sim import ComboSweep, combos_sweep, run_experiments, run_many_combo, merge_combos, optimize_combo, analytic_many_combo, task_rng
+from .test_epochs import EpochSweep
+from ..utils.util import get_cost
 
 def get_timestamp() -> str:
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def get_results(mini: bool, mode: str, version: str, attack: bool) -> None:
+def grid_ranges(mini: bool, mode: str, version: str, attack: bool) -> Tuple[List[int], List[int], List[float], List[float], int]:
     """
-    Run simulations.
+    Ranges of the simulated combinations.
+    Returns:
+        B values, A values, stakes on each B node, stakes on each A node, number of runs per combination
     """
-    start_time = time.time()
-    print(f"Program started at: {time.ctime(start_time)}")
-    
     config = Config()
-    base_topology = create_target_nodes()
     
     if attack:
         a_stake = config.stake_values
@@ -53,30 +53,151 @@ def get_results(mini: bool, mode: str, version: str, attack: bool) -> None:
                 a_range = [10, 20, 30] 
     else:
         n_runs = 100 
-             
-    run_many_combo(base_topology=base_topology,
+    return b_range, a_range, b_stake, a_stake, n_runs
+
+def results_sweep(base_topology: Dict, mini: bool, mode: str, version: str, attack: bool, engine: str = 'object', batch: int = 1,
+                  seed: Optional[int] = None, resume: bool = False, adaptive: bool = False, ci_target: float = 0.01,
+                  min_runs: int = 10, max_runs: Optional[int] = None, expected: bool = False) -> ComboSweep:
+    """The grid simulated by get_results, as a sweep over the given base topology (see combos_sweep)."""
+    b_range, a_range, b_stake, a_stake, n_runs = grid_ranges(mini, mode, version, attack)
+    if max_runs is not None:
+        n_runs = max_runs
+    return combos_sweep(base_topology=base_topology,
                         B_range=b_range, A_range=a_range,
-                        bstake=b_stake, astake=a_stake, 
-                        mode=mode, version=version, attack=attack, n_runs=n_runs)
+                        bstake=b_stake, astake=a_stake,
+                        mode=mode, version=version, attack=attack, n_runs=n_runs, engine=engine, batch=batch, seed=seed, resume=resume,
+                        adaptive=adaptive, ci_target=ci_target, min_runs=min_runs, expected=expected)
+
+def get_results(mini: bool, mode: str, version: str, attack: bool, engine: str = 'object', batch: int = 1, seed: Optional[int] = None, resume: bool = False,
+                adaptive: bool = False, ci_target: float = 0.01, min_runs: int = 10, max_runs: Optional[int] = None,
+                search: str = 'grid', shard: Optional[Tuple[int, int]] = None, merge: Optional[int] = None, variances: bool = False,
+                expected: bool = False) -> None:
+    """
+    Run simulations.
+    engine: 'object' simulates SimNode objects, 'array' simulates the struct-of-arrays ArrayTopology,
+            'analytic' computes the expected baseline results instead of simulating them (see analytic_many_combo).
+    batch: with the array engine, number of runs of a combination simulated together in one task.
+    seed: master seed that makes the results reproducible, None for a fresh one.
+    resume: skip the tasks an interrupted run with the same settings already finished.
+    adaptive: stop running a combination once the confidence intervals of f_gw and f_mix are within ci_target,
+              after at least min_runs runs and at most max_runs runs (by default the usual number of runs).
+    search: 'grid' simulates every combination, 'frontier' only those near the cost / fraction frontier.
+    shard: (i, N) to run only shard i of N of the tasks, e.g. on one of N hosts sharing sim_data.
+    merge: number of shards to merge into the results file, once every shard (run with the same settings) is done.
+    variances: with the analytic engine, also save the variance of the result of one run of each combination.
+    expected: score each run by its expected active set given the nodes' final selection probabilities
+              instead of the drawn one (see run_one_combo), for the same precision with fewer runs.
+    """
+    start_time = time.time()
+    print(f"Program started at: {time.ctime(start_time)}")
+    
+    b_range, a_range, b_stake, a_stake, n_runs = grid_ranges(mini, mode, version, attack)
+    if max_runs is not None:
+        n_runs = max_runs
+    
+    if variances and engine != 'analytic':
+        raise ValueError("Only the analytic engine computes variances.")
+    if engine == 'analytic':
+        if attack:
+            raise ValueError("The analytic engine only computes baseline (--no-attack) results.")
+        if expected:
+            raise ValueError("The analytic engine already gives expected results, expected only applies to simulations.")
+        if shard is not None or merge is not None or search != 'grid':
+            raise ValueError("The analytic engine computes the whole grid at once, it can't be sharded or searched.")
+        analytic_many_combo(base_topology=create_target_nodes(task_rng(seed)),
+                            A_range=a_range, astake=a_stake, mode=mode, version=version, variances=variances)
+    elif merge is not None:
+        merge_combos(B_range=b_range, A_range=a_range,
+                     bstake=b_stake, astake=a_stake,
+                     mode=mode, version=version, attack=attack, n_runs=n_runs, shards=merge, engine=engine, batch=batch, seed=seed, expected=expected)
+    else:
+        base_topology = create_target_nodes(task_rng(seed))
+        run_many_combo(base_topology=base_topology,
+                            B_range=b_range, A_range=a_range,
+                            bstake=b_stake, astake=a_stake, 
+                            mode=mode, version=version, attack=attack, n_runs=n_runs, engine=engine, batch=batch, seed=seed, resume=resume,
+                            adaptive=adaptive, ci_target=ci_target, min_runs=min_runs, search=search, shard=shard,
+                            expected=expected)
     
     end_time = time.time()
     print(f"Program ended at: {time.ctime(end_time)}")
 
-def epoch_test():
+def optimize(mini: bool, mode: str, version: str, attack: bool, f_gw: float, f_mix: Optional[float] = None,
+             engine: str = 'object', batch: int = 1, seed: Optional[int] = None, resume: bool = False,
+             min_runs: int = 10, max_runs: Optional[int] = None, expected: bool = False) -> Optional[Dict]:
+    """
+    Search for the cheapest combination whose expected f_gw (and f_mix, for AAAAA) reaches the targets,
+    racing the combinations against the targets instead of simulating the whole grid (see race_to_target).
+    min_runs: runs of a combination in its first race, doubled while it is undecided.
+    max_runs: largest number of runs of a combination (by default the usual number of runs).
+    (other args as in get_results)
+    Returns the averaged result of the cheapest combination found, None if no combination reached the targets.
+    """
     start_time = time.time()
     print(f"Program started at: {time.ctime(start_time)}")
     
-    base_topology = create_target_nodes()
+    base_topology = create_target_nodes(task_rng(seed))
+    b_range, a_range, b_stake, a_stake, n_runs = grid_ranges(mini, mode, version, attack)
+    if max_runs is not None:
+        n_runs = max_runs
+    targets = {'f_gw': f_gw} if mode == 'A***A' else {'f_gw': f_gw, 'f_mix': f_mix}
+    
+    best, undecided = optimize_combo(base_topology=base_topology,
+                                     B_range=b_range, A_range=a_range,
+                                     bstake=b_stake, astake=a_stake,
+                                     mode=mode, version=version, attack=attack, targets=targets,
+                                     min_runs=min_runs, max_runs=n_runs, engine=engine, batch=batch, seed=seed, resume=resume,
+                                     expected=expected)
+    
+    def describe(r: Dict) -> str:
+        fractions = ", ".join(f"{field} {r[field]:.3f} [{r[f'{field}_ci'][0]:.3f}, {r[f'{field}_ci'][1]:.3f}]" for field in targets)
+        return (f"{int(get_cost(r['B'], r['A'], r['B_stake'], r['A_stake']))} USD, {r['B']} B, {r['A']} A, "
+                f"({r['B_stake']}, {r['A_stake']}) Stake, {fractions}, {r['n_runs']} runs")
+    
+    if best is None:
+        print(f"No combination reaches {targets}.")
+    else:
+        print(f"Cheapest reaching {targets}: {describe(best)}")
+    if undecided:
+        print(f"{len(undecided)} cheaper combinations couldn't be decided in {n_runs} runs, the optimum may cost as little as "
+              f"{int(get_cost(undecided[0]['B'], undecided[0]['A'], undecided[0]['B_stake'], undecided[0]['A_stake']))} USD:")
+        for r in undecided:
+            print(f"  {describe(r)}")
     
+    end_time = time.time()
+    print(f"Program ended at: {time.ctime(end_time)}")
+    return best
+
+def epoch_sweeps(engine: str = 'object', batch: int = 1, seed: Optional[int] = None,
+                 adaptive: bool = False, ci_target: float = 0.01, min_runs: int = 10, max_runs: Optional[int] = None,
+                 shard: Optional[Tuple[int, int]] = None) -> List[EpochSweep]:
+    """The runs of epoch_test, one sweep per number of B nodes, or their shard (i, N)."""
     # those values are set as constants in this test
     bstake = 100
     astake = 1000
+    # NOTE SET SIMULATION ROUNDS
+    n_runs = 1000 if max_runs is None else max_runs
     
-    run_epochs(base_topology=base_topology, B=60, A=30, bstake=bstake, astake=astake, mode='A***A', version='v1', epochs=list(range(1,25)))
-    run_epochs(base_topology=base_topology, B=80, A=30, bstake=bstake, astake=astake, mode='A***A', version='v1', epochs=list(range(1,25)))
-    run_epochs(base_topology=base_topology, B=100, A=30, bstake=bstake, astake=astake, mode='A***A', version='v1', epochs=list(range(1,25)))
+    return [
+        EpochSweep(B=B, A=30, bstake=bstake, astake=astake, mode='A***A', version='v1', epochs=list(range(1,25)), engine=engine, batch=batch, seed=seed,
+                   adaptive=adaptive, ci_target=ci_target, min_runs=min_runs, n_runs=n_runs, shard=shard)
+        for B in (60, 80, 100)
+    ]
+
+def epoch_test(engine: str = 'object', batch: int = 1, seed: Optional[int] = None,
+               adaptive: bool = False, ci_target: float = 0.01, min_runs: int = 10, max_runs: Optional[int] = None,
+               shard: Optional[Tuple[int, int]] = None, merge: Optional[int] = None):
+    start_time = time.time()
+    print(f"Program started at: {time.ctime(start_time)}")
+    
+    if merge is not None:
+        # the shards' logs of every number of B nodes, averaged as a single run would
+        for sweep in epoch_sweeps(engine, batch, seed, adaptive, ci_target, min_runs, max_runs):
+            sweep.merge(merge)
+    else:
+        base_topology = create_target_nodes(task_rng(seed))
+        # the three numbers of B nodes share one pool
+        run_experiments(base_topology, epoch_sweeps(engine, batch, seed, adaptive, ci_target, min_runs, max_runs, shard), batch, engine)
     
     end_time = time.time()
     print(f"Program ended at: {time.ctime(end_time)}")
-
-
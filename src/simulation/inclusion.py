@@ -0,0 +1,276 @@
+import numpy as np
+from scipy import stats
+from typing import List, Optional, Tuple
+
+# Selection into the active set as in weighted_order: each node with weight w > 0 draws a key E / w,
+# E ~ Exp(1), and the k nodes with the smallest keys of a layer are selected. A node's key is below t
+# with probability 1 - exp(-w t), independently of the others, so a node is selected iff fewer than k
+# of the other nodes have a key below its own, and its selection probability is an integral over its key.
+# The integrals are computed by Simpson's rule on a grid of keys evenly spaced in log.
+
+POINTS_PER_DECADE = 40 # grid points per factor of 10 of the key
+NEGLIGIBLE = 1e-15 # probabilities below this are taken as 0
+KEYS_PER_PASS = 2048 # keys of the groups of inclusion_probs computed together, bounding its memory
+
+
+def chernoff(mu: float, a: int) -> float:
+    """Log of a bound of the probability that a sum of independent indicators of mean mu is >= a (if mu < a)."""
+    if a == 0:
+        return 0.0
+    return -mu + a * (1 + np.log(mu / a)) if mu > 0 else -np.inf
+
+
+def key_grid(weight: np.ndarray, k: int, most: np.ndarray, fewest: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Grid of keys for the selection integrals of a layer: from keys that k - 1 of the most nodes
+    are almost surely not below (by a Chernoff bound), to keys that k of the fewest nodes
+    are almost surely below (or every node, if they are fewer than k).
+    Args:
+        weight: weights of the nodes of the layer, or of each group of nodes with the same weight
+        k: number of nodes selected from the layer
+        most: largest number of nodes of each weight
+        fewest: smallest number of nodes of each weight
+    Returns:
+        the keys, increasing, and the weights of Simpson's rule for an integral over their log
+    """
+    positive = weight > 0
+    weight, most, fewest = weight[positive], most[positive], fewest[positive]
+    if not len(weight):
+        return np.ones(1), np.zeros(1)
+    below = lambda t: np.sum(most * -np.expm1(-weight * t)) # nodes expected below key t
+
+    # below t_lo, k - 1 nodes are below the key with negligible probability: bisection on the log of the key,
+    # from a key with fewer than 1 / 1000 nodes expected below it
+    within = lambda t: below(t) >= k - 1 or chernoff(below(t), k - 1) > np.log(NEGLIGIBLE)
+    lo = hi = np.log(1e-3 / max(np.sum(most * weight), weight.max()))
+    while not within(np.exp(hi)):
+        hi += 1.0
+    for _ in range(50):
+        mid = (lo + hi) / 2
+        lo, hi = (mid, hi) if not within(np.exp(mid)) else (lo, mid)
+    t_lo = np.exp(lo)
+    # above t_hi, the k heaviest of the fewest nodes (or all nodes, if they are fewer than k) are below the key
+    heaviest = np.repeat(weight, fewest.astype(np.int64))
+    t_hi = 50 / (np.sort(heaviest)[-k] if len(heaviest) >= k else weight.min()) # exp(-50) is below NEGLIGIBLE
+    t_hi = max(t_hi, 10 * t_lo)
+
+    points = 2 * max(int(np.ceil(np.log10(t_hi / t_lo) * POINTS_PER_DECADE / 2)), 1) + 1 # odd, for Simpson's rule
+    simpson = np.ones(points)
+    simpson[1:-1:2] = 4
+    simpson[2:-1:2] = 2
+    return np.geomspace(t_lo, t_hi, points), simpson * np.log(t_hi / t_lo) / (points - 1) / 3
+
+
+def count_cdf(weight: np.ndarray, t: np.ndarray, k: int) -> np.ndarray:
+    """
+    Distribution of the number of nodes with a key below t (a Poisson binomial), up to k - 1.
+    Args:
+        weight: weights of the nodes
+        t: keys
+        k: number of nodes selected
+    Returns:
+        (k x len(t)) array: the probability that at most c nodes have a key below t[j], at [c, j]
+    """
+    pmf = np.zeros((k, len(t)))
+    pmf[0] = 1.0
+    for w in weight[weight > 0]:
+        q = -np.expm1(-w * t)
+        pmf[1:] = pmf[1:] * (1 - q) + pmf[:-1] * q
+        pmf[0] *= 1 - q
+    return np.cumsum(pmf, axis=0)
+
+
+def group_moments(target_weight: np.ndarray, weight: float, k: int, max_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Moments of the number X of nodes of a group of m nodes of the same weight selected from a layer,
+    together with the target nodes of the layer, for every m up to max_count.
+
+    A node of the group is selected iff at most k - 1 of the others have a key below its key t:
+    P = integral of P(N(t) + Bin(m - 1, s) <= k - 1) ds, with s = 1 - exp(-weight t) the distribution
+    of its key and N(t) the number of target nodes below t. Two nodes of the group are both selected
+    iff at most k - 2 of the others are below the larger of their keys, which is distributed as s^2:
+    P2 = integral of P(N(t) + Bin(m - 2, s) <= k - 2) 2 s ds. Then E[X] = m P and E[X^2] = m (m - 1) P2 + E[X].
+
+    The binomial distributions are updated from m - 1 to m on a band of the grid: below it, k - 1
+    other nodes are below the key with negligible probability (by a Chernoff bound), so the probabilities
+    are 1 there, and above it they are negligible. The band moves to smaller keys as m grows.
+    Args:
+        target_weight: weights of the target nodes of the layer
+        weight: weight of the nodes of the group, > 0
+        k: number of nodes selected from the layer
+        max_count: largest number of nodes of the group
+    Returns:
+        E[X] and E[X^2] for m = 0 to max_count
+    """
+    if weight <= 0:
+        raise ValueError(f"The nodes of the group need a weight > 0, got {weight}.")
+    mean = np.zeros(max_count + 1)
+    second = np.zeros(max_count + 1)
+    if max_count == 0:
+        return mean, second
+
+    t, dlog = key_grid(np.append(target_weight, weight), k, np.append(np.ones(len(target_weight)), max_count - 1),
+                       np.append(np.ones(len(target_weight)), 0))
+    s = -np.expm1(-weight * t) # distribution of the key of a node of the group
+    ds = dlog * weight * t * np.exp(-weight * t) # ds = weight t exp(-weight t) dlog(t)
+    target_cdf = count_cdf(target_weight, t, k)
+    # P(N <= k - 1 - c) and P(N <= k - 2 - c) as (keys x c) arrays, weighted for the integrals over s,
+    # to sum against the probability that c other nodes of the group are below the key
+    one = (target_cdf[::-1] * ds).T
+    two = (np.vstack((target_cdf[-2::-1], np.zeros((1, len(t))))) * (2 * s * ds)).T
+    # the integrals below the band, where the probabilities are 1 (so also below the grid)
+    one_below = s[0] + np.concatenate(([0.0], np.cumsum(ds)))
+    two_below = s[0] ** 2 + np.concatenate(([0.0], np.cumsum(2 * s * ds)))
+
+    target_mean = np.sum(-np.expm1(-np.outer(t, target_weight[target_weight > 0])), axis=1)
+    def in_band(j: int, m: int) -> bool:
+        # whether k - 1 of the other nodes may be below t[j]
+        mu = target_mean[j] + (m - 1) * s[j]
+        return mu >= k - 1 or chernoff(mu, k - 1) > np.log(NEGLIGIBLE)
+
+    # P(Bin(m - 1, s) = c) and P(Bin(m - 2, s) = c) for c up to k - 1, on the band: (keys x c),
+    # so that the band is a block of rows
+    binom = np.zeros((len(t), k))
+    binom[:, 0] = 1.0
+    previous = np.zeros((len(t), k))
+    lo, hi = len(t), len(t) # the band
+    while lo > 0 and in_band(lo - 1, 1):
+        lo -= 1
+    c = np.arange(k)
+    for m in range(1, max_count + 1):
+        while lo > 0 and in_band(lo - 1, m):
+            lo -= 1
+            binom[lo] = stats.binom.pmf(c, m - 1, s[lo])
+            previous[lo] = stats.binom.pmf(c, max(m - 2, 0), s[lo])
+
+        selected = np.einsum('ij,ij->i', binom[lo:hi], one[lo:hi])
+        mean[m] = m * (one_below[lo] + selected.sum())
+        if m >= 2:
+            both = np.einsum('ij,ij->i', previous[lo:hi], two[lo:hi])
+            second[m] = m * (m - 1) * (two_below[lo] + both.sum()) + mean[m]
+            selected = np.maximum(selected, both)
+        else:
+            second[m] = mean[m]
+
+        hi = lo + int(np.flatnonzero(selected > NEGLIGIBLE * ds[lo:hi]).max(initial=-1)) + 1
+        if lo == hi:
+            if lo == 0:
+                break # no node of a larger group is selected either
+            continue
+        previous[lo:hi] = binom[lo:hi]
+        binom[lo:hi] *= 1 - s[lo:hi, None]
+        binom[lo:hi, 1:] += previous[lo:hi, :-1] * s[lo:hi, None]
+    return mean, second
+
+
+def inclusion_probs(weight: np.ndarray, k: int, group: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Selection probability of every node of a layer, the k nodes with the smallest keys being selected,
+    or of several layers selecting k nodes each, given as groups.
+
+    Node i is selected iff at most k - 1 of the others have a key below its key t:
+    P_i = integral of P(N_i(t) <= k - 1) ds_i, with N_i(t) the number of the other nodes below t.
+    N_i is the sum of the nodes before i and of the nodes after i, whose distributions are built up
+    node by node, forward and backward. Those after i are kept at the start of every block of about
+    sqrt(n) nodes and rebuilt within a block, so that each node is added 3 times in all.
+    The groups are computed together, side by side on the keys, in chunks of at most KEYS_PER_PASS keys.
+    Nodes with weight 0 are only selected if fewer than k nodes have a weight > 0, uniformly at random.
+    Args:
+        weight: weights of the nodes, at least k of them in every group
+        k: number of nodes selected from every group
+        group: group of each node, all in one group if None
+    Returns:
+        the selection probability of each node
+    """
+    weight = np.asarray(weight, dtype=np.float64)
+    group = np.zeros(len(weight), dtype=np.int64) if group is None else np.asarray(group)
+    probs = np.zeros(len(weight))
+    
+    order = np.argsort(group, kind='stable')
+    chunk, keys = [], 0
+    for nodes in np.split(order, np.flatnonzero(np.diff(group[order])) + 1):
+        positive = nodes[weight[nodes] > 0]
+        if len(positive) <= k:
+            probs[nodes] = (k - len(positive)) / max(len(nodes) - len(positive), 1)
+            probs[positive] = 1.0
+            continue
+        ones = np.ones(len(positive))
+        t, dlog = key_grid(weight[positive], k, ones, ones)
+        if chunk and keys + len(t) > KEYS_PER_PASS:
+            stacked_inclusion_probs(weight, k, chunk, probs)
+            chunk, keys = [], 0
+        chunk.append((positive, t, dlog))
+        keys += len(t)
+    if chunk:
+        stacked_inclusion_probs(weight, k, chunk, probs)
+    return probs
+
+
+def stacked_inclusion_probs(
+    weight: np.ndarray, 
+    k: int, 
+    groups: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], 
+    probs: np.ndarray,
+) -> None:
+    """
+    The selection probabilities of inclusion_probs for groups of more than k nodes with weight > 0,
+    their grids of keys side by side: the i-th node of every group is added at once, as a row of weights 
+    over the keys. The groups with fewer nodes are padded with weight 0, which adds nothing.
+    Args:
+        weight: weights of the nodes
+        k: number of nodes selected from every group
+        groups: the nodes of each group, with its grid of keys (see key_grid)
+        probs: selection probability of each node, set for the nodes of the groups
+    """
+    t = np.concatenate([keys for _, keys, _ in groups])
+    dlog = np.concatenate([d for _, _, d in groups])
+    starts = np.cumsum([0] + [len(keys) for _, keys, _ in groups[:-1]]) # first key of each group
+    column_group = np.repeat(np.arange(len(groups)), [len(keys) for _, keys, _ in groups])
+    n = max(len(nodes) for nodes, _, _ in groups)
+    # (i x groups): the i-th node of each group, -1 for none
+    nodes = np.full((n, len(groups)), -1, dtype=np.int64)
+    for g, (members, _, _) in enumerate(groups):
+        nodes[:len(members), g] = members
+    row_weight = np.where(nodes >= 0, weight[nodes], 0.0)
+
+    def below(i: np.ndarray) -> np.ndarray:
+        # probability of the i-th nodes to be below each key, (len(i) x keys)
+        return -np.expm1(-row_weight[i][:, column_group] * t)
+
+    def add(pmf: np.ndarray, q: np.ndarray) -> None:
+        # add a node below the keys with probability q to the distribution (c x keys) of a number of nodes
+        pmf[1:] += (pmf[:-1] - pmf[1:]) * q
+        pmf[0] *= 1 - q
+
+    size = int(np.ceil(np.sqrt(n)))
+    starts_of_blocks = range(0, n, size)
+    # distribution of the number of nodes below the keys after each block, then before the i-th nodes
+    after = {}
+    pmf = np.zeros((k, len(t)))
+    pmf[0] = 1.0
+    for start in reversed(starts_of_blocks):
+        after[start] = pmf.copy()
+        for q in below(np.arange(start, min(start + size, n)))[::-1]:
+            add(pmf, q)
+    before = pmf
+    before[:] = 0.0
+    before[0] = 1.0
+
+    for start in starts_of_blocks:
+        block = np.arange(start, min(start + size, n))
+        q_block = below(block)
+        # ds of the nodes of the block, as in group_moments
+        w = row_weight[block][:, column_group]
+        density = dlog * w * t * np.exp(-w * t)
+        # P(at most c of the nodes after the i-th nodes are below), for the nodes of the block
+        pmf = after[start].copy()
+        cdf_after = np.empty((len(block), k, len(t)))
+        for j in reversed(range(len(block))):
+            cdf_after[j] = np.cumsum(pmf, axis=0)
+            add(pmf, q_block[j])
+        for j, i in enumerate(block):
+            others = np.einsum('cj,cj->j', before, cdf_after[j, ::-1]) # P(N_i <= k - 1)
+            selected = q_block[j, starts] + np.add.reduceat(density[j] * others, starts)
+            members = nodes[i] >= 0
+            probs[nodes[i, members]] = selected[members]
+            add(before, q_block[j])
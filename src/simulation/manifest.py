@@ -0,0 +1,125 @@
+import json
+import time
+import yaml
+from typing import Any, Dict, List
+
+from .create_nodes import create_target_nodes
+from .get_results import grid_ranges, results_sweep, epoch_sweeps
+from .run_sim import check_runs, combos_filename, run_experiments, task_rng
+from .Sweep import Sweep
+
+# settings shared by every experiment of a manifest, with their defaults:
+# the workers of the pool hold one base topology and one topology pool for one engine
+SHARED_SETTINGS = {'engine': 'object', 'batch': 1, 'seed': None}
+
+# settings of an experiment of each command, as the command line flags of main.py, with their defaults
+EXPERIMENT_SETTINGS = {
+    'get_results': {'mode': None, 'version': None, 'attack': False, 'mini': False, 'resume': False,
+                    'adaptive': False, 'ci_target': 0.01, 'min_runs': 10, 'max_runs': None, 'expected': False},
+    'get_epochs': {'adaptive': False, 'ci_target': 0.01, 'min_runs': 10, 'max_runs': None},
+}
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """
+    Read a manifest, JSON or (for .yaml / .yml files) YAML.
+    Args:
+        path: file of the manifest
+    Returns:
+        the shared settings, and the experiments as a list under 'experiments'
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def expand_manifest(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Check a manifest and fill in the defaults of every experiment.
+    Returns:
+        the settings of every experiment, each with its command and the shared settings
+    """
+    unknown = set(manifest) - set(SHARED_SETTINGS) - {'experiments'}
+    if unknown:
+        raise ValueError(f"Unknown manifest settings: {sorted(unknown)}")
+    shared = {key: manifest.get(key, default) for key, default in SHARED_SETTINGS.items()}
+    if shared['engine'] not in ('object', 'array'):
+        raise ValueError(f"The manifest engine must be 'object' or 'array', got {shared['engine']!r} "
+                         "(the analytic engine runs no simulations, so it can't share a manifest's pool: use get_results --engine analytic)")
+
+    experiments = []
+    outputs = set()
+    for i, experiment in enumerate(manifest.get('experiments') or []):
+        experiment = dict(experiment)
+        command = experiment.pop('command', None)
+        if command not in EXPERIMENT_SETTINGS:
+            raise ValueError(f"Experiment {i}: command must be one of {sorted(EXPERIMENT_SETTINGS)}, got {command!r}")
+        unknown = set(experiment) - set(EXPERIMENT_SETTINGS[command])
+        if unknown:
+            hint = " (set at the top of the manifest, for every experiment)" if unknown & set(SHARED_SETTINGS) else ""
+            raise ValueError(f"Experiment {i}: unknown {command} settings {sorted(unknown)}{hint}")
+        settings = {key: experiment.get(key, default) for key, default in EXPERIMENT_SETTINGS[command].items()}
+
+        # every experiment is checked before any runs, and two experiments writing
+        # the same file would clobber each other's results and task log
+        if command == 'get_results':
+            if settings['mode'] not in ('A***A', 'AAAAA') or settings['version'] not in ('v1', 'v2', 'v3'):
+                raise ValueError(f"Experiment {i}: get_results needs a mode (A***A or AAAAA) and a version (v1, v2 or v3)")
+            n_runs = settings['max_runs'] or grid_ranges(settings['mini'], settings['mode'], settings['version'], settings['attack'])[4]
+            output = combos_filename(settings['version'], settings['mode'], settings['attack'], n_runs, adaptive=settings['adaptive'])
+        else:
+            n_runs = settings['max_runs'] or 1000
+            output = 'get_epochs'
+        check_runs(shared['engine'], shared['batch'], settings['adaptive'], settings['min_runs'], n_runs)
+        if output in outputs:
+            raise ValueError(f"Experiment {i} repeats an earlier experiment's output {output}")
+        outputs.add(output)
+
+        experiments.append({'command': command, **shared, **settings})
+    return experiments
+
+
+def run_manifest(path: str) -> None:
+    """
+    Run every experiment of a manifest as one queue of tasks on one pool, instead of one
+    main.py invocation (and pool) each. Every experiment writes the same sim_data files as its
+    command would, as soon as its own tasks are done. The longest tasks of all experiments
+    are handed out first, so the workers don't idle at the tail of each experiment.
+    An example manifest, in YAML:
+
+        engine: array
+        batch: 25
+        seed: 1
+        experiments:
+          - {command: get_results, mode: A***A, version: v2, attack: false}
+          - {command: get_results, mode: A***A, version: v1, attack: true, mini: true}
+          - {command: get_epochs}
+
+    Args:
+        path: file of the manifest, see load_manifest
+    """
+    start_time = time.time()
+    print(f"Program started at: {time.ctime(start_time)}")
+
+    manifest = load_manifest(path)
+    experiments = expand_manifest(manifest)
+    shared = {key: manifest.get(key, default) for key, default in SHARED_SETTINGS.items()}
+
+    base_topology = create_target_nodes(task_rng(shared['seed']))
+    sweeps: List[Sweep] = []
+    for experiment in experiments:
+        if experiment['command'] == 'get_results':
+            sweeps.append(results_sweep(base_topology, experiment['mini'], experiment['mode'], experiment['version'], experiment['attack'],
+                                        experiment['engine'], experiment['batch'], experiment['seed'], experiment['resume'],
+                                        experiment['adaptive'], experiment['ci_target'], experiment['min_runs'], experiment['max_runs'],
+                                        experiment['expected']))
+        else:
+            sweeps.extend(epoch_sweeps(experiment['engine'], experiment['batch'], experiment['seed'],
+                                       experiment['adaptive'], experiment['ci_target'], experiment['min_runs'], experiment['max_runs']))
+    print(f"Running {len(experiments)} experiments, {sum(len(sweep.groups) for sweep in sweeps)} combinations.")
+
+    run_experiments(base_topology, sweeps, shared['batch'], shared['engine'])
+
+    end_time = time.time()
+    print(f"Program ended at: {time.ctime(end_time)}")
@@ -0,0 +1,115 @@
+import bisect
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .frontier import coarse_values
+from ..utils.util import get_cost
+
+
+def target_status(result: Dict[str, Any], targets: Mapping[str, float]) -> str:
+    """
+    Whether an averaged result reaches the targets, from the 95% confidence intervals of its fractions.
+    Returns:
+        'feasible' if every interval is above its target, 'infeasible' if some interval is below its target,
+        'undecided' otherwise
+    """
+    status = 'feasible'
+    for field, target in targets.items():
+        ci = result.get(f'{field}_ci')
+        low, high = ci if ci is not None else (float('-inf'), float('inf'))
+        if high < target:
+            return 'infeasible'
+        if low < target:
+            status = 'undecided'
+    return status
+
+
+def race_to_target(
+    base_args: List[Tuple],
+    run: Callable[[List[Tuple], int], List[Dict[str, Any]]],
+    targets: Mapping[str, float],
+    min_runs: int,
+    max_runs: int,
+    stride: int = 3,
+    wave: int = 16,
+) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Find the cheapest combination (see get_cost) whose expected fractions reach the targets,
+    racing the combinations against the targets instead of simulating the whole grid.
+
+    Every combination starts with min_runs runs. One whose confidence intervals are all above
+    the targets is feasible, and every costlier combination is dropped; one with an interval below
+    its target is dropped too. The others are undecided and their runs are doubled, up to max_runs,
+    until they are decided (successive halving, with the targets as the threshold).
+
+    As in search_frontier, the fractions are expected to grow with A, astake and B (for a fixed bstake).
+    So a coarse grid is simulated first, and a combination is dropped without being simulated
+    if the coarse combination above it is infeasible. The other combinations are raced from
+    the cheapest up, in waves of up to `wave` combinations, so that what is simulated doesn't depend
+    on the number of workers.
+
+    Args:
+        base_args: (B, A, bstake, astake, ...) of every combination of the grid
+        run: simulates the first n_runs runs of a list of combinations and returns their averaged results,
+             in order; runs already simulated for a combination should be reused
+        targets: smallest expected value of each fraction, e.g. {'f_gw': 0.3}
+        min_runs: runs of a combination in its first race, at least 2
+        max_runs: largest number of runs of a combination
+        stride: spacing of the coarse grid in the values of B and A
+        wave: number of combinations raced at once
+    Returns:
+        the cheapest feasible combination's averaged result (None if none was found),
+        the averaged results of the cheaper combinations still undecided after max_runs runs, cheapest first,
+        the averaged results of every simulated combination
+    """
+    def cost(args: Tuple) -> float:
+        return get_cost(*args[:4])
+
+    candidates = sorted(base_args, key=cost)
+    results: Dict[Tuple, Dict[str, Any]] = {} # (B, A, bstake, astake) -> latest averaged result
+
+    def race(combos: List[Tuple]) -> None:
+        by_runs = defaultdict(list)
+        for args in combos:
+            result = results.get(args[:4])
+            by_runs[min_runs if result is None else min(2 * result['n_runs'], max_runs)].append(args)
+        for n_runs, same_runs in sorted(by_runs.items()):
+            for args, result in zip(same_runs, run(same_runs, n_runs)):
+                results[args[:4]] = result
+
+    B_coarse = coarse_values([args[0] for args in base_args], stride)
+    A_coarse = coarse_values([args[1] for args in base_args], stride)
+    race([args for args in candidates if args[0] in B_coarse and args[1] in A_coarse])
+
+    # a combination can't reach the targets if the nearest coarse combination above it surely doesn't
+    def bound_infeasible(args: Tuple) -> bool:
+        B, A, bstake, astake = args[:4]
+        above = (B_coarse[bisect.bisect_left(B_coarse, B)], A_coarse[bisect.bisect_left(A_coarse, A)], bstake, astake)
+        return target_status(results[above], targets) == 'infeasible'
+
+    def cheapest_feasible() -> Optional[Tuple]:
+        return next((args for args in candidates
+                     if args[:4] in results and target_status(results[args[:4]], targets) == 'feasible'), None)
+
+    best = cheapest_feasible()
+    while True:
+        limit = cost(best) if best is not None else float('inf')
+        selected = []
+        for args in candidates:
+            if len(selected) == wave or cost(args) >= limit:
+                break
+            result = results.get(args[:4])
+            if result is None:
+                if not bound_infeasible(args):
+                    selected.append(args)
+            elif target_status(result, targets) == 'undecided' and result['n_runs'] < max_runs:
+                selected.append(args)
+        if not selected:
+            break
+        race(selected)
+        best = cheapest_feasible()
+
+    limit = cost(best) if best is not None else float('inf')
+    undecided = [results[args[:4]] for args in candidates
+                 if cost(args) < limit and args[:4] in results and target_status(results[args[:4]], targets) == 'undecided']
+    return (results[best[:4]] if best is not None else None), undecided, list(results.values())
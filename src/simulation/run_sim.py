@@ -1,33 +1,94 @@
 import os
 import datetime
 from collections import defaultdict
+from contextlib import contextmanager
 from multiprocessing import Pool, cpu_count, set_start_method
-from tqdm import tqdm
+import numpy as np
+from scipy import stats
 
-from typing import Dict, List, Sequence, Tuple, Optional, Union
+from typing import Dict, Iterator, List, Sequence, Tuple, Optional, Union
 
 from .SimNode import Config, SimNode
-from .create_nodes import create_B_A_nodes
-from .drop_test_packets import drop_test_packets
-from .get_active_set import dropping_calc_probs, no_dropping_calc_probs, get_active_set
-from .counts import count_active_set_node_types, get_path_prob
-from ..utils.util import save_results, add_then_average
+from .ArrayTopology import ArrayTopology, ROLE_GATEWAY, TYPE_A
+from .TopologyPool import TopologyPool, ArrayTopologyPool, split_A_nodes
+from .SharedTopology import SharedTopology
+from .TaskLog import TaskLog, MergedTaskLog, shard_log_path
+from .Sweep import Sweep, run_sweeps, shard_units, replay
+from .frontier import search_frontier
+from .optimize import race_to_target
+from .inclusion import group_moments, NEGLIGIBLE
+from .drop_test_packets import drop_test_packets, drop_test_packets_array
+from .get_active_set import (dropping_calc_probs, no_dropping_calc_probs, get_active_set, get_active_set_probs,
+                             dropping_calc_probs_array, no_dropping_calc_probs_array, get_active_set_array, get_active_set_probs_array)
+from .counts import (count_active_set_node_types, get_path_prob, count_active_set_node_types_array, get_path_prob_array,
+                     expected_node_types, expected_path_prob, expected_node_types_array, expected_path_prob_array,
+                     split_replicates, split_replicate_probs)
+from ..utils.util import save_results, save_columns, columns_path, StreamingAverage
 
 config = Config()
-G_BASE_TOPOLOGY = None # global base_topology for worker processes to avoid re-pickling per task
+G_BASE_TOPOLOGY = None # per-process view of the shared base topology
+G_TOPOLOGY_POOL = None # per-process topology pool, reset in place for every run
+V3_BATCH_MIN_NODES = 100 # NMv3 runs with fewer B and A nodes are simulated one at a time, batching them doesn't pay
 
 def get_timestamp() -> str:
     """Current timestamp for filenames"""
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def init_worker(base_topology: Dict[int, List[SimNode]]) -> None:
+def task_rng(seed: Optional[int], *key: int) -> np.random.Generator:
     """
-    Worker initializer to cache the base topology in a global for the process
+    Random generator of one simulation task.
     Args:
-        base_topology: layer -> a list of nodes on each layer
+        seed: master seed of the experiment, None for fresh OS entropy
+        key: non-negative integers addressing the task, e.g. its combination and first replicate
+    Returns:
+        the generator of the stream spawned from the master seed at that key, 
+        the same whichever worker runs the task and in whichever order
+    """
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+def init_worker(
+    base_topology: SharedTopology, 
+    max_B: int, 
+    max_A: int, 
+    max_replicates: int = 1,
+    engine: str = 'object',
+) -> None:
+    """
+    Worker initializer to build the process's topology pool from the base topology
+    Args:
+        base_topology: the base topology in shared memory, read in place by every worker
+        max_B: largest number of B nodes in any combo
+        max_A: largest number of A nodes in any combo
+        max_replicates: largest batch of runs simulated together (array engine only)
+        engine: 'object' or 'array', see run_one_combo
+    """
+    global G_BASE_TOPOLOGY, G_TOPOLOGY_POOL
+    G_BASE_TOPOLOGY = base_topology # keeps the shared memory attached
+    if engine == 'array':
+        G_TOPOLOGY_POOL = ArrayTopologyPool(base_topology.topology(), max_B, max_A, max_replicates)
+    else:
+        G_TOPOLOGY_POOL = TopologyPool(base_topology.topology(), max_B, max_A)
+
+@contextmanager
+def worker_pool(
+    base_topology: Dict[int, List[SimNode]], 
+    max_B: int, 
+    max_A: int, 
+    batch: int, 
+    engine: str,
+) -> Iterator[Pool]:
     """
-    global G_BASE_TOPOLOGY
-    G_BASE_TOPOLOGY = base_topology
+    Process pool whose workers are initialized with init_worker. The base topology is exported
+    to shared memory once, and read in place by the workers.
+    Args:
+        base_topology: layers -> a list of nodes on each layer
+        (other args as in init_worker)
+    """
+    with SharedTopology(ArrayTopology.from_topology(base_topology)) as shared, \
+         Pool(processes=cpu_count(), initializer=init_worker, initargs=(shared, max_B, max_A, max(batch, 1), engine)) as pool:
+        yield pool
 
 def run_one_combo(
     B: int, 
@@ -36,7 +97,10 @@ def run_one_combo(
     astake: float, 
     mode: str, 
     version: str, 
-    attack: bool
+    attack: bool,
+    engine: str = 'object',
+    rng: Optional[np.random.Generator] = None,
+    expected: bool = False,
 ) -> Dict[str, Union[Union[int, float], Dict[str, float]]]:
     """
     Run one combination once and returns the result regarding to one active set.
@@ -48,33 +112,69 @@ def run_one_combo(
         mode: attack objective A***A or AAAAA
         version: NM versions, v1, v2, or v3
         attack: False-baseline staking; True-framing attack
+        engine: 'object' simulates SimNode objects; 'array' simulates an ArrayTopology
+        rng: random generator of this run, a fresh one if None
+        expected: score the expected active set given the final select_prob of the nodes 
+                  (see get_active_set_probs) instead of the drawn one
     Returns:
         result regarding to one active set 
     """
+    if rng is None:
+        rng = np.random.default_rng()
     
-    # create a fresh working topology per run from the shared base
-    global G_BASE_TOPOLOGY
-    if G_BASE_TOPOLOGY is None:
-        raise RuntimeError("Base topology not initialized.")
-    base_topology = G_BASE_TOPOLOGY
+    # reset the process's preallocated topology for this run
+    global G_TOPOLOGY_POOL
+    if G_TOPOLOGY_POOL is None:
+        raise RuntimeError("Topology pool not initialized.")
+    topology_pool = G_TOPOLOGY_POOL
     
-    if attack:
-        topology = create_B_A_nodes(base_topology, B, A, bstake, astake, mode, version)
-        for _ in range(config.epochs):
-            for _ in range(4): # each epoch has 4 rounds of testing
-                drop_test_packets(topology, version)
-                dropping_calc_probs(topology)
-            active_set = get_active_set(topology)
-    else:
+    if not attack:
         B = 0
-        bstake = 0
-        topology = create_B_A_nodes(G_BASE_TOPOLOGY, 0, A, 0, astake, mode, version) # set B and bstake to zero if there's no framing attack.
-        no_dropping_calc_probs(topology)
-        active_set = get_active_set(topology)
+        bstake = 0 # set B and bstake to zero if there's no framing attack.
+    
+    if engine == 'array':
+        type_counts, path_prob = run_one_combo_array(topology_pool, B, A, bstake, astake, mode, version, attack, rng, expected)
+    
+    else:
+        if attack:
+            topology = topology_pool.reset(B, A, bstake, astake, mode, version, rng)
+            for _ in range(config.epochs):
+                for _ in range(4): # each epoch has 4 rounds of testing
+                    drop_test_packets(topology, version, rng)
+                    dropping_calc_probs(topology)
+                active_set = get_active_set(topology, rng)
+        else:
+            topology = topology_pool.reset(0, A, 0, astake, mode, version, rng)
+            no_dropping_calc_probs(topology)
+            active_set = get_active_set(topology, rng)
         
-    type_counts = count_active_set_node_types(active_set)
-    path_prob = get_path_prob(active_set)
+        if expected:
+            probs = get_active_set_probs(topology)
+            type_counts = expected_node_types(topology, probs)
+            path_prob = expected_path_prob(topology, probs)
+        else:
+            type_counts = count_active_set_node_types(active_set)
+            path_prob = get_path_prob(active_set)
     
+    return combo_result(type_counts, path_prob, B, A, bstake, astake)
+
+def combo_result(
+    type_counts: Dict[str, int], 
+    path_prob: Dict[str, float], 
+    B: int, 
+    A: int, 
+    bstake: float, 
+    astake: float,
+) -> Dict[str, Union[Union[int, float], Dict[str, float]]]:
+    """
+    Result regarding to one active set, as saved by run_many_combo.
+    Args:
+        type_counts: count for each type of node in the active set
+        path_prob: path combination -> prob
+        (other args as in run_one_combo)
+    Returns:
+        result regarding to one active set
+    """
     f_gw = (type_counts['B_gw'] + type_counts['A_gw']) / (config.entry_gws + config.exit_gws)
     f_mix = (type_counts['B_mix'] + type_counts['A_mix']) / (config.mixnodes_layers * config.mixnodes_per_layer)
     
@@ -94,8 +194,381 @@ def run_one_combo(
     
     return result
 
-def run_one_combo_args(args: Tuple[int, int, float, float, str, str, bool]) -> Dict[str, Union[Union[int, float], Dict[str, float]]]:
-    return run_one_combo(*args)
+def run_one_combo_array(
+    topology_pool: ArrayTopologyPool, 
+    B: int, 
+    A: int, 
+    bstake: float, 
+    astake: float, 
+    mode: str, 
+    version: str, 
+    attack: bool,
+    rng: np.random.Generator,
+    expected: bool = False,
+) -> Tuple[Dict[str, int], Dict[str, float]]:
+    """
+    The epoch loop of run_one_combo on an ArrayTopology.
+    Args:
+        topology_pool: the process's array topology pool
+        (other args as in run_one_combo)
+    Returns:
+        type counts and path probabilities regarding to one active set
+    """
+    topology = topology_pool.reset(B, A, bstake, astake, mode, version, rng=rng)
+    active_set = simulate_array(topology, version, attack, rng)
+    
+    if expected:
+        probs = get_active_set_probs_array(topology)
+        return expected_node_types_array(topology, probs), expected_path_prob_array(topology, probs)
+    return count_active_set_node_types_array(topology, active_set), get_path_prob_array(topology, active_set)
+
+def simulate_array(topology: ArrayTopology, version: str, attack: bool, rng: np.random.Generator) -> List[np.ndarray]:
+    """
+    Run the epochs of one simulation on an ArrayTopology, for every replicate it holds.
+    Args:
+        topology: array topology with the B, A nodes added
+        version: NM versions, v1, v2, or v3
+        attack: False-baseline staking; True-framing attack
+        rng: random generator of this simulation
+    Returns:
+        active_set: layer -> indices of the nodes in the final active set
+    """
+    if attack:
+        for _ in range(config.epochs):
+            for _ in range(4): # each epoch has 4 rounds of testing
+                drop_test_packets_array(topology, version, rng)
+                dropping_calc_probs_array(topology)
+            active_set = get_active_set_array(topology, rng)
+    else:
+        no_dropping_calc_probs_array(topology)
+        active_set = get_active_set_array(topology, rng)
+    
+    return active_set
+
+def run_one_combo_batch(
+    B: int, 
+    A: int, 
+    bstake: float, 
+    astake: float, 
+    mode: str, 
+    version: str, 
+    attack: bool,
+    replicates: int,
+    rng: Optional[np.random.Generator] = None,
+    expected: bool = False,
+) -> List[Dict[str, Union[Union[int, float], Dict[str, float]]]]:
+    """
+    Run one combination several times at once, as independent replicates of one ArrayTopology.
+    Args:
+        replicates: number of runs
+        rng: random generator of the whole batch, a fresh one if None
+        (other args as in run_one_combo)
+    Returns:
+        one result per run, as from run_one_combo
+    """
+    global G_TOPOLOGY_POOL
+    if G_TOPOLOGY_POOL is None:
+        raise RuntimeError("Topology pool not initialized.")
+    
+    if not attack:
+        B = 0
+        bstake = 0 # set B and bstake to zero if there's no framing attack.
+    
+    if rng is None:
+        rng = np.random.default_rng()
+    topology = G_TOPOLOGY_POOL.reset(B, A, bstake, astake, mode, version, replicates, rng)
+    active_set = simulate_array(topology, version, attack, rng)
+    
+    if expected:
+        return [
+            combo_result(expected_node_types_array(topology, probs), expected_path_prob_array(topology, probs), B, A, bstake, astake)
+            for probs in split_replicate_probs(topology, get_active_set_probs_array(topology))
+        ]
+    return [
+        combo_result(count_active_set_node_types_array(topology, replicate_set), get_path_prob_array(topology, replicate_set), B, A, bstake, astake)
+        for replicate_set in split_replicates(topology, active_set)
+    ]
+
+def run_one_combo_args(
+    args: Tuple[int, int, float, float, str, str, bool, str, bool, Optional[int], int, int],
+) -> List[Dict[str, Union[Union[int, float], Dict[str, float]]]]:
+    *combo, engine, expected, seed, first, replicates = args
+    B, A, bstake, astake = combo[:4]
+    rng = task_rng(seed, B, A, int(bstake), int(astake), first)
+    if replicates > 1 and (combo[5] != 'v3' or B + A >= V3_BATCH_MIN_NODES):
+        return run_one_combo_batch(*combo, replicates, rng, expected)
+    # the runs of a batch one after the other, on the same random stream
+    return [run_one_combo(*combo, engine, rng, expected) for _ in range(replicates)]
+
+def batches(n_runs: int, batch: int) -> List[Tuple[int, int]]:
+    """Split n_runs runs into batches of at most batch runs, as (index of the first run, number of runs)."""
+    return [(first, min(batch, n_runs - first)) for first in range(0, n_runs, batch)]
+
+class ComboSweep(Sweep):
+    """
+    Runs of a set of combinations, averaged per combination, see run_combos.
+    Every finished task is appended to the task log, and the tasks already in it are not run again.
+    """
+
+    def __init__(
+        self,
+        base_args: List[Tuple],
+        n_runs: int,
+        batch: int,
+        seed: Optional[int],
+        task_log: Union[TaskLog, MergedTaskLog],
+        n_base: int,
+        adaptive: bool = False,
+        ci_target: float = 0.01,
+        min_runs: int = 10,
+        file_path: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        report_resume: bool = True,
+    ) -> None:
+        """
+        Args:
+            base_args: (B, A, bstake, astake, mode, version, attack, engine, expected) of each combination
+            task_log: log of the finished tasks, the merged logs of its shards to merge a sharded sweep
+            n_base: number of target nodes
+            file_path: if given, the averages are saved to it once the sweep finishes, see save_combos
+            shard: (i, N) to run only the tasks of shard i of N, see shard_units
+            report_resume: print how many tasks are already in the log
+            (other args as in run_many_combo)
+        """
+        self.base_args = base_args
+        self.n_runs = n_runs
+        self.task_log = task_log
+        self.adaptive = adaptive
+        self.ci_target = ci_target
+        self.min_runs = min_runs
+        self.file_path = file_path
+        
+        # one group of tasks per combination, a task is a batch of runs: (index of the first run, number of runs)
+        self.fn = run_one_combo_args
+        self.groups = [(args + (seed,), batches(n_runs, max(batch, 1))) for args in base_args]
+        if shard is not None:
+            self.groups = shard_units(self.groups, shard)
+        self.costs = [n_base + args[0] + args[1] for args in base_args] # time of a run grows with the number of nodes
+        self.min_units = -(-min_runs // max(batch, 1)) if adaptive else None # batches covering min_runs runs
+        self.skip = {(g, u) for g in range(len(self.groups)) for u in range(len(self.groups[g][1])) if self.task_key(g, u) in task_log.done}
+        if report_resume and self.skip and isinstance(task_log, TaskLog):
+            print(f"Resuming: {len(self.skip)} of {sum(len(units) for _, units in self.groups)} tasks already done.")
+        
+        # the scheduler passes each combination's results on in run order, whichever worker ran them,
+        # so that the averages come out the same on every run
+        self.aggregate = StreamingAverage()
+    
+    def task_key(self, g: int, u: int) -> Tuple:
+        """The key of a task in the log: (B, A, bstake, astake, first run, number of runs)."""
+        group, units = self.groups[g]
+        return group[:4] + units[u]
+    
+    def on_result(self, g: int, u: int, results: List[Dict]) -> bool:
+        if (g, u) not in self.skip:
+            self.task_log.append(self.task_key(g, u), results)
+        self.aggregate.add_all(results)
+        # checked after every batch in run order, so a combination stops at the same run whatever the scheduling
+        return self.adaptive and self.aggregate.converged(results[-1], ('f_gw', 'f_mix'), self.ci_target, self.min_runs)
+    
+    def skipped_result(self, g: int, u: int) -> List[Dict]:
+        return self.task_log.results(self.task_key(g, u))
+    
+    def averages(self) -> List[Dict[str, Union[Union[int, float], Dict[str, float]]]]:
+        """Averaged results, one per combination, in the order of base_args."""
+        position = {args[:4]: i for i, args in enumerate(self.base_args)}
+        return sorted(self.aggregate.averages(), key=lambda r: position[(r['B'], r['A'], r['B_stake'], r['A_stake'])])
+    
+    def finish(self) -> None:
+        if self.file_path is not None:
+            self.task_log.close()
+            save_combos(self.averages(), self.file_path, self.n_runs, self.adaptive)
+
+def run_combos(
+    pool: Pool,
+    base_args: List[Tuple],
+    n_runs: int,
+    batch: int,
+    seed: Optional[int],
+    task_log: TaskLog,
+    n_base: int,
+    adaptive: bool = False,
+    ci_target: float = 0.01,
+    min_runs: int = 10,
+    report_resume: bool = True,
+) -> List[Dict[str, Union[Union[int, float], Dict[str, float]]]]:
+    """
+    Run a set of combinations on the pool and average the results of each.
+    Args:
+        pool: process pool, initialized with init_worker
+        (other args as in ComboSweep)
+    Returns:
+        averaged results, one per combination, in the order of base_args
+    """
+    sweep = ComboSweep(base_args, n_runs, batch, seed, task_log, n_base, adaptive, ci_target, min_runs, report_resume=report_resume)
+    run_sweeps(pool, [sweep])
+    return sweep.averages()
+
+def check_runs(engine: str, batch: int, adaptive: bool, min_runs: int, n_runs: int) -> None:
+    """Raise a ValueError if the run settings don't go together."""
+    if batch > 1 and engine != 'array':
+        raise ValueError("Batched runs need the array engine.")
+    if adaptive and not 2 <= min_runs <= n_runs:
+        raise ValueError(f"Adaptive runs need 2 <= min_runs <= n_runs, got min_runs={min_runs}, n_runs={n_runs}.")
+
+def data_path(filename: str) -> str:
+    """Path of a file in sim_data, which is created if needed."""
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+    data_dir = os.path.join(project_root, "sim_data")
+    os.makedirs(data_dir, exist_ok=True) 
+    return os.path.join(data_dir, filename)
+
+def combos_filename(version: str, mode: str, attack: bool, n_runs: int, search: str = 'grid', adaptive: bool = False) -> str:
+    """
+    Name of the results file of run_many_combo in sim_data. Adaptive and frontier runs get their own
+    suffix, so that they don't overwrite the results of the usual fixed-run grid.
+    """
+    suffix = ("_adaptive" if adaptive else "") + ("" if search == 'grid' else f"_{search}")
+    return f"{version}_{mode}_{attack}_{n_runs}{suffix}.json"
+
+def open_combos_log(
+    version: str, 
+    mode: str, 
+    attack: bool, 
+    n_runs: int, 
+    engine: str, 
+    batch: int, 
+    seed: Optional[int], 
+    resume: bool,
+    adaptive: bool, 
+    ci_target: float, 
+    min_runs: int, 
+    search: str = 'grid',
+    shard: Optional[Tuple[int, int]] = None,
+    expected: bool = False,
+) -> Tuple[str, TaskLog]:
+    """
+    Results file and task log of a run of run_many_combo (args as in run_many_combo).
+    Returns:
+        path of the results file, task log next to it (the shard's own log for a shard)
+    """
+    file_path = data_path(combos_filename(version, mode, attack, n_runs, search, adaptive))
+    settings = combos_settings(version, mode, attack, n_runs, engine, batch, seed, adaptive, ci_target, min_runs, expected)
+    if shard is not None:
+        settings["shard"] = f"{shard[0]}/{shard[1]}"
+        return file_path, TaskLog(shard_log_path(file_path, shard), settings, resume)
+    return file_path, TaskLog(file_path[:-len(".json")] + ".tasks.jsonl", settings, resume)
+
+def combos_settings(
+    version: str, 
+    mode: str, 
+    attack: bool, 
+    n_runs: int, 
+    engine: str, 
+    batch: int, 
+    seed: Optional[int], 
+    adaptive: bool, 
+    ci_target: float, 
+    min_runs: int,
+    expected: bool = False,
+) -> Dict:
+    """Settings of a run of run_many_combo in its task log, a resumed or merged log must have the same."""
+    settings = {"version": version, "mode": mode, "attack": attack, "n_runs": n_runs, "engine": engine, "batch": batch, "seed": seed}
+    if adaptive:
+        settings.update({"ci_target": ci_target, "min_runs": min_runs})
+    if expected:
+        settings["expected"] = True
+    return settings
+
+def check_shard(shard: Optional[Tuple[int, int]], adaptive: bool) -> None:
+    """Raise a ValueError if the shard (i, N) isn't one of N shards, or with adaptive runs."""
+    if shard is None:
+        return
+    i, n = shard
+    if not 1 <= i <= n:
+        raise ValueError(f"Shard {i}/{n}: the shard must be between 1 and {n}.")
+    if adaptive:
+        # whether a combination stops depends on all its runs before, which are spread over the shards
+        raise ValueError("Adaptive runs can't be sharded.")
+
+def save_combos(averaged_results: List[Dict], file_path: str, n_runs: int, adaptive: bool) -> None:
+    """Save the averaged results of run_many_combo, by increasing f_gw, as JSON and as columns (see save_columns)."""
+    averaged_results.sort(key=lambda r: r['f_gw'])
+    if adaptive:
+        used = sum(r['n_runs'] for r in averaged_results)
+        print(f"Adaptive: {used} of at most {n_runs * len(averaged_results)} runs.")
+    
+    save_results(averaged_results, file_path)
+    save_columns(averaged_results, columns_path(file_path))
+
+def grid_args(
+    B_range: Sequence[int], 
+    A_range: Sequence[int], 
+    bstake: Sequence[float], 
+    astake: Sequence[float], 
+    mode: str, 
+    version: str, 
+    attack: bool,
+    engine: str,
+    expected: bool = False,
+) -> List[Tuple]:
+    """(B, A, bstake, astake, mode, version, attack, engine, expected) of every combination of the ranges, see run_many_combo."""
+    if attack:
+        return [
+            (num_b, num_a, s_b, s_a, mode, version, attack, engine, expected)
+            for num_b in B_range
+            for num_a in A_range
+            for s_b in bstake
+            for s_a in astake
+        ]
+    return [
+        (0, num_a, 0, s_a, mode, version, attack, engine, expected)
+        for num_a in A_range
+        for s_a in astake
+    ]
+
+def combos_sweep(
+    base_topology: Dict[int, List[SimNode]], 
+    B_range: Sequence[int], 
+    A_range: Sequence[int], 
+    bstake: Sequence[float], 
+    astake: Sequence[float], 
+    mode: str, 
+    version: str, 
+    attack: bool,
+    n_runs: int,
+    engine: str = 'object',
+    batch: int = 1,
+    seed: Optional[int] = None,
+    resume: bool = False,
+    adaptive: bool = False,
+    ci_target: float = 0.01,
+    min_runs: int = 10,
+    expected: bool = False,
+) -> ComboSweep:
+    """
+    The grid of run_many_combo as a sweep, to run on one pool with other sweeps (see run_experiments).
+    It saves the same results file as run_many_combo once its last combination is done.
+    (args as in run_many_combo)
+    """
+    check_runs(engine, batch, adaptive, min_runs, n_runs)
+    base_args = grid_args(B_range, A_range, bstake, astake, mode, version, attack, engine, expected)
+    file_path, task_log = open_combos_log(version, mode, attack, n_runs, engine, batch, seed, resume, adaptive, ci_target, min_runs, expected=expected)
+    n_base = sum(len(nodes) for nodes in base_topology.values())
+    return ComboSweep(base_args, n_runs, batch, seed, task_log, n_base, adaptive, ci_target, min_runs, file_path)
+
+def run_experiments(base_topology: Dict[int, List[SimNode]], sweeps: Sequence[Sweep], batch: int = 1, engine: str = 'object') -> None:
+    """
+    Run several sweeps (see combos_sweep and test_epochs.EpochSweep) as one queue of tasks on one pool.
+    Args:
+        base_topology: layers -> a list of nodes on each layer, shared by every sweep
+        sweeps: sweeps to run, each with its groups' args starting with (B, A)
+        batch: largest number of runs of a combination simulated together in one task
+        engine: 'object' or 'array', the engine of every sweep
+    """
+    max_B = max([group[0] for sweep in sweeps for group, _ in sweep.groups], default=0)
+    max_A = max([group[1] for sweep in sweeps for group, _ in sweep.groups], default=0)
+    with worker_pool(base_topology, max_B, max_A, batch, engine) as pool:
+        run_sweeps(pool, sweeps)
 
 def run_many_combo(
     base_topology: Dict[int, List[SimNode]], 
@@ -107,9 +580,22 @@ def run_many_combo(
     version: str, 
     attack: bool,
     n_runs: int,
+    engine: str = 'object',
+    batch: int = 1,
+    seed: Optional[int] = None,
+    resume: bool = False,
+    adaptive: bool = False,
+    ci_target: float = 0.01,
+    min_runs: int = 10,
+    search: str = 'grid',
+    shard: Optional[Tuple[int, int]] = None,
+    expected: bool = False,
 ) -> None:
     """
     Run many simulations and save the averaged results across those simulations to file.
+    Every finished task is also appended to a log next to the results file, see TaskLog.
+    A shard only runs its share of the tasks and only writes its own task log, merge_combos
+    then averages the logs of all the shards into the results file.
     Args:
         base_topology: layers -> a list of nodes on each layer
         B_range: range of number of B nodes
@@ -119,39 +605,271 @@ def run_many_combo(
         mode: attack objective A***A or AAAAA
         version: NM version, v1, v2, or v3
         attack: False-baseline staking; True-framing attack
-        n_runs: number of simulations to run
+        n_runs: number of simulations to run (per combination), the maximum if adaptive
+        engine: 'object' or 'array', see run_one_combo
+        batch: number of runs of a combination simulated together in one task, see run_one_combo_batch (array engine only)
+        seed: master seed, each batch of runs of a combination draws from its own stream of it (see task_rng).
+              None draws fresh entropy for every task.
+        resume: skip the tasks already in the log of an interrupted run with the same settings
+        adaptive: stop running a combination once the 95% confidence intervals of its f_gw and f_mix
+                  are within ci_target of the mean, after at least min_runs runs
+        ci_target: largest half width of the confidence intervals, if adaptive
+        min_runs: smallest number of runs of a combination, if adaptive
+        search: 'grid' runs every combination, 'frontier' only the ones that can be the cheapest 
+                to reach their fractions of the active set, see search_frontier
+        shard: (i, N) to run only shard i of N of the grid's tasks, see shard_units
+        expected: score each run by its expected active set given the final select_prob of the nodes instead of
+                  the drawn one, see run_one_combo. It averages out the selection of the active set, so that fewer
+                  runs reach the same precision.
     """
     
-    results_list = []
+    check_runs(engine, batch, adaptive, min_runs, n_runs)
+    check_shard(shard, adaptive)
+    if shard is not None and search != 'grid':
+        raise ValueError("Only the grid search can be sharded.")
+    base_args = grid_args(B_range, A_range, bstake, astake, mode, version, attack, engine, expected)
+    file_path, task_log = open_combos_log(version, mode, attack, n_runs, engine, batch, seed, resume, adaptive, ci_target, min_runs, search, shard, expected)
     
-    if attack:
-        base_args = [
-            (num_b, num_a, s_b, s_a, mode, version, attack)
-            for num_b in B_range
-            for num_a in A_range
-            for s_b in bstake
-            for s_a in astake
-        ]
-    else:
-        base_args = [
-            (0, num_a, 0, s_a, mode, version, attack)
-            for num_a in A_range
-            for s_a in astake
-        ]
+    n_base = sum(len(nodes) for nodes in base_topology.values())
+    
+    max_B = max(args[0] for args in base_args)
+    max_A = max(args[1] for args in base_args)
+    
+    if shard is not None:
+        sweep = ComboSweep(base_args, n_runs, batch, seed, task_log, n_base, shard=shard)
+        with worker_pool(base_topology, max_B, max_A, batch, engine) as pool:
+            run_sweeps(pool, [sweep])
+        task_log.close()
+        print(f"Shard {shard[0]}/{shard[1]} done: {sum(len(units) for _, units in sweep.groups)} tasks in {task_log.path}")
+        return
+    
+    with worker_pool(base_topology, max_B, max_A, batch, engine) as pool:
+        run = lambda combos: run_combos(pool, combos, n_runs, batch, seed, task_log, n_base, adaptive, ci_target, min_runs)
+        if search == 'frontier':
+            objectives = ('f_gw',) if mode == 'A***A' else ('f_gw', 'f_mix')
+            averaged_results = search_frontier(base_args, run, objectives)
+            print(f"Frontier search: {len(averaged_results)} of {len(base_args)} combinations simulated.")
+        else:
+            averaged_results = run(base_args)
+    task_log.close()
+    save_combos(averaged_results, file_path, n_runs, adaptive)
+
+def merge_combos(
+    B_range: Sequence[int], 
+    A_range: Sequence[int], 
+    bstake: Sequence[float], 
+    astake: Sequence[float], 
+    mode: str, 
+    version: str, 
+    attack: bool,
+    n_runs: int,
+    shards: int,
+    engine: str = 'object',
+    batch: int = 1,
+    seed: Optional[int] = None,
+    expected: bool = False,
+) -> None:
+    """
+    Merge the task logs of the shards of a sharded run_many_combo into its results file.
+    Every run's result is added to the averages of its combination in run order, as a single run
+    of the whole grid adds it, so with a seed the results file is the same as a single run's.
+    Args:
+        shards: number of shards, the logs of all of them must be complete
+        (other args as in run_many_combo, the same as the shards')
+    """
+    check_runs(engine, batch, False, 2, n_runs)
+    base_args = grid_args(B_range, A_range, bstake, astake, mode, version, attack, engine, expected)
+    file_path = data_path(combos_filename(version, mode, attack, n_runs))
+    task_log = MergedTaskLog(file_path, combos_settings(version, mode, attack, n_runs, engine, batch, seed, False, 0.01, 10, expected), shards)
+    
+    sweep = ComboSweep(base_args, n_runs, batch, seed, task_log, 0, file_path=file_path)
+    missing = sum(len(units) for _, units in sweep.groups) - len(sweep.skip)
+    if missing:
+        task_log.close()
+        raise ValueError(f"{missing} tasks are missing from the logs of the {shards} shards, finish the shards with --resume first.")
+    replay(sweep)
+
+def optimize_combo(
+    base_topology: Dict[int, List[SimNode]], 
+    B_range: Sequence[int], 
+    A_range: Sequence[int], 
+    bstake: Sequence[float], 
+    astake: Sequence[float], 
+    mode: str, 
+    version: str, 
+    attack: bool,
+    targets: Dict[str, float],
+    min_runs: int = 10,
+    max_runs: int = 100,
+    engine: str = 'object',
+    batch: int = 1,
+    seed: Optional[int] = None,
+    resume: bool = False,
+    expected: bool = False,
+) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    Search the combinations of the ranges for the cheapest one reaching the targets, see race_to_target,
+    and save the averaged results of the simulated combinations to file.
+    Every finished task is also appended to a log next to the results file, see TaskLog. The log doesn't
+    depend on the targets, so a search with other targets can reuse its runs with resume.
+    Args:
+        targets: smallest expected value of each fraction, e.g. {'f_gw': 0.3, 'f_mix': 0.2}
+        min_runs: runs of a combination in its first race
+        max_runs: largest number of runs of a combination
+        (other args as in run_many_combo)
+    Returns:
+        averaged result of the cheapest combination found to reach the targets (None if none was found),
+        averaged results of the cheaper combinations that max_runs runs couldn't decide
+    """
+    check_runs(engine, batch, True, min_runs, max_runs)
+    base_args = grid_args(B_range, A_range, bstake, astake, mode, version, attack, engine, expected)
+    
+    file_path = data_path(f"{version}_{mode}_{attack}_{max_runs}_optimize.json")
+    settings = {"version": version, "mode": mode, "attack": attack, "search": "optimize", "engine": engine, "batch": batch, "seed": seed}
+    if expected:
+        settings["expected"] = True
+    task_log = TaskLog(file_path[:-len(".json")] + ".tasks.jsonl", settings, resume)
+    if task_log.done:
+        print(f"Resuming: {len(task_log.done)} tasks of an earlier search already done.")
     
-    args_list = [args for args in base_args for _ in range(n_runs)]
+    n_base = sum(len(nodes) for nodes in base_topology.values())
     
-    with Pool(processes=cpu_count(), initializer=init_worker, initargs=(base_topology,)) as pool:
-        for result in tqdm(pool.imap_unordered(run_one_combo_args, args_list), total=len(args_list)):
-            results_list.append(result)
+    max_B = max(args[0] for args in base_args)
+    max_A = max(args[1] for args in base_args)
+    
+    # whole batches, so that the first runs of a combination are the same tasks in every race and are reused from the log
+    min_runs = -(-min_runs // max(batch, 1)) * max(batch, 1)
+    
+    with worker_pool(base_topology, max_B, max_A, batch, engine) as pool:
+        # every race after the first reuses the tasks of the races before from the log, that isn't resuming
+        run = lambda combos, n_runs: run_combos(pool, combos, n_runs, batch, seed, task_log, n_base, report_resume=False)
+        best, undecided, averaged_results = race_to_target(base_args, run, targets, min(min_runs, max_runs), max_runs)
+    task_log.close()
+    
+    used = sum(r['n_runs'] for r in averaged_results)
+    print(f"Search: {len(averaged_results)} of {len(base_args)} combinations and {used} of {max_runs * len(base_args)} runs simulated.")
     
-    averaged_results = add_then_average(results_list)
     averaged_results.sort(key=lambda r: r['f_gw'])
+    save_results(averaged_results, file_path)
+    save_columns(averaged_results, columns_path(file_path))
+    return best, undecided
+
+def placement(n: int, p: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Numbers of nodes on a layer, out of n nodes each placed on it with probability p, and their
+    probabilities, leaving out the numbers with negligible probability (see inclusion.NEGLIGIBLE).
+    """
+    m = np.arange(int(stats.binom.ppf(NEGLIGIBLE, n, p)), int(stats.binom.isf(NEGLIGIBLE, n, p)) + 1)
+    return m, stats.binom.pmf(m, n, p)
+
+def poisson_placement(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Numbers of nodes on one of 3 layers, out of a Poisson number of nodes of mean n placed uniformly,
+    and their probabilities, leaving out the numbers with negligible probability. The numbers on the
+    3 layers are independent, and given that they add up to n they are trinomial, see trinomial_mean.
+    """
+    m = np.arange(int(stats.poisson.ppf(NEGLIGIBLE, n / 3)), int(stats.poisson.isf(NEGLIGIBLE, n / 3)) + 1)
+    return m, stats.poisson.pmf(m, n / 3)
+
+def trinomial_mean(n: int, h1: np.ndarray, h2: np.ndarray, h3: np.ndarray) -> float:
+    """
+    E[h1(m1) h2(m2) h3(m3)] for (m1, m2, m3) the numbers of n nodes each placed uniformly on one of 3 layers.
+    As the numbers of a Poisson number of nodes given that they add up to n (see poisson_placement),
+    it is the convolution of the h weighted by their Poisson probabilities at n, over the probability of n.
+    Args:
+        h1, h2, h3: values of the functions for m = 0 to (at least) the largest number of poisson_placement(n)
+    """
+    m, p = poisson_placement(n)
+    total = np.convolve(np.convolve(h1[m] * p, h2[m] * p), h3[m] * p) # at 3 m[0], 3 m[0] + 1, ...
+    if not 0 <= n - 3 * m[0] < len(total):
+        return 0.0
+    return float(total[n - 3 * m[0]] / stats.poisson.pmf(n, n))
+
+def analytic_combo(
+    moments: Dict[int, Tuple[np.ndarray, np.ndarray]], 
+    A: int, 
+    astake: float, 
+    mode: str, 
+    version: str, 
+    variances: bool = False,
+) -> Dict[str, Union[Union[int, float], Dict[str, float]]]:
+    """
+    Expected result of a baseline combination over the placement of its A nodes on layers and the
+    active set selection, as run_one_combo averages over its runs. The numbers of A nodes selected on
+    the layers are independent given the numbers of A nodes on them, whose distribution is summed over:
+    binomial for the gateways (on layer 0 with probability 0.4, else 4) and trinomial for the mixnodes.
+    Args:
+        moments: layer -> E[X | m] and E[X^2 | m] of the number X of A nodes selected from m A nodes on it, see group_moments
+        variances: also give the variance of the result of one run as field_var
+        (other args as in run_one_combo)
+    Returns:
+        the expected result, as averaged by run_many_combo
+    """
+    num_mix, num_gw = split_A_nodes(A, mode, version)
+    n_required = [config.entry_gws] + [config.mixnodes_per_layer] * config.mixnodes_layers + [config.exit_gws]
+    mean = {layer: moments[layer][0] for layer in moments}
+    second = {layer: moments[layer][1] for layer in moments}
     
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
-    data_dir = os.path.join(project_root, "sim_data")
-    os.makedirs(data_dir, exist_ok=True) 
-        
-    filename = f"{version}_{mode}_{attack}_{n_runs}.json"
-    file_path = os.path.join(data_dir, filename)
-    save_results(averaged_results, file_path)
\ No newline at end of file
+    # gateways: m on layer 0, the others on layer 4
+    m, p = placement(num_gw, 0.4)
+    g0, g4 = mean[0][m], mean[4][num_gw - m]
+    gw = p @ (g0 + g4)
+    gw2 = p @ (second[0][m] + second[4][num_gw - m] + 2 * g0 * g4)
+    gw_path = p @ (g0 * g4) / (n_required[0] * n_required[4])
+    gw_path2 = p @ (second[0][m] * second[4][num_gw - m]) / (n_required[0] * n_required[4]) ** 2
+    
+    # mixnodes, trinomial over layers 1 to 3: the moments of a layer times 1 on the others
+    layers = (1, 2, 3)
+    one = np.ones(len(mean[1]))
+    mix = sum(trinomial_mean(num_mix, *(mean[l] if l == layer else one for l in layers)) for layer in layers)
+    mix2 = (sum(trinomial_mean(num_mix, *(second[l] if l == layer else one for l in layers)) for layer in layers)
+            + 2 * sum(trinomial_mean(num_mix, *(one if l == layer else mean[l] for l in layers)) for layer in layers))
+    mix_path = trinomial_mean(num_mix, mean[1], mean[2], mean[3]) / (n_required[1] * n_required[2] * n_required[3])
+    mix_path2 = trinomial_mean(num_mix, second[1], second[2], second[3]) / (n_required[1] * n_required[2] * n_required[3]) ** 2
+    
+    type_counts = {'B_gw': 0.0, 'A_gw': float(gw), 'B_mix': 0.0, 'A_mix': float(mix)}
+    result = combo_result(type_counts, {'A***A': float(gw_path), '*AAA*': float(mix_path)}, 0, A, 0, astake)
+    if variances:
+        # a variance computed as E[X^2] - E[X]^2 can come out slightly negative
+        result['f_gw_var'] = max(float(gw2 - gw ** 2), 0.0) / (config.entry_gws + config.exit_gws) ** 2
+        result['f_mix_var'] = max(float(mix2 - mix ** 2), 0.0) / (config.mixnodes_layers * config.mixnodes_per_layer) ** 2
+        result['path_prob_var'] = {'A***A': max(float(gw_path2 - gw_path ** 2), 0.0), '*AAA*': max(float(mix_path2 - mix_path ** 2), 0.0)}
+    return result
+
+def analytic_many_combo(
+    base_topology: Dict[int, List[SimNode]], 
+    A_range: Sequence[int], 
+    astake: Sequence[float], 
+    mode: str, 
+    version: str, 
+    variances: bool = False,
+) -> None:
+    """
+    Compute the expected results of the baseline combinations (no B nodes, no framing attack), instead of
+    averaging simulations of them, and save them to file as run_many_combo would. A baseline run only places
+    the A nodes on layers and selects the active set once, so its expected result follows from the selection
+    probabilities of the A nodes, computed exactly (up to the numerical integration, see group_moments).
+    Args:
+        variances: also save the variance of the result of one run of each combination, see analytic_combo
+        (other args as in run_many_combo)
+    """
+    targets = ArrayTopology.from_topology(base_topology)
+    targets.active_set_select_prob()
+    n_required = [config.entry_gws] + [config.mixnodes_per_layer] * config.mixnodes_layers + [config.exit_gws]
+    splits = [split_A_nodes(A, mode, version) for A in A_range]
+    # largest number of A nodes on each layer, leaving out the negligible placements
+    most = {layer: max(placement(num_gw, 0.4 if layer == 0 else 0.6)[0][-1] for _, num_gw in splits) for layer in (0, 4)}
+    most.update({layer: max(poisson_placement(num_mix)[0][-1] for num_mix, _ in splits) for layer in (1, 2, 3)})
+    
+    results = []
+    for stake in astake:
+        # the weight of an A node, as in run_one_combo
+        topology = targets.add_nodes(ROLE_GATEWAY, [0], TYPE_A, 0.98, stake)
+        topology.active_set_select_prob()
+        moments = {
+            layer: group_moments(targets.select_prob[targets.layers[layer]], topology.select_prob[-1], n_required[layer], int(most[layer]))
+            for layer in range(config.total_layers)
+        }
+        results.extend(analytic_combo(moments, A, stake, mode, version, variances) for A in A_range)
+    
+    save_combos(results, data_path(f"{version}_{mode}_False_analytic.json"), 0, False)
@@ -1,92 +1,160 @@
-import os
 import datetime
-import time
 from collections import defaultdict
-from multiprocessing import Pool, cpu_count, set_start_method
-from tqdm import tqdm
+from multiprocessing import set_start_method
+import numpy as np
 
 from .SimNode import Config
-from .create_nodes import create_target_nodes, create_B_A_nodes
-from .drop_test_packets import drop_v1
-from .get_active_set import dropping_calc_probs, get_active_set
-from .counts import count_active_set_node_types
-from ..utils.util import save_results
+from .drop_test_packets import drop_v1, drop_v1_array
+from .get_active_set import dropping_calc_probs, get_active_set, dropping_calc_probs_array, get_active_set_array
+from .counts import count_active_set_node_types, count_active_set_node_types_array, split_replicates
+from . import run_sim
+from .run_sim import batches, check_runs, check_shard, data_path, run_experiments, task_rng
+from .Sweep import Sweep, shard_units, replay
+from .TaskLog import TaskLog, MergedTaskLog, shard_log_path
+from ..utils.util import save_results, StreamingAverage
 
 def get_timestamp():
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def run_one_combo(base_topology, B, A, bstake, astake, mode, version, epoch):
+def run_one_trajectory(B, A, bstake, astake, mode, version, epochs, engine='object', replicates=1, rng=None):
+    """
+    Attack for max(epochs) epochs, and take the active set at the end of every epoch in epochs.
+    The active set doesn't change how NMv1 is attacked, so the snapshot after e epochs is a run of e epochs,
+    and one trajectory gives a run of every epoch count instead of simulating each one from scratch.
+    Args:
+        epochs: epoch counts to snapshot
+        engine: 'object' or 'array', see run_sim.run_one_combo
+        replicates: number of independent trajectories simulated together (array engine only)
+        rng: random generator of the trajectories, a fresh one if None
+        (other args as in run_sim.run_one_combo)
+    Returns:
+        one result per epoch count and trajectory, epoch after epoch
+    """
     config = Config()
-    topology = create_B_A_nodes(base_topology, B, A, bstake, astake, mode, version)
+    if rng is None:
+        rng = np.random.default_rng()
     
-    for _ in range(epoch * 4): 
-        drop_v1(topology) # one drop_v1 corresponds to 1 round of testing
-        dropping_calc_probs(topology)
-    active_set = get_active_set(topology)    
+    # the process's preallocated topology, see run_sim.init_worker
+    topology_pool = run_sim.G_TOPOLOGY_POOL
+    if topology_pool is None:
+        raise RuntimeError("Topology pool not initialized.")
     
-    type_counts = count_active_set_node_types(active_set)
+    if engine == 'array':
+        topology = topology_pool.reset(B, A, bstake, astake, mode, version, replicates, rng)
+    else:
+        topology = topology_pool.reset(B, A, bstake, astake, mode, version, rng)
     
-    f_A = type_counts['A_gw'] / (config.entry_gws + config.exit_gws)
+    results = []
+    for epoch in range(1, max(epochs) + 1):
+        for _ in range(4): # one drop_v1 corresponds to 1 round of testing
+            if engine == 'array':
+                drop_v1_array(topology, rng)
+                dropping_calc_probs_array(topology)
+            else:
+                drop_v1(topology, rng)
+                dropping_calc_probs(topology)
+        if epoch not in epochs:
+            continue
+        
+        if engine == 'array':
+            active_set = get_active_set_array(topology, rng)
+            type_counts = [count_active_set_node_types_array(topology, replicate_set)
+                           for replicate_set in split_replicates(topology, active_set)]
+        else:
+            type_counts = [count_active_set_node_types(get_active_set(topology, rng))]
+        
+        for counts in type_counts:
+            results.append({
+                "f_A": counts['A_gw'] / (config.entry_gws + config.exit_gws),
+                "B": B,
+                "A": A,
+                "epochs": epoch
+            })
     
-    result = {
-        "f_A": f_A,
-        "B": B,
-        "A": A,
-        "epochs": epoch
-    }
-    
-    return result
-
-def run_one_combo_args(args):
-    return run_one_combo(*args)
+    return results
 
-def run_epochs(base_topology, B, A, bstake, astake, mode, version, epochs):
-    results_list = []
+def run_one_trajectory_args(args):
+    *combo, engine, seed, first, replicates = args
+    B, A = combo[:2]
+    rng = task_rng(seed, B, A, first)
+    return run_one_trajectory(*combo, engine, replicates, rng)
 
-    base_args = [
-        (base_topology, B, A, bstake, astake, mode, version, epoch)
-        for epoch in epochs
-    ]
+class EpochSweep(Sweep):
+    """
+    Runs of one (B, A) combination for every epoch count, averaged per epoch count and saved
+    to sim_data/{B}_{A}_{n_runs}_test.json once the sweep finishes, see run_epochs.
+    A shard (i, N) only runs its share of the tasks (see shard_units) and logs them next to the results file
+    instead, see TaskLog; merge then averages the logs of all the shards into the results file.
+    """
+    
+    def __init__(self, B, A, bstake, astake, mode, version, epochs, engine='object', batch=1, seed=None,
+                 adaptive=False, ci_target=0.01, min_runs=10, n_runs=1000, shard=None):
+        check_runs(engine, batch, adaptive, min_runs, n_runs)
+        check_shard(shard, adaptive)
+        self.B = B
+        self.A = A
+        self.n_runs = n_runs
+        self.adaptive = adaptive
+        self.ci_target = ci_target
+        self.min_runs = min_runs
+        self.shard = shard
+        self.file_path = data_path(f"{B}_{A}_{n_runs}_test.json")
+        self.settings = {"B": B, "A": A, "bstake": bstake, "astake": astake, "mode": mode, "version": version,
+                         "epochs": sorted(epochs), "n_runs": n_runs, "engine": engine, "batch": batch, "seed": seed}
+        
+        # one trajectory per run covers every epoch count, see run_one_trajectory
+        # every batch of trajectories draws from its own stream of the master seed, see task_rng
+        epochs = tuple(sorted(epochs))
+        self.fn = run_one_trajectory_args
+        self.groups = [((B, A, bstake, astake, mode, version, epochs, engine, seed), batches(n_runs, max(batch, 1)))]
+        self.costs = [max(epochs)] # a run simulates 4 rounds per epoch
+        self.min_units = -(-min_runs // max(batch, 1)) if adaptive else None
+        self.task_log = None
+        if shard is not None:
+            self.groups = shard_units(self.groups, shard)
+            self.task_log = TaskLog(shard_log_path(self.file_path, shard), {**self.settings, "shard": f"{shard[0]}/{shard[1]}"})
+        
+        # folds the runs of each epoch into running averages as they come off the pool
+        self.aggregate = StreamingAverage(key_fields=('B', 'A', 'epochs'), stat_fields=('f_A',))
+    
+    def task_key(self, g, u):
+        return (self.B, self.A) + self.groups[g][1][u]
+    
+    def on_result(self, g, u, results):
+        if self.task_log is not None and (g, u) not in self.skip:
+            self.task_log.append(self.task_key(g, u), results)
+        self.aggregate.add_all(results)
+        # with adaptive, the runs stop once the confidence interval of f_A is within ci_target at every epoch
+        return self.adaptive and all(self.aggregate.converged(result, ('f_A',), self.ci_target, self.min_runs) for result in results)
+    
+    def skipped_result(self, g, u):
+        return self.task_log.results(self.task_key(g, u))
+    
+    def merge(self, shards):
+        """Average the task logs of the shards of this sweep into its results file, in run order as a single sweep would."""
+        self.task_log = MergedTaskLog(self.file_path, self.settings, shards)
+        self.skip = {(0, u) for u in range(len(self.groups[0][1])) if self.task_key(0, u) in self.task_log.done}
+        missing = len(self.groups[0][1]) - len(self.skip)
+        if missing:
+            self.task_log.close()
+            raise ValueError(f"{missing} tasks are missing from the logs of the {shards} shards of {self.file_path}, finish the shards first.")
+        replay(self)
+    
+    def finish(self):
+        if self.task_log is not None:
+            self.task_log.close()
+        if self.shard is not None:
+            print(f"Shard {self.shard[0]}/{self.shard[1]} done: {len(self.groups[0][1])} tasks in {self.task_log.path}")
+            return
+        averaged_results = self.aggregate.averages()
+        averaged_results.sort(key=lambda r: r['epochs'])
+        save_results(averaged_results, self.file_path)
 
+def run_epochs(base_topology, B, A, bstake, astake, mode, version, epochs, engine='object', batch=1, seed=None,
+               adaptive=False, ci_target=0.01, min_runs=10, max_runs=None):
     # NOTE SET SIMULATION ROUNDS
-    n_runs = 1000
-    args_list = [args for args in base_args for _ in range(n_runs)]
+    n_runs = 1000 if max_runs is None else max_runs
+    sweep = EpochSweep(B, A, bstake, astake, mode, version, epochs, engine, batch, seed, adaptive, ci_target, min_runs, n_runs)
 
     # Run in parallel with progress bar
-    with Pool(processes=cpu_count()) as pool:
-        for result in tqdm(pool.imap_unordered(run_one_combo_args, args_list), total=len(args_list)):
-            results_list.append(result)
-
-    # Aggregate averages per unique combination
-    aggregates = {}
-    for r in results_list:
-        key = (r['B'], r['A'], r['epochs'])
-        if key not in aggregates:
-            aggregates[key] = {
-                'count': 0,
-                'f_A_sum': 0.0,
-            }
-        agg = aggregates[key]
-        agg['count'] += 1
-        agg['f_A_sum'] += r['f_A']
-    
-    averaged_results = []
-    for (B, A, epochs_val), agg in aggregates.items():
-        cnt = max(agg['count'], 1)
-        averaged_results.append({
-            'f_A': agg['f_A_sum'] / cnt,
-            'B': B,
-            'A': A,
-            'epochs': epochs_val,
-        })
-
-    # Save averaged results
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
-    data_dir = os.path.join(project_root, "sim_data")
-    os.makedirs(data_dir, exist_ok=True) 
-    filename = f"{B}_{A}_{n_runs}_test.json"
-    file_path = os.path.join(data_dir, filename)
-
-    averaged_results.sort(key=lambda r: r['epochs'])
-    save_results(averaged_results, file_path)
-
+    run_experiments(base_topology, [sweep], batch, engine)
@@ -1,5 +1,8 @@
 import json
+import math
+import numpy as np
 from collections import defaultdict
+from scipy import stats
 
 def save_results(results, filename):
     with open(filename, 'w') as f:
@@ -8,6 +11,49 @@ def load_results(filename):
     with open(filename, 'r') as f:
         return json.load(f) 
 
+def columns_path(filename):
+    """The columnar copy (.npz) of a .json results file."""
+    return filename[:-len('.json')] + '.npz'
+
+def save_columns(results, filename):
+    """Save a list of results (dicts with the same fields, as saved by save_results) as typed columns (see results_to_columns) in a compressed .npz file."""
+    np.savez_compressed(filename, **results_to_columns(results))
+
+def results_to_columns(results):
+    """
+    Typed columns of a list of results, one array per field:
+    numbers as a float or int array with NaN for None, [low, high] intervals as an (n, 2) array,
+    dicts (path_prob) as an (n, keys) array of their values, with the keys in field.keys
+    and whether each entry has each key in field.mask.
+    """
+    columns = {}
+    fields = list(dict.fromkeys(field for r in results for field in r))
+    for field in fields:
+        values = [r.get(field) for r in results]
+        sample = next((v for v in values if v is not None), None)
+        if isinstance(sample, dict):
+            keys = list(dict.fromkeys(k for v in values if v for k in v))
+            flat = _column([(v or {}).get(k) for v in values for k in keys])
+            columns[field] = flat.reshape((len(values), len(keys)) + flat.shape[1:])
+            columns[f'{field}.keys'] = np.array(keys, dtype=str)
+            columns[f'{field}.mask'] = np.array([[k in (v or {}) for k in keys] for v in values], dtype=bool).reshape(len(values), len(keys))
+        else:
+            columns[field] = _column(values)
+    return columns
+
+def _column(values):
+    """Array of numbers or [low, high] intervals, None as NaN, int if every value is an int."""
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, list):
+        return np.array([v if v is not None else [np.nan] * len(sample) for v in values], dtype=np.float64)
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return np.array(values, dtype=np.int64)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def load_columns(filename):
+    """The columns of a file saved by save_columns, each read from the file on first access."""
+    return np.load(filename)
+
 def add_then_average(all_entries):
     aggregates = {}
     for r in all_entries:
@@ -53,22 +99,210 @@ def add_then_average(all_entries):
         })
     
     return averaged_results
+
+
+class RunningStats:
+    """
+    Running mean and variance of a stream of values (Welford's algorithm).
+    """
+    def __init__(self, count=0):
+        # the state after count values of 0, for a field that first shows up in a later result
+        self.count = count
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of squared differences from the mean
+    
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+    
+    def se(self):
+        """Standard error of the mean, None with less than 2 values."""
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1) / self.count)
+    
+    def half_width(self, level=0.95):
+        """Half width of the Student-t confidence interval of the mean, None with less than 2 values."""
+        se = self.se()
+        if se is None:
+            return None
+        return stats.t.ppf((1 + level) / 2, self.count - 1) * se
+    
+    def ci(self, level=0.95):
+        """Student-t confidence interval [low, high] of the mean, None with less than 2 values."""
+        half_width = self.half_width(level)
+        if half_width is None:
+            return None
+        return [self.mean - half_width, self.mean + half_width]
+
+
+class StreamingAverage:
+    """
+    Streaming version of add_then_average: folds run results into per-combination running 
+    means and variances as they arrive, so memory doesn't grow with the number of runs.
+    Fields holding a dict (path_prob) are averaged per key, a key missing from a result counts as 0.
+    """
+    def __init__(self, key_fields=('B', 'A', 'B_stake', 'A_stake'), stat_fields=('f_gw', 'f_mix', 'path_prob'), level=0.95):
+        """
+        key_fields: fields that identify a combination
+        stat_fields: averaged fields that also get a standard error (field_se) and confidence interval (field_ci)
+        level: confidence level of the intervals
+        """
+        self.key_fields = key_fields
+        self.stat_fields = stat_fields
+        self.level = level
+        self.groups = {}
+    
+    def add(self, result):
+        key = tuple(result[field] for field in self.key_fields)
+        if key not in self.groups:
+            self.groups[key] = {'count': 0, 'fields': {}}
+        group = self.groups[key]
+        fields = group['fields']
+        
+        for field, value in result.items():
+            if field in self.key_fields:
+                continue
+            if isinstance(value, dict):
+                per_key = fields.setdefault(field, {})
+                for k in value:
+                    if k not in per_key:
+                        per_key[k] = RunningStats(group['count'])
+                for k, stat in per_key.items():
+                    stat.add(value.get(k, 0.0))
+            else:
+                if field not in fields:
+                    fields[field] = RunningStats(group['count'])
+                fields[field].add(value)
+        group['count'] += 1
+    
+    def add_all(self, results):
+        for result in results:
+            self.add(result)
+    
+    def converged(self, result, fields, half_width, min_runs):
+        """
+        Whether the combination of result has at least min_runs runs, and confidence intervals 
+        no wider than half_width on each side for every field in fields (every key of a dict field).
+        """
+        group = self.groups[tuple(result[field] for field in self.key_fields)]
+        if group['count'] < min_runs:
+            return False
+        for field in fields:
+            stat = group['fields'][field]
+            for s in (stat.values() if isinstance(stat, dict) else [stat]):
+                width = s.half_width(self.level)
+                if width is None or width > half_width:
+                    return False
+        return True
+    
+    def averages(self):
+        """One record per combination: the averaged fields, the key fields, then field_se, field_ci and n_runs."""
+        averaged_results = []
+        for key, group in self.groups.items():
+            record = {}
+            for field, stat in group['fields'].items():
+                if isinstance(stat, dict):
+                    record[field] = {k: s.mean for k, s in stat.items()}
+                else:
+                    record[field] = stat.mean
+            record.update(zip(self.key_fields, key))
+            for field in self.stat_fields:
+                stat = group['fields'].get(field)
+                if isinstance(stat, dict):
+                    record[f'{field}_se'] = {k: s.se() for k, s in stat.items()}
+                    record[f'{field}_ci'] = {k: s.ci(self.level) for k, s in stat.items()}
+                elif stat is not None:
+                    record[f'{field}_se'] = stat.se()
+                    record[f'{field}_ci'] = stat.ci(self.level)
+            record['n_runs'] = group['count']
+            averaged_results.append(record)
+        
+        return averaged_results
     
      
+class CostModel:
+    """
+    Costs of an attack with B and A nodes and stakes bstake and astake on each, in USD:
+    a VPS per node (non refundable), and a self bond per node plus the stakes, in tokens (refundable).
+    Works on numbers or on whole columns (numpy arrays) at once, e.g. to re-price a results table
+    under other market prices without simulating again.
+    """
+    def __init__(self, vps_price=20, self_bond=100, token_price=0.04):
+        """
+        vps_price: USD per node for its VPS
+        self_bond: tokens bonded per node
+        token_price: USD per token
+        The prices are read-only: a model is hashed (e.g. as a cache key of re-priced columns),
+        so other prices make another model.
+        """
+        self._vps_price = vps_price
+        self._self_bond = self_bond
+        self._token_price = token_price
+    
+    @property
+    def vps_price(self):
+        return self._vps_price
+    
+    @property
+    def self_bond(self):
+        return self._self_bond
+    
+    @property
+    def token_price(self):
+        return self._token_price
+    
+    def __repr__(self):
+        return f"CostModel(vps_price={self.vps_price}, self_bond={self.self_bond}, token_price={self.token_price})"
+    
+    def __eq__(self, other):
+        return isinstance(other, CostModel) and self.params() == other.params()
+    
+    def __hash__(self):
+        return hash(self.params())
+    
+    def params(self):
+        return (self.vps_price, self.self_bond, self.token_price)
+    
+    def _terms(self, B, A, bstake, astake):
+        """The VPS, self bond and stake terms of the costs."""
+        vps = (B+A) * self.vps_price
+        self_bond = (B+A) * self.self_bond * self.token_price
+        total_stake = (A * (astake * self.token_price)) + (B * (bstake * self.token_price))
+        return vps, self_bond, total_stake
+    
+    def non_refundable(self, B, A):
+        return (B+A) * self.vps_price
+    
+    def refundable(self, B, A, bstake, astake):
+        _, self_bond, total_stake = self._terms(B, A, bstake, astake)
+        return self_bond + total_stake
+    
+    def total(self, B, A, bstake, astake):
+        vps, self_bond, total_stake = self._terms(B, A, bstake, astake)
+        return vps + self_bond + total_stake
+    
+    def costs(self, B, A, bstake, astake):
+        """The total_cost, refundable_cost and non_refundable_cost columns, sharing their terms."""
+        vps, self_bond, total_stake = self._terms(B, A, bstake, astake)
+        return {
+            'total_cost': vps + self_bond + total_stake,
+            'refundable_cost': self_bond + total_stake,
+            'non_refundable_cost': vps,
+        }
+
+
+# the prices of the paper
+COST_MODEL = CostModel()
+
 def get_cost(B, A, bstake, astake):
-    vps = (B+A) * 20
-    self_bond = (B+A) * 100 * 0.04
-    total_stake = (A * (astake * 0.04)) + (B * (bstake * 0.04))
-    cost = vps + self_bond + total_stake
-    return cost
+    return COST_MODEL.total(B, A, bstake, astake)
 
 def get_refundable_cost(B, A, bstake, astake):
-    self_bond = (B+A) * 100 * 0.04
-    total_stake = (A * (astake * 0.04)) + (B * (bstake * 0.04))
-    refundable_cost = self_bond + total_stake
-    return refundable_cost
+    return COST_MODEL.refundable(B, A, bstake, astake)
 
 
 def get_non_refundable_cost(B, A, bstake, astake):
-    vps = (B+A) * 20
-    return vps
\ No newline at end of file
+    return COST_MODEL.non_refundable(B, A)